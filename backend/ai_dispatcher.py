@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.task: Optional[asyncio.Task] = None
+        # Set once it holds a concurrency slot and the LLM call has begun
+        self.started = False
+        self.superseded = False
+
+
+class AIDispatcher:
+    """
+    Decides when a session's final sentences turn into an AI request.
+
+    Finals arriving within `debounce_ms` of each other are merged into one
+    prompt; a speaker who never pauses still gets a request every `max_wait_ms`.
+    When a request fires it supersedes the one in flight: that one is cancelled
+    and its text is folded into the new prompt, so nothing goes unanswered and
+    answers never arrive out of order. An answer that has already been
+    superseded `max_superseded` times in a row is allowed to finish instead,
+    and the new request waits for it. `limiter` caps concurrent requests across
+    all sessions; a request that is superseded while waiting for a slot is
+    dropped without being sent.
+    """
+
+    def __init__(self, run: Callable[[str, Callable[[], bool]], Awaitable[None]],
+                 limiter: asyncio.Semaphore, debounce_ms: float = 700.0, max_wait_ms: float = 3000.0,
+                 max_superseded: int = 2):
+        self.run = run
+        self.limiter = limiter
+        self.debounce = debounce_ms / 1000.0
+        self.max_wait = max(max_wait_ms, debounce_ms) / 1000.0
+        self.max_superseded = max(0, max_superseded)
+
+        self.pending: List[str] = []
+        self.pending_since: Optional[float] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.request: Optional[_Request] = None
+        # An answer let through despite newer speech; later requests wait for it
+        self.finishing: Optional[_Request] = None
+        self.superseded_streak = 0
+
+        # Stats
+        self.finals_received = 0
+        self.requests_started = 0
+        self.requests_cancelled = 0
+        self.requests_dropped = 0
+        self.requests_let_finish = 0
+
+    def submit(self, text: str):
+        self.finals_received += 1
+        self.pending.append(text)
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.pending_since is None:
+            self.pending_since = now
+        if self.timer is not None:
+            self.timer.cancel()
+        # Each final restarts the debounce, but never past `max_wait` after the first pending one
+        delay = min(self.debounce, max(0.0, self.pending_since + self.max_wait - now))
+        self.timer = loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self.timer = None
+        self.pending_since = None
+        if not self.pending:
+            return
+        parts = self.pending
+        self.pending = []
+
+        current = self.request
+        if current is not None and not current.task.done():
+            if current.started and self.superseded_streak >= self.max_superseded:
+                # Cancelling yet again would leave a speaker who keeps talking without any answer
+                self.finishing = current
+                self.superseded_streak = 0
+                self.requests_let_finish += 1
+            else:
+                # The answer in flight no longer covers the latest speech
+                current.superseded = True
+                current.task.cancel()
+                self.requests_cancelled += 1
+                if current.started:
+                    self.superseded_streak += 1
+                parts.insert(0, current.prompt)
+
+        request = self.request = _Request(" ".join(parts))
+        request.task = asyncio.create_task(self._dispatch(request))
+
+    async def _dispatch(self, request: _Request):
+        def is_current() -> bool:
+            return not request.superseded
+
+        try:
+            finishing = self.finishing
+            if finishing is not None and finishing is not request and not finishing.task.done():
+                # Answers arrive in order: wait for the one allowed to finish
+                await asyncio.wait([finishing.task])
+            async with self.limiter:
+                if not is_current():
+                    self.requests_dropped += 1
+                    return
+                request.started = True
+                self.requests_started += 1
+                await self.run(request.prompt, is_current)
+            if is_current():
+                self.superseded_streak = 0
+        except asyncio.CancelledError:
+            pass
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        for request in (self.request, self.finishing):
+            if request is not None and not request.task.done():
+                request.task.cancel()
+        self.pending = []
+        self.pending_since = None
+
+    def stats(self) -> Dict:
+        return {
+            "finals_received": self.finals_received,
+            "requests_started": self.requests_started,
+            "requests_cancelled": self.requests_cancelled,
+            "requests_dropped": self.requests_dropped,
+            "requests_let_finish": self.requests_let_finish,
+            "pending": len(self.pending),
+            "in_flight": self.request is not None and not self.request.task.done()
+        }
@@ -0,0 +1,89 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PCM16_SCALE = np.float32(1.0 / 32768.0)
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity float32 audio buffer for a single listener.
+
+    Storage is allocated once and mirrored (every sample is written at `i` and
+    `i + capacity`), so the buffered audio is always one contiguous slice and
+    `view()` can hand it to Whisper without copying. Views are only valid until
+    the next write, so read and write from the same thread.
+    """
+
+    def __init__(self, capacity_seconds: float = 30.0, sample_rate: int = 16000):
+        self.sample_rate = sample_rate
+        self.capacity = int(capacity_seconds * sample_rate)
+        self._storage = np.zeros(self.capacity * 2, dtype=np.float32)
+        self._head = 0
+        self._size = 0
+        self.dropped_samples = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def duration(self) -> float:
+        return self._size / self.sample_rate
+
+    def write_pcm16(self, data: bytes) -> int:
+        """Converts raw little-endian int16 PCM straight into the preallocated storage."""
+        return self._write(np.frombuffer(data, dtype=np.int16), PCM16_SCALE)
+
+    def write(self, samples: np.ndarray) -> int:
+        return self._write(samples, None)
+
+    def _write(self, samples: np.ndarray, scale) -> int:
+        """Returns how many samples were stored (the newest `n` in the buffer)."""
+        n = len(samples)
+        if n == 0:
+            return 0
+
+        # A single write larger than the ring only keeps its newest audio
+        if n > self.capacity:
+            self.dropped_samples += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        overflow = self._size + n - self.capacity
+        if overflow > 0:
+            logger.warning(f"Audio ring buffer full, dropping {overflow / self.sample_rate:.2f}s of oldest audio")
+            self.dropped_samples += overflow
+            self.discard(overflow)
+
+        tail = (self._head + self._size) % self.capacity
+        first = min(n, self.capacity - tail)
+        self._store(tail, samples[:first], scale)
+        if first < n:
+            self._store(0, samples[first:], scale)
+        self._size += n
+        return n
+
+    def _store(self, pos: int, chunk: np.ndarray, scale):
+        end = pos + len(chunk)
+        target = self._storage[pos:end]
+        if scale is None:
+            np.copyto(target, chunk, casting="unsafe")
+        else:
+            np.multiply(chunk, scale, out=target, casting="unsafe")
+        self._storage[pos + self.capacity:end + self.capacity] = target
+
+    def view(self, start: int = 0) -> np.ndarray:
+        """Zero-copy view of the buffered audio from sample `start` (relative to the oldest sample)."""
+        start = min(max(start, 0), self._size)
+        return self._storage[self._head + start:self._head + self._size]
+
+    def discard(self, samples: int):
+        """Drops the oldest `samples` samples."""
+        samples = min(max(samples, 0), self._size)
+        self._head = (self._head + samples) % self.capacity
+        self._size -= samples
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
@@ -0,0 +1,159 @@
+import logging
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metrics import AUDIO_BYTES, AUDIO_LOST, AUDIO_FRAMES_DISCARDED
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAMING_VERSION = 1
+# version, codec id, flags (reserved), sequence number, capture time in ms since the epoch; little-endian
+FRAME_HEADER = struct.Struct("<BBHIQ")
+
+CODEC_PCM16 = 0
+CODEC_OPUS = 1
+CODEC_IDS = {"pcm16": CODEC_PCM16, "opus": CODEC_OPUS}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+# An Opus packet decodes to at most 120 ms
+OPUS_MAX_FRAME_SAMPLES = SAMPLE_RATE * 120 // 1000
+
+
+class PCM16Decoder:
+    def decode(self, payload: bytes) -> bytes:
+        # A stray odd byte would shift every following sample
+        return payload[:len(payload) - len(payload) % 2]
+
+
+class OpusDecoder:
+    """Decodes raw Opus packets (no Ogg container) to 16 kHz mono int16. Needs `opuslib` and libopus."""
+
+    def __init__(self):
+        import opuslib
+        self.decoder = opuslib.Decoder(SAMPLE_RATE, 1)
+
+    def decode(self, payload: bytes) -> bytes:
+        return self.decoder.decode(payload, OPUS_MAX_FRAME_SAMPLES)
+
+
+DECODERS = {CODEC_PCM16: PCM16Decoder, CODEC_OPUS: OpusDecoder}
+_available: Optional[List[str]] = None
+
+
+def available_codecs() -> List[str]:
+    """Codecs this server can decode, most compact first. PCM16 needs nothing; Opus needs opuslib."""
+    global _available
+    if _available is None:
+        _available = []
+        try:
+            OpusDecoder()
+            _available.append("opus")
+        except Exception as e:
+            logger.info(f"Opus audio unavailable, listeners will send PCM ({e})")
+        _available.append("pcm16")
+    return _available
+
+
+def negotiate(requested: Iterable[str]) -> str:
+    """Picks the client's most preferred codec we can decode; PCM16 is always possible."""
+    supported = available_codecs()
+    for codec in requested:
+        if codec in supported:
+            return codec
+    return "pcm16"
+
+
+def frame_capture_ms(frame: bytes) -> Optional[int]:
+    """The capture time in a frame's header, read without decoding it (None if it has no header)."""
+    if len(frame) < FRAME_HEADER.size:
+        return None
+    return FRAME_HEADER.unpack_from(frame)[4]
+
+
+def encode_frame(codec: str, seq: int, captured_ms: int, payload: bytes) -> bytes:
+    return FRAME_HEADER.pack(FRAMING_VERSION, CODEC_IDS[codec], 0, seq & 0xFFFFFFFF, int(captured_ms)) + payload
+
+
+class FrameReceiver:
+    """
+    Unpacks one listener's framed audio and tracks its continuity.
+
+    Every frame carries a sequence number, its capture time and a codec id, so
+    the codec can change mid-stream (e.g. PCM until the Opus encoder is ready).
+    A jump in `seq` means frames were lost, on the network or skipped by a
+    client whose uplink backed up; the capture times give the gap's duration,
+    which `decode()` reports so the worker can keep its timeline intact. Late or
+    duplicate frames are dropped. Runs on the listener's worker thread.
+    """
+
+    def __init__(self, session_id: str = ""):
+        self.session_id = session_id
+        self.decoders: Dict[int, object] = {}
+        self.expected_seq: Optional[int] = None
+        self.expected_at_ms = 0.0
+        self.last_frame_ms = 0.0
+
+        # Stats
+        self.frames = 0
+        self.lost_frames = 0
+        self.lost_ms = 0.0
+
+    def _decoder(self, codec_id: int):
+        decoder = self.decoders.get(codec_id)
+        if decoder is None:
+            if CODEC_NAMES.get(codec_id) not in available_codecs():
+                raise ValueError(f"Unsupported audio codec id {codec_id}")
+            decoder = self.decoders[codec_id] = DECODERS[codec_id]()
+        return decoder
+
+    def decode(self, frame: bytes) -> Tuple[bytes, int]:
+        """Returns (int16 PCM, samples lost just before it). Raises ValueError for frames that can't be used."""
+        if len(frame) < FRAME_HEADER.size:
+            self._discard("malformed")
+            raise ValueError(f"Audio frame too short ({len(frame)} bytes)")
+        version, codec_id, _, seq, captured_ms = FRAME_HEADER.unpack_from(frame)
+        if version != FRAMING_VERSION:
+            self._discard("malformed")
+            raise ValueError(f"Unknown audio framing version {version}")
+        if self.expected_seq is not None and seq < self.expected_seq:
+            self._discard("late")
+            return b"", 0
+
+        try:
+            pcm = self._decoder(codec_id).decode(frame[FRAME_HEADER.size:])
+        except ValueError:
+            self._discard("unsupported")
+            raise
+        except Exception as e:
+            self._discard("undecodable")
+            raise ValueError(f"Could not decode {CODEC_NAMES.get(codec_id)} frame {seq}: {e}") from e
+        AUDIO_BYTES.inc(len(frame), session=self.session_id, codec=CODEC_NAMES[codec_id])
+
+        lost_samples = 0
+        if self.expected_seq is not None and seq > self.expected_seq:
+            missing = seq - self.expected_seq
+            # Capture times give the gap's length; fall back to the last frame's for a client clock that jumped back
+            gap_ms = captured_ms - self.expected_at_ms
+            if gap_ms <= 0:
+                gap_ms = missing * self.last_frame_ms
+            lost_samples = int(gap_ms * SAMPLE_RATE / 1000.0)
+            self.lost_frames += missing
+            self.lost_ms += gap_ms
+            AUDIO_LOST.inc(gap_ms / 1000.0, session=self.session_id)
+
+        self.frames += 1
+        self.last_frame_ms = len(pcm) / 2 / SAMPLE_RATE * 1000.0
+        self.expected_seq = seq + 1
+        self.expected_at_ms = captured_ms + self.last_frame_ms
+        return pcm, lost_samples
+
+    def _discard(self, reason: str):
+        AUDIO_FRAMES_DISCARDED.inc(session=self.session_id, reason=reason)
+
+    def stats(self) -> Dict:
+        return {
+            "frames": self.frames,
+            "lost_frames": self.lost_frames,
+            "lost_ms": round(self.lost_ms, 1),
+            "codecs": sorted(CODEC_NAMES[codec_id] for codec_id in self.decoders)
+        }
@@ -0,0 +1,308 @@
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import time
+import wave
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from inference_scheduler import DECODE_OPTIONS, DEFAULT_PROMPT, SAMPLE_RATE, segment_to_dict
+from vad import FRAME_SIZE, create_vad_backend
+
+logger = logging.getLogger(__name__)
+
+# Frames handed to the VAD per call while scanning a file
+VAD_BLOCK_FRAMES = 4096
+
+
+def decode_audio(data: bytes) -> np.ndarray:
+    """
+    Decodes an uploaded recording to 16kHz mono float32.
+    WAV files (8/16/32-bit PCM, any rate, any channel count) are parsed; anything
+    else is taken as raw 16-bit little-endian 16kHz mono PCM, the websocket format.
+    """
+    if data[:4] != b"RIFF":
+        usable = len(data) - len(data) % 2
+        return np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise ValueError(f"Invalid WAV file: {e}")
+
+    if width == 1:
+        audio = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    elif width == 4:
+        audio = np.frombuffer(frames, dtype=np.int32).astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width * 8} bits")
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        # Linear interpolation is plenty for speech going into Whisper's 16kHz front end
+        target_length = int(len(audio) * SAMPLE_RATE / rate)
+        audio = np.interp(
+            np.arange(target_length) * (rate / SAMPLE_RATE), np.arange(len(audio)), audio
+        ).astype(np.float32)
+    return audio
+
+
+class BatchTranscriber:
+    """
+    Transcribes a whole recording as fast as the model allows, instead of in real time.
+
+    The file is split on VAD boundaries into chunks of at most `max_chunk_s`
+    (Whisper's 30s window): speech regions are padded, neighbours closer than
+    `merge_gap_s` are packed into one chunk, and overlong regions are cut at
+    their quietest frame. Chunks are then decoded `batch_size` at a time in one
+    batched call on the shared WhisperModel, and each batch's segments are
+    yielded as soon as it is done so callers can report progress.
+    """
+
+    def __init__(self, model, vad_backend=None, batch_size: int = 16, max_chunk_s: float = 30.0,
+                 threshold: float = 0.5, min_silence_ms: int = 500, pad_ms: int = 200,
+                 merge_gap_s: float = 1.0, initial_prompt: Optional[str] = None):
+        self.model = model
+        self.vad_backend = vad_backend or create_vad_backend()
+        self.batch_size = max(1, batch_size)
+        self.max_chunk = int(max_chunk_s * SAMPLE_RATE)
+        self.threshold = threshold
+        self.neg_threshold = max(threshold - 0.15, 0.01)
+        self.min_silence_frames = max(1, int(min_silence_ms / 1000.0 * SAMPLE_RATE / FRAME_SIZE))
+        self.pad = int(pad_ms / 1000.0 * SAMPLE_RATE)
+        self.merge_gap = int(merge_gap_s * SAMPLE_RATE)
+        self.initial_prompt = initial_prompt or DEFAULT_PROMPT
+
+        self.batched_pipeline = None
+        if self.batch_size > 1:
+            try:
+                from faster_whisper import BatchedInferencePipeline
+                self.batched_pipeline = BatchedInferencePipeline(model=model)
+            except ImportError:
+                logger.warning("faster-whisper has no BatchedInferencePipeline; decoding chunks one at a time.")
+
+    def speech_probabilities(self, audio: np.ndarray) -> np.ndarray:
+        usable = len(audio) - len(audio) % FRAME_SIZE
+        frames = audio[:usable].reshape(-1, FRAME_SIZE)
+        # Blocks bound memory; the stream carries the VAD state across them
+        stream = self.vad_backend.stream()
+        return np.concatenate([
+            stream(frames[i:i + VAD_BLOCK_FRAMES])
+            for i in range(0, len(frames), VAD_BLOCK_FRAMES)
+        ]) if len(frames) else np.zeros(0, dtype=np.float32)
+
+    def split(self, audio: np.ndarray) -> List[Tuple[int, int]]:
+        """Returns (start, end) sample ranges to decode, in order."""
+        probs = self.speech_probabilities(audio)
+
+        # 1. Speech regions in frames, with the same hysteresis as the streaming VAD
+        regions = []
+        start = None
+        silence_run = 0
+        for i, prob in enumerate(probs):
+            if start is None:
+                if prob >= self.threshold:
+                    start = i
+                    silence_run = 0
+            elif prob < self.neg_threshold:
+                silence_run += 1
+                if silence_run >= self.min_silence_frames:
+                    regions.append((start, i - silence_run + 1))
+                    start = None
+            else:
+                silence_run = 0
+        if start is not None:
+            regions.append((start, len(probs)))
+
+        # 2. Pad regions in samples and pack close neighbours into one chunk
+        chunks: List[List[int]] = []
+        for region_start, region_end in regions:
+            chunk_start = max(0, region_start * FRAME_SIZE - self.pad)
+            chunk_end = min(len(audio), region_end * FRAME_SIZE + self.pad)
+            if chunks and chunk_start - chunks[-1][1] <= self.merge_gap and chunk_end - chunks[-1][0] <= self.max_chunk:
+                chunks[-1][1] = chunk_end
+            elif chunks and chunk_start < chunks[-1][1]:
+                # Padding overlaps the previous chunk but the pair is too long to merge
+                chunks.append([chunks[-1][1], chunk_end])
+            else:
+                chunks.append([chunk_start, chunk_end])
+
+        # 3. Cut anything longer than the model's window at its quietest frame
+        result = []
+        for chunk_start, chunk_end in chunks:
+            while chunk_end - chunk_start > self.max_chunk:
+                search_from = (chunk_start + self.max_chunk * 2 // 3) // FRAME_SIZE
+                search_to = (chunk_start + self.max_chunk) // FRAME_SIZE
+                cut = (search_from + int(np.argmin(probs[search_from:search_to]))) * FRAME_SIZE
+                result.append((chunk_start, cut))
+                chunk_start = cut
+            result.append((chunk_start, chunk_end))
+        return result
+
+    def transcribe(self, audio: np.ndarray, chunks: Optional[List[Tuple[int, int]]] = None) -> Iterator[Dict]:
+        """
+        Yields one progress dict per decoded batch:
+        {"chunks_done", "chunks_total", "processed": seconds of audio covered, "segments": [...]}.
+        Segment timestamps are relative to the start of `audio`.
+        """
+        chunks = self.split(audio) if chunks is None else chunks
+        segment_id = 0
+        for group_start in range(0, len(chunks), self.batch_size):
+            group = chunks[group_start:group_start + self.batch_size]
+            if self.batched_pipeline is not None and len(group) > 1:
+                segments = self._decode_batched(audio, group)
+            else:
+                segments = [s for start, end in group for s in self._decode_single(audio, start, end)]
+
+            for segment in segments:
+                segment["id"] = segment_id
+                segment_id += 1
+            yield {
+                "chunks_done": group_start + len(group),
+                "chunks_total": len(chunks),
+                "processed": group[-1][1] / SAMPLE_RATE,
+                "segments": segments
+            }
+
+    def _decode_batched(self, audio: np.ndarray, group: List[Tuple[int, int]]) -> List[Dict]:
+        # With clip timestamps the pipeline decodes each chunk as one batch row and reports absolute times
+        segments, info = self.batched_pipeline.transcribe(
+            audio,
+            clip_timestamps=[{"start": start / SAMPLE_RATE, "end": end / SAMPLE_RATE} for start, end in group],
+            batch_size=len(group),
+            initial_prompt=self.initial_prompt,
+            vad_filter=False,
+            **DECODE_OPTIONS
+        )
+        return [segment_to_dict(segment) for segment in segments]
+
+    def _decode_single(self, audio: np.ndarray, start: int, end: int) -> List[Dict]:
+        segments, info = self.model.transcribe(
+            audio[start:end],
+            vad_filter=False,
+            initial_prompt=self.initial_prompt,
+            **DECODE_OPTIONS
+        )
+        # Negative offset: shift chunk-relative times to file-relative ones
+        return [segment_to_dict(segment, -start / SAMPLE_RATE) for segment in segments]
+
+
+class ThoughtTimeline:
+    """Feeds transcript segments through a SemanticSegmenter and records each finished thought with its time span."""
+
+    def __init__(self, segmenter):
+        self.segmenter = segmenter
+        self.thoughts: List[Dict] = []
+        self.start: Optional[float] = None
+        self.end: Optional[float] = None
+
+    def add(self, segment: Dict, embedding=None) -> Optional[Dict]:
+        """Returns the thought this segment closed, if any."""
+        decision = self.segmenter.process(segment["text"], embedding)
+        if decision is None:
+            return None
+        finished = None
+        if decision["action"] == "FINAL":
+            finished = self._close(decision)
+        if self.start is None:
+            self.start = segment["start"]
+        self.end = segment["end"]
+        return finished
+
+    def finish(self) -> Optional[Dict]:
+        decision = self.segmenter.manual_segment_trigger()
+        return self._close(decision) if decision else None
+
+    def _close(self, decision: Dict) -> Dict:
+        thought = {
+            "start": self.start,
+            "end": self.end,
+            "text": decision["text"],
+            "segment_type": decision.get("segment_type")
+        }
+        self.thoughts.append(thought)
+        self.start = None
+        return thought
+
+
+def main():
+    # Same model settings (and .env) as the server, so a file transcribes the same either way
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Transcribe a recorded WAV/PCM file offline.")
+    parser.add_argument("audio", help="WAV file, or raw 16-bit 16kHz mono PCM")
+    parser.add_argument("--output", "-o", help="Write the result as JSON here (default: stdout)")
+    parser.add_argument("--model", default=os.getenv("WHISPER_MODEL", "base"))
+    parser.add_argument("--model-cache", default=os.getenv("WHISPER_CACHE"))
+    parser.add_argument("--device", default=os.getenv("WHISPER_DEVICE", "auto"), help="auto, cuda or cpu")
+    parser.add_argument("--compute-type", default=os.getenv("WHISPER_COMPUTE_TYPE"), help="Defaults to float16 on CUDA, int8 on CPU")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--vad", default="silero", help="silero or energy")
+    parser.add_argument("--segmenter-backend", default="torch", help="torch or onnx")
+    parser.add_argument("--no-thoughts", action="store_true", help="Skip thought segmentation")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    from faster_whisper import WhisperModel
+    device = args.device
+    if device == "auto":
+        import ctranslate2
+        device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    compute_type = args.compute_type or ("float16" if device == "cuda" else "int8")
+    model = WhisperModel(args.model, device=device, compute_type=compute_type, download_root=args.model_cache)
+
+    timeline = None
+    if not args.no_thoughts:
+        from semantic_segmenter import SemanticSegmenter, load_semantic_model
+        semantic_model = load_semantic_model(backend=args.segmenter_backend)
+        timeline = ThoughtTimeline(SemanticSegmenter(model=semantic_model))
+
+    with open(args.audio, "rb") as f:
+        audio = decode_audio(f.read())
+    duration = len(audio) / SAMPLE_RATE
+
+    started = time.monotonic()
+    transcriber = BatchTranscriber(model, create_vad_backend(args.vad), batch_size=args.batch_size)
+    segments = []
+    for progress in transcriber.transcribe(audio):
+        segments.extend(progress["segments"])
+        if timeline and progress["segments"]:
+            # One encode call per batch instead of one per segment
+            embeddings = semantic_model.encode([s["text"].strip() for s in progress["segments"]])
+            for segment, embedding in zip(progress["segments"], embeddings):
+                timeline.add(segment, embedding)
+        print(f"{progress['processed']:.0f}/{duration:.0f}s ({progress['chunks_done']}/{progress['chunks_total']} chunks)", file=sys.stderr)
+    if timeline:
+        timeline.finish()
+    elapsed = time.monotonic() - started
+
+    result = {
+        "duration": round(duration, 2),
+        "elapsed": round(elapsed, 2),
+        "rtf": round(elapsed / duration, 4) if duration >= 0.01 else None,
+        "segments": segments,
+        "thoughts": timeline.thoughts if timeline else []
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    print(f"Transcribed {duration:.0f}s of audio in {elapsed:.1f}s (RTF {result['rtf']})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
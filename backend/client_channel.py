@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from fastapi import WebSocket
+
+from metrics import CLIENT_SEND_SECONDS
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+def is_droppable(message: Dict) -> bool:
+    """Partial transcriptions are superseded by the next one; everything else must arrive."""
+    return message.get("type") == "transcription" and not message.get("is_final")
+
+
+def is_answer_delta(message: Dict, response_id: Optional[str] = None) -> bool:
+    return message.get("type") == "ai_log_delta" and (response_id is None or message.get("id") == response_id)
+
+
+class ClientChannel:
+    """
+    Bounded outbound queue plus a dedicated sender task for one websocket.
+
+    `send()` never blocks, so a slow client (a phone on bad Wi-Fi) only delays
+    itself. Streamed answer deltas still waiting in the queue are merged with the
+    next delta for the same answer (once per broadcast, shared by every client
+    holding the same queued delta), and dropped once its final `ai_log` (which
+    carries the full text) or cancellation is queued. When the queue is full,
+    queued partial transcriptions are dropped first; a client that still can't
+    keep up with finals and AI logs is disconnected so it can reconnect and
+    resync from its last seq.
+    """
+
+    def __init__(self, websocket: WebSocket, role: str, max_queue: int = 256,
+                 on_close: Optional[Callable[["ClientChannel"], None]] = None):
+        self.websocket = websocket
+        self.role = role
+        self.max_queue = max_queue
+        self.on_close = on_close
+        self.queue: deque = deque()
+        # Partial revision this client will hold per source once the queue drains (None = unknown)
+        self.partial_revs: Dict[str, Optional[int]] = {}
+        self.ready = asyncio.Event()
+        self.closed = False
+
+        # Stats
+        self.sent = 0
+        self.dropped = 0
+        self.last_send_ms = 0.0
+
+        self.task = asyncio.create_task(self._sender())
+
+    def send(self, message: Dict, frame: Optional[str] = None,
+             keyframe: Optional[Callable[[], str]] = None, merges: Optional[Dict] = None) -> bool:
+        """
+        Queues `frame` (the encoded message; encoded here if not given). `message`
+        is only inspected for the overflow policy, so broadcasters encode once and
+        pass the same frame to every client.
+
+        Partial deltas come with a `keyframe` factory; it is used instead of the
+        delta when this client doesn't hold the revision the delta builds on.
+        Answer deltas may come with `merges`, a dict shared by every client of one
+        broadcast, so a queued delta held by several clients is merged and
+        encoded once for all of them.
+        """
+        if self.closed:
+            return False
+        if frame is None:
+            frame = dumps(message)
+
+        if is_answer_delta(message) and self._coalesce_delta(message, merges):
+            return True
+        if message.get("type") in ("ai_log", "ai_log_cancelled") and message.get("id") is not None:
+            # The final answer carries the full text; a cancelled one is discarded anyway
+            self._drop_where(lambda m: is_answer_delta(m, message["id"]))
+
+        source = message.get("source")
+        if is_droppable(message):
+            # A newer partial makes any queued one from the same source stale
+            self._drop_where(lambda m: is_droppable(m) and m.get("source") == source)
+
+        if len(self.queue) >= self.max_queue and not self._drop_where(is_droppable, limit=1):
+            logger.warning(f"Client {self.name} is too slow ({len(self.queue)} queued messages), disconnecting")
+            self.close(code=1013)
+            return False
+
+        if message.get("type") == "transcription" and source is not None:
+            if message.get("is_final"):
+                # A final ends the utterance; the next partial chain starts from revision 0
+                self.partial_revs[source] = 0
+            elif "rev" in message:
+                if keyframe is not None and message.get("base_rev") != self.partial_revs.get(source):
+                    frame = keyframe()
+                self.partial_revs[source] = message["rev"]
+
+        self.queue.append((time.monotonic(), message, frame))
+        self.ready.set()
+        return True
+
+    def _coalesce_delta(self, message: Dict, merges: Optional[Dict]) -> bool:
+        """Appends `message`'s text to a queued delta of the same answer, if there is one."""
+        for i, (queued_at, queued, _) in enumerate(self.queue):
+            if is_answer_delta(queued, message.get("id")):
+                # Clients that fell behind by the same deltas hold the same queued dict (an earlier
+                # merge handed it to all of them), so it is keyed by identity; the entry keeps it alive
+                cached = merges.get(id(queued)) if merges is not None else None
+                if cached is None or cached[0] is not queued:
+                    merged = {**queued, "text": queued["text"] + message["text"]}
+                    cached = (queued, merged, dumps(merged))
+                    if merges is not None:
+                        merges[id(queued)] = cached
+                self.queue[i] = (queued_at, cached[1], cached[2])
+                return True
+        return False
+
+    def _drop_where(self, predicate, limit: Optional[int] = None) -> int:
+        kept = deque()
+        dropped = 0
+        for item in self.queue:
+            if predicate(item[1]) and (limit is None or dropped < limit):
+                dropped += 1
+                if item[1].get("source") is not None:
+                    self.partial_revs[item[1]["source"]] = None
+            else:
+                kept.append(item)
+        if dropped:
+            self.queue = kept
+            self.dropped += dropped
+        return dropped
+
+    async def _sender(self):
+        try:
+            while True:
+                await self.ready.wait()
+                while self.queue:
+                    queued_at, _, frame = self.queue.popleft()
+                    started = time.monotonic()
+                    await self.websocket.send_text(frame)
+                    finished = time.monotonic()
+                    self.last_send_ms = (finished - started) * 1000.0
+                    CLIENT_SEND_SECONDS.observe(finished - queued_at, role=self.role)
+                    self.sent += 1
+                self.ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"Send to client {self.name} failed: {e}")
+            self.close()
+
+    def close(self, code: Optional[int] = None):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+        if code is not None:
+            asyncio.create_task(self._close_websocket(code))
+        if self.on_close:
+            self.on_close(self)
+
+    async def _close_websocket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    @property
+    def name(self) -> str:
+        client = self.websocket.client
+        return f"{self.role}@{client.host}:{client.port}" if client else self.role
+
+    @property
+    def lag(self) -> float:
+        """Seconds the oldest queued message has been waiting."""
+        return time.monotonic() - self.queue[0][0] if self.queue else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "client": self.name,
+            "role": self.role,
+            "queue_depth": len(self.queue),
+            "lag_ms": round(self.lag * 1000.0, 1),
+            "last_send_ms": round(self.last_send_ms, 1),
+            "sent": self.sent,
+            "dropped": self.dropped
+        }
@@ -0,0 +1,114 @@
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Int8 exports shipped in the sentence-transformers model repos, in order of preference
+ONNX_INT8_FILES = [
+    "onnx/model_qint8_avx512_vnni.onnx",
+    "onnx/model_quint8_avx2.onnx",
+    "onnx/model_qint8_arm64.onnx",
+]
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if denominator == 0.0:
+        return 0.0
+    return float(np.dot(a, b) / denominator)
+
+
+class SentenceTransformerBackend:
+    """The original sentence-transformers model (torch); runs on CUDA when available."""
+
+    def __init__(self, model_name: str):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.model = SentenceTransformer(model_name, device=self.device)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+
+class OnnxEmbeddingBackend:
+    """
+    Int8-quantized ONNX export of the same model on ONNX Runtime (CPU).
+
+    Tokenization uses the `tokenizers` library directly and pooling is done in
+    NumPy (attention-masked mean, L2 normalized, as in the sentence-transformers
+    pipeline), so neither torch nor transformers is imported. `model_dir` may
+    point at a local export; otherwise the model repo's int8 export is fetched.
+    A directory with only an fp32 `model.onnx` is quantized on first load.
+    """
+
+    def __init__(self, model_name: str, model_dir: Optional[str] = None, max_length: int = 256,
+                 threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path, tokenizer_path = self._resolve_files(model_name, model_dir)
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.device = "cpu"
+        logger.info(f"ONNX embedding model loaded from {model_path}")
+
+    @staticmethod
+    def _resolve_files(model_name: str, model_dir: Optional[str]):
+        if model_dir is None:
+            from huggingface_hub import snapshot_download
+            repo = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            model_dir = snapshot_download(repo, allow_patterns=ONNX_INT8_FILES + ["tokenizer.json"])
+
+        tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        for name in ["model_int8.onnx"] + ONNX_INT8_FILES:
+            path = os.path.join(model_dir, name)
+            if os.path.exists(path):
+                return path, tokenizer_path
+
+        fp32_path = next(
+            (p for p in (os.path.join(model_dir, "model.onnx"), os.path.join(model_dir, "onnx", "model.onnx")) if os.path.exists(p)),
+            None
+        )
+        if fp32_path is None:
+            raise FileNotFoundError(f"No ONNX model found in {model_dir}")
+
+        # Dynamic quantization: int8 weights, activations quantized on the fly
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(model_dir, "model_int8.onnx")
+        logger.info(f"Quantizing {fp32_path} to int8...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return int8_path, tokenizer_path
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": np.zeros_like(input_ids)}
+        feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+def create_embedding_backend(model_name: str, backend: str = "torch", model_dir: Optional[str] = None):
+    if backend == "onnx":
+        return OnnxEmbeddingBackend(model_name, model_dir=model_dir)
+    if backend != "torch":
+        logger.warning(f"Unknown embedding backend '{backend}', using torch")
+    return SentenceTransformerBackend(model_name)
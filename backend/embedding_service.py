@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Deque, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    Runs the shared sentence-embedding model on a dedicated worker thread.
+
+    Sessions await `encode()` instead of calling the model on the event loop.
+    Requests arriving within `max_wait_ms` of the oldest pending one are
+    encoded together in a single `model.encode` call of up to `max_batch_size`
+    texts, and each request gets its own future back.
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 10.0):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self.pending: Deque[Tuple[str, Future, float]] = deque()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+
+        # Stats
+        self.texts_encoded = 0
+        self.batches_run = 0
+        self.last_batch_size = 0
+        self.total_encode_time = 0.0
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
+        with self.condition:
+            for _, future, _ in self.pending:
+                future.cancel()
+            self.pending.clear()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        with self.condition:
+            self.pending.append((text, future, time.monotonic()))
+            self.condition.notify()
+        return future
+
+    async def encode(self, text: str):
+        """Embedding of `text`, computed off the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self) -> Dict:
+        with self.condition:
+            queue_depth = len(self.pending)
+        return {
+            "queue_depth": queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches_run": self.batches_run,
+            "texts_encoded": self.texts_encoded,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(self.texts_encoded / self.batches_run, 2) if self.batches_run else 0.0,
+            "avg_encode_ms": round(self.total_encode_time / self.batches_run * 1000.0, 2) if self.batches_run else 0.0
+        }
+
+    def _next_batch(self) -> List[Tuple[str, Future, float]]:
+        with self.condition:
+            while not self.pending and not self.stop_event.is_set():
+                self.condition.wait()
+            if self.stop_event.is_set():
+                return []
+
+            # Hold the batch open until it fills up or the oldest request hits its deadline
+            deadline = self.pending[0][2] + self.max_wait
+            while len(self.pending) < self.max_batch_size and not self.stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = []
+            while self.pending and len(batch) < self.max_batch_size:
+                request = self.pending.popleft()
+                if request[1].set_running_or_notify_cancel():
+                    batch.append(request)
+            return batch
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            try:
+                embeddings = self.model.encode([text for text, _, _ in batch])
+            except Exception as e:
+                logger.error(f"Error in embedding service: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+            self.total_encode_time += time.monotonic() - started
+            self.texts_encoded += len(batch)
+            self.batches_run += 1
+            self.last_batch_size = len(batch)
@@ -0,0 +1,526 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError, shared_memory
+from multiprocessing.connection import Client, Listener, wait
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from inference_scheduler import InferenceScheduler, TranscriptionJob, SAMPLE_RATE, warm_up
+from metrics import DECODES, INFERENCE_RESTARTS, REAL_TIME_FACTOR, STAGE_SECONDS, session_label
+
+logger = logging.getLogger(__name__)
+
+# How a worker process finds its way back to the pool (set in its environment, not on the command line)
+ADDRESS_ENV = "INFERENCE_POOL_ADDRESS"
+AUTHKEY_ENV = "INFERENCE_POOL_AUTHKEY"
+CONFIG_ENV = "INFERENCE_POOL_CONFIG"
+
+
+class SharedAudioRing:
+    """
+    Float32 audio ring in shared memory, written by the hub and read by one worker process.
+
+    The hub copies each job's window in and sends only its offset over the pipe;
+    the worker decodes straight from the shared pages. Regions are handed out in
+    order and stay reserved until their job's reply arrives, so the worker's
+    view is never overwritten mid-decode. Not thread-safe; the pool locks around it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.capacity * 4)
+        self.array = np.ndarray((self.capacity,), dtype=np.float32, buffer=self.shm.buf)
+        # start -> [length, released], oldest first
+        self.regions: "OrderedDict[int, List]" = OrderedDict()
+        self.head = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def used(self) -> int:
+        return sum(length for length, _ in self.regions.values())
+
+    def write(self, audio: np.ndarray) -> Optional[int]:
+        """Copies `audio` into a free region and returns its offset, or None if it doesn't fit right now."""
+        n = len(audio)
+        if n == 0 or n > self.capacity:
+            return None
+        if not self.regions:
+            self.head = 0
+        tail = next(iter(self.regions)) if self.regions else 0
+
+        if not self.regions or self.head > tail:
+            # Free space is [head, capacity) and [0, tail)
+            if self.capacity - self.head >= n:
+                start = self.head
+            elif tail >= n:
+                start = 0
+            else:
+                return None
+        elif tail - self.head >= n:
+            # Wrapped around: free space is [head, tail)
+            start = self.head
+        else:
+            return None
+
+        self.array[start:start + n] = audio
+        self.regions[start] = [n, False]
+        self.head = start + n
+        return start
+
+    def release(self, start: int):
+        region = self.regions.get(start)
+        if region is None:
+            return
+        region[1] = True
+        # Replies can arrive out of order; space is reclaimed once the oldest region is done
+        while self.regions and next(iter(self.regions.values()))[1]:
+            self.regions.popitem(last=False)
+
+    def reset(self):
+        self.regions.clear()
+        self.head = 0
+
+    def close(self):
+        del self.array
+        self.shm.close()
+        self.shm.unlink()
+
+
+class _PoolJob:
+    def __init__(self, job_key: str, offset: Optional[int]):
+        self.job_key = job_key
+        self.offset = offset
+        self.future: Future = Future()
+        self.submitted_at = time.monotonic()
+
+
+class _WorkerSlot:
+    """Hub-side state of one worker process; a respawned process takes over the same slot and ring."""
+
+    def __init__(self, slot: int, device_index: int, ring: SharedAudioRing):
+        self.slot = slot
+        self.device_index = device_index
+        self.ring = ring
+        self.process: Optional[subprocess.Popen] = None
+        self.conn = None
+        # starting -> ready -> down (-> starting again after a backoff)
+        self.state = "down"
+        self.started_at = 0.0
+        self.last_pong = 0.0
+        self.next_start = 0.0
+        self.failures = 0
+        self.jobs: Dict[int, _PoolJob] = {}
+
+        # Stats
+        self.jobs_completed = 0
+        self.inline_jobs = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+
+
+class ProcessInferencePool:
+    """
+    Runs decodes in a pool of worker processes instead of a thread of the hub.
+
+    Each process loads its own WhisperModel (spread over `devices` when there
+    are several GPUs) and batches the jobs it receives with its own
+    InferenceScheduler, so decoding never competes with the event loop for the
+    GIL and a crashed or wedged model only takes its own process down. Audio
+    travels through a per-worker SharedAudioRing; the pipe carries offsets and
+    results. A monitor thread pings every worker, kills the ones that stop
+    answering or sit on a job past `job_timeout`, fails their in-flight jobs
+    and respawns them with a backoff. Same `transcribe()`/`stats()` interface as
+    InferenceScheduler, so listeners don't know which one they talk to.
+    """
+
+    def __init__(self, processes: int, config: Dict, devices: Sequence[int] = (),
+                 max_batch_size: int = 8, max_wait_ms: float = 25.0, ring_seconds: float = 120.0,
+                 job_timeout: float = 60.0, health_interval: float = 5.0, health_timeout: float = 30.0,
+                 startup_timeout: float = 600.0):
+        self.config = dict(config, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        self.max_batch_size = max_batch_size
+        self.job_timeout = job_timeout
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.startup_timeout = startup_timeout
+
+        devices = list(devices) or [0]
+        self.workers = [
+            _WorkerSlot(slot, devices[slot % len(devices)], SharedAudioRing(int(ring_seconds * SAMPLE_RATE)))
+            for slot in range(max(1, processes))
+        ]
+        self.next_job_id = 1
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.authkey = os.urandom(32)
+        self.listener: Optional[Listener] = None
+        self.acceptor = threading.Thread(target=self._accept, name="inference-pool-accept", daemon=True)
+        self.monitor = threading.Thread(target=self._run, name="inference-pool", daemon=True)
+
+    def start(self):
+        self.listener = Listener(authkey=self.authkey)
+        self.acceptor.start()
+        with self.condition:
+            for worker in self.workers:
+                self._spawn(worker)
+        self.monitor.start()
+
+    def wait_ready(self, timeout: Optional[float] = None):
+        """Blocks until at least one worker can take jobs. Raises if every worker failed to start."""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.startup_timeout)
+        with self.condition:
+            while not any(worker.state == "ready" for worker in self.workers):
+                if all(worker.failures for worker in self.workers):
+                    errors = "; ".join(sorted({worker.last_error or "unknown error" for worker in self.workers}))
+                    raise RuntimeError(f"Inference workers failed to start: {errors}")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Inference workers did not become ready in time")
+                self.condition.wait(min(remaining, 1.0))
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.monitor.is_alive():
+            self.monitor.join()
+        with self.condition:
+            for worker in self.workers:
+                self._send(worker, None)
+        for worker in self.workers:
+            self._terminate(worker, grace=10.0)
+            self._disconnect(worker)
+            for job in worker.jobs.values():
+                job.future.cancel()
+            worker.jobs.clear()
+            worker.ring.close()
+        if self.listener is not None:
+            self.listener.close()
+
+    def submit(self, job_key: str, audio: np.ndarray, initial_prompt: Optional[str] = None) -> Future:
+        audio = np.asarray(audio, dtype=np.float32)
+        with self.condition:
+            # A worker may be between restarts; wait for one rather than failing the listener's pass
+            deadline = time.monotonic() + self.job_timeout
+            while True:
+                ready = [worker for worker in self.workers if worker.state == "ready"]
+                if ready:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.stop_event.is_set():
+                    raise RuntimeError("No inference worker is available")
+                self.condition.wait(remaining)
+
+            worker = min(ready, key=lambda w: len(w.jobs))
+            job_id = self.next_job_id
+            self.next_job_id += 1
+            offset = worker.ring.write(audio)
+            # A full ring (or an oversized window) falls back to pickling the audio through the pipe
+            inline = audio if offset is None else None
+            if inline is not None:
+                worker.inline_jobs += 1
+            job = worker.jobs[job_id] = _PoolJob(job_key, offset)
+            if not self._send(worker, ("job", job_id, job_key, offset, len(audio), initial_prompt, inline)):
+                del worker.jobs[job_id]
+                if offset is not None:
+                    worker.ring.release(offset)
+                raise RuntimeError(f"Inference worker {worker.slot} is unreachable")
+        return job.future
+
+    def transcribe(self, job_key: str, audio: np.ndarray, initial_prompt: Optional[str] = None) -> List[Dict]:
+        """Blocking helper for worker threads. Returns segments as dicts with timestamps relative to `audio`."""
+        return self.submit(job_key, audio, initial_prompt).result()
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self.condition:
+            workers = [
+                {
+                    "slot": worker.slot,
+                    "pid": worker.process.pid if worker.process else None,
+                    "state": worker.state,
+                    "device_index": worker.device_index,
+                    "jobs_in_flight": len(worker.jobs),
+                    "jobs_completed": worker.jobs_completed,
+                    "inline_jobs": worker.inline_jobs,
+                    "restarts": worker.restarts,
+                    "last_error": worker.last_error,
+                    "last_pong_s": round(now - worker.last_pong, 1) if worker.state == "ready" else None,
+                    "ring_used_seconds": round(worker.ring.used / SAMPLE_RATE, 2)
+                }
+                for worker in self.workers
+            ]
+        return {
+            "mode": "processes",
+            "queue_depth": sum(worker["jobs_in_flight"] for worker in workers),
+            "max_batch_size": self.max_batch_size,
+            "jobs_completed": sum(worker["jobs_completed"] for worker in workers),
+            "workers": workers
+        }
+
+    # --- Process management (monitor thread) ---------------------------------------------------
+
+    def _spawn(self, worker: _WorkerSlot):
+        env = dict(os.environ)
+        env[ADDRESS_ENV] = json.dumps(self.listener.address)
+        env[AUTHKEY_ENV] = self.authkey.hex()
+        env[CONFIG_ENV] = json.dumps(dict(
+            self.config, slot=worker.slot, device_index=worker.device_index,
+            shm_name=worker.ring.name, ring_capacity=worker.ring.capacity
+        ))
+        # A fresh interpreter running this file: the hub's own modules (and their side effects) are never imported
+        worker.process = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+        worker.conn = None
+        worker.state = "starting"
+        worker.started_at = time.monotonic()
+        logger.info(f"Started inference worker {worker.slot} (pid {worker.process.pid}, device {worker.device_index})")
+
+    def _accept(self):
+        while not self.stop_event.is_set():
+            try:
+                conn = self.listener.accept()
+                _, slot, pid = conn.recv()
+            except (OSError, EOFError, AuthenticationError, ValueError, TypeError):
+                continue
+            with self.condition:
+                worker = self.workers[slot] if 0 <= slot < len(self.workers) else None
+                if worker is None or worker.process is None or worker.process.pid != pid:
+                    conn.close()
+                    continue
+                worker.conn = conn
+
+    def _send(self, worker: _WorkerSlot, message) -> bool:
+        if worker.conn is None:
+            return False
+        try:
+            worker.conn.send(message)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _run(self):
+        next_check = time.monotonic() + self.health_interval
+        while not self.stop_event.is_set():
+            with self.condition:
+                connections = {worker.conn: worker for worker in self.workers if worker.conn is not None}
+            if connections:
+                readable = wait(list(connections), timeout=0.5)
+            else:
+                readable = []
+                self.stop_event.wait(0.5)
+
+            for conn in readable:
+                worker = connections[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    try:
+                        code = worker.process.wait(timeout=1.0)
+                    except subprocess.TimeoutExpired:
+                        code = None
+                    self._worker_down(worker, f"exited with code {code}" if code is not None else "lost its connection")
+                    continue
+                self._handle(worker, message)
+
+            if time.monotonic() >= next_check:
+                self._check_health()
+                next_check = time.monotonic() + self.health_interval
+
+    def _handle(self, worker: _WorkerSlot, message):
+        kind = message[0]
+        if kind in ("result", "cancelled", "error"):
+            with self.condition:
+                job = worker.jobs.pop(message[1], None)
+                if job is None:
+                    return
+                if job.offset is not None:
+                    worker.ring.release(job.offset)
+                if kind == "result":
+                    worker.jobs_completed += 1
+            if kind == "result":
+                _, _, segments, (_, decode_seconds, rtf) = message
+                # Whatever isn't decoding is queueing: the pipe round trip plus the worker's batching wait
+                session = session_label(job.job_key)
+                STAGE_SECONDS.observe(max(0.0, time.monotonic() - job.submitted_at - decode_seconds), session=session, stage="queue_wait")
+                STAGE_SECONDS.observe(decode_seconds, session=session, stage="decode")
+                REAL_TIME_FACTOR.observe(rtf, session=session)
+                DECODES.inc(session=session)
+                job.future.set_result(segments)
+            elif kind == "cancelled":
+                # Superseded by a newer window from the same listener, as with the in-process scheduler
+                job.future.cancel()
+            else:
+                job.future.set_exception(RuntimeError(message[2]))
+        elif kind == "pong":
+            worker.last_pong = time.monotonic()
+        elif kind == "ready":
+            with self.condition:
+                worker.state = "ready"
+                worker.failures = 0
+                worker.last_pong = time.monotonic()
+                self.condition.notify_all()
+            logger.info(f"Inference worker {worker.slot} ready (load {message[1]}ms, warm-up {message[2]}ms)")
+        elif kind == "failed":
+            self._worker_down(worker, f"failed to load the model: {message[1]}")
+
+    def _check_health(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.state == "down":
+                if now >= worker.next_start and not self.stop_event.is_set():
+                    worker.restarts += 1
+                    INFERENCE_RESTARTS.inc()
+                    with self.condition:
+                        self._spawn(worker)
+            elif worker.process.poll() is not None:
+                self._worker_down(worker, f"exited with code {worker.process.returncode}")
+            elif worker.state == "starting":
+                if now - worker.started_at > self.startup_timeout:
+                    self._worker_down(worker, f"did not become ready within {self.startup_timeout:.0f}s")
+            elif now - worker.last_pong > self.health_timeout:
+                self._worker_down(worker, f"stopped answering health checks ({now - worker.last_pong:.0f}s)")
+            elif any(now - job.submitted_at > self.job_timeout for job in list(worker.jobs.values())):
+                self._worker_down(worker, f"has held a job for over {self.job_timeout:.0f}s")
+            else:
+                with self.condition:
+                    self._send(worker, ("ping", now))
+
+    def _worker_down(self, worker: _WorkerSlot, reason: str):
+        if self.stop_event.is_set() or worker.state == "down":
+            return
+        with self.condition:
+            self._disconnect(worker)
+            jobs = list(worker.jobs.values())
+            worker.jobs.clear()
+            worker.ring.reset()
+            worker.state = "down"
+            worker.failures += 1
+            worker.last_error = reason
+            # Back off when a worker keeps dying (e.g. a model that can't load), up to a minute between tries
+            delay = min(60.0, 2.0 ** (worker.failures - 1))
+            worker.next_start = time.monotonic() + delay
+            self.condition.notify_all()
+        self._terminate(worker, grace=0.0)
+        logger.error(f"Inference worker {worker.slot} {reason}; restarting in {delay:.0f}s, failing {len(jobs)} in-flight jobs")
+        for job in jobs:
+            job.future.set_exception(RuntimeError(f"Inference worker {worker.slot} {reason}"))
+
+    def _disconnect(self, worker: _WorkerSlot):
+        if worker.conn is not None:
+            worker.conn.close()
+            worker.conn = None
+
+    def _terminate(self, worker: _WorkerSlot, grace: float):
+        """Gives the process `grace` seconds to exit on its own, then kills it."""
+        process = worker.process
+        if process is None or process.poll() is not None:
+            return
+        if grace > 0:
+            try:
+                process.wait(timeout=grace)
+            except subprocess.TimeoutExpired:
+                pass
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+# --- Worker process ------------------------------------------------------------------------------
+
+def _attach_ring(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment for cleanup at exit; the hub owns it, so undo that
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _reply(job_id: int, job: TranscriptionJob, future: Future):
+    if future.cancelled():
+        return ("cancelled", job_id)
+    if future.exception() is not None:
+        return ("error", job_id, str(future.exception()))
+    return ("result", job_id, future.result(), (job.queue_wait, job.decode_seconds, job.rtf))
+
+
+def worker_main() -> int:
+    config = json.loads(os.environ[CONFIG_ENV])
+    address = json.loads(os.environ[ADDRESS_ENV])
+    logging.basicConfig(level=logging.INFO, format=f"%(levelname)s:inference-worker-{config['slot']}:%(message)s")
+
+    conn = Client(tuple(address) if isinstance(address, list) else address, authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    conn.send(("hello", config["slot"], os.getpid()))
+    shm = _attach_ring(config["shm_name"])
+    ring = np.ndarray((config["ring_capacity"],), dtype=np.float32, buffer=shm.buf)
+
+    try:
+        started = time.monotonic()
+        from faster_whisper import WhisperModel
+        model = WhisperModel(
+            config["model_size"], device=config["device"], device_index=config["device_index"],
+            compute_type=config["compute_type"], cpu_threads=config["cpu_threads"],
+            download_root=config["download_root"]
+        )
+        load_ms = round((time.monotonic() - started) * 1000.0, 1)
+        started = time.monotonic()
+        warm_up(model)
+        warmup_ms = round((time.monotonic() - started) * 1000.0, 1)
+    except Exception as e:
+        conn.send(("failed", str(e)))
+        return 1
+
+    scheduler = InferenceScheduler(
+        model, max_batch_size=config["max_batch_size"], max_wait_ms=config["max_wait_ms"], record_metrics=False
+    )
+    scheduler.start()
+    send_lock = threading.Lock()
+
+    def send(message):
+        # Replies come from the scheduler thread, pongs from this one
+        with send_lock:
+            try:
+                conn.send(message)
+            except OSError:
+                pass
+
+    send(("ready", load_ms, warmup_ms))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            # The hub is gone; don't outlive it
+            break
+        if message is None:
+            break
+        if message[0] == "ping":
+            send(("pong", message[1]))
+        elif message[0] == "job":
+            _, job_id, job_key, offset, length, prompt, inline = message
+            # Decoded straight from shared memory; the hub keeps the region until we reply
+            audio = inline if inline is not None else ring[offset:offset + length]
+            job = TranscriptionJob(job_key, audio, prompt)
+            scheduler.enqueue(job)
+            job.future.add_done_callback(lambda future, job_id=job_id, job=job: send(_reply(job_id, job, future)))
+
+    scheduler.stop()
+    del ring
+    shm.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(worker_main())
@@ -0,0 +1,314 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from metrics import DECODES, REAL_TIME_FACTOR, STAGE_SECONDS, session_label
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+DEFAULT_PROMPT = "Interview transcription. Stable and fast."
+
+# Shared by every decode so batched and single-job results are comparable
+DECODE_OPTIONS = dict(
+    beam_size=1,        # Fast processing (3080 handles this in ms)
+    language="en",
+    word_timestamps=True,
+)
+# Whisper's own VAD filter, applied the same way whether a job is decoded alone or in a batch
+VAD_PARAMETERS = dict(min_silence_duration_ms=600)
+
+
+class TranscriptionJob:
+    def __init__(self, session_id: str, audio: np.ndarray, initial_prompt: Optional[str]):
+        self.session_id = session_id
+        self.audio = audio
+        self.initial_prompt = initial_prompt or DEFAULT_PROMPT
+        self.future: Future = Future()
+        self.submitted_at = time.monotonic()
+        # Filled in once decoded
+        self.queue_wait = 0.0
+        self.decode_seconds = 0.0
+        self.rtf = 0.0
+
+
+def segment_to_dict(segment, offset: float = 0.0, speech_map=None) -> Dict:
+    """
+    Converts a faster-whisper segment to the dict sessions and offline jobs use. Timestamps are
+    made relative to the job's audio: minus the clip `offset`, plus any silence the VAD cut out.
+    """
+    def restore(start: float, end: float):
+        start, end = start - offset, end - offset
+        if speech_map is None:
+            return start, end
+        chunk = speech_map.get_chunk_index((start + end) / 2.0)
+        return speech_map.get_original_time(start, chunk), speech_map.get_original_time(end, chunk)
+
+    words = []
+    for w in segment.words or []:
+        start, end = restore(w.start, w.end)
+        words.append({"start": start, "end": end, "word": w.word})
+    start, end = restore(segment.start, segment.end)
+    if speech_map is not None and words:
+        # As faster-whisper does when restoring VAD timestamps: the words pin the segment
+        start, end = words[0]["start"], words[-1]["end"]
+    return {
+        "id": segment.id,
+        "start": start,
+        "end": end,
+        "text": segment.text,
+        "words": words
+    }
+
+
+def warm_up(model):
+    """A second of faint noise through the full decode path (no VAD filter, so the decoder really runs)."""
+    audio = np.random.default_rng(0).normal(0.0, 0.01, SAMPLE_RATE).astype(np.float32)
+    segments, _ = model.transcribe(audio, vad_filter=False, **DECODE_OPTIONS)
+    list(segments)
+
+
+class InferenceScheduler:
+    """
+    Owns the shared WhisperModel and serializes every session's decode requests onto it.
+
+    Sessions submit their current window and block on the result. Jobs that arrive
+    within `max_wait_ms` of the oldest pending job are decoded together in a single
+    batched call. The pipeline takes a single prompt, so with batching on every
+    job is decoded with DEFAULT_PROMPT: sessions' committed-text prompts differ
+    in almost every pass and would leave each batch a single job. Each session
+    may only have one job pending (a newer window supersedes the older one), and
+    the queue is served oldest-first, so a chatty session can never starve a
+    quiet one.
+
+    Other users of the model (offline file transcription) hand it work through
+    `run_exclusive()`, which runs between batches, so the model is only ever
+    used from this thread.
+    """
+
+    def __init__(self, model, max_batch_size: int = 8, max_wait_ms: float = 25.0, record_metrics: bool = True):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        # Worker processes hand their timings back to the hub instead of recording them here
+        self.record_metrics = record_metrics
+
+        self.batched_pipeline = None
+        if self.max_batch_size > 1:
+            try:
+                from faster_whisper import BatchedInferencePipeline
+                from faster_whisper.vad import SpeechTimestampsMap, VadOptions, get_speech_timestamps
+                self.batched_pipeline = BatchedInferencePipeline(model=model)
+                self.vad_options = VadOptions(**VAD_PARAMETERS)
+                self.get_speech_timestamps = get_speech_timestamps
+                self.speech_timestamps_map = SpeechTimestampsMap
+            except ImportError:
+                logger.warning("faster-whisper has no BatchedInferencePipeline; decoding jobs one at a time.")
+
+        self.pending: "OrderedDict[str, TranscriptionJob]" = OrderedDict()
+        self.exclusive: deque = deque()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+
+        # Stats
+        self.jobs_completed = 0
+        self.jobs_superseded = 0
+        self.batches_run = 0
+        self.batch_size_counts: Dict[int, int] = {}
+        self.last_batch_size = 0
+        self.total_queue_wait = 0.0
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join()
+        with self.condition:
+            for job in self.pending.values():
+                job.future.cancel()
+            self.pending.clear()
+            for _, future in self.exclusive:
+                future.cancel()
+            self.exclusive.clear()
+
+    def submit(self, session_id: str, audio: np.ndarray, initial_prompt: Optional[str] = None) -> Future:
+        return self.enqueue(TranscriptionJob(session_id, audio, initial_prompt))
+
+    def enqueue(self, job: TranscriptionJob) -> Future:
+        session_id = job.session_id
+        if self.batched_pipeline is not None:
+            # Same prompt whether or not another session shares the batch
+            job.initial_prompt = DEFAULT_PROMPT
+        with self.condition:
+            superseded = self.pending.pop(session_id, None)
+            if superseded:
+                superseded.future.cancel()
+                self.jobs_superseded += 1
+            self.pending[session_id] = job
+            self.condition.notify()
+        return job.future
+
+    def run_exclusive(self, fn: Callable) -> Future:
+        """Runs `fn()` on the scheduler thread after the current batch. Keep each call short: live decodes wait behind it."""
+        future: Future = Future()
+        with self.condition:
+            if self.stop_event.is_set():
+                future.cancel()
+                return future
+            self.exclusive.append((fn, future))
+            self.condition.notify()
+        return future
+
+    def transcribe(self, session_id: str, audio: np.ndarray, initial_prompt: Optional[str] = None) -> List[Dict]:
+        """Blocking helper for worker threads. Returns segments as dicts with timestamps relative to `audio`."""
+        return self.submit(session_id, audio, initial_prompt).result()
+
+    def stats(self) -> Dict:
+        with self.condition:
+            queue_depth = len(self.pending)
+        jobs_batched = sum(size * count for size, count in self.batch_size_counts.items())
+        return {
+            "queue_depth": queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches_run": self.batches_run,
+            "jobs_completed": self.jobs_completed,
+            "jobs_superseded": self.jobs_superseded,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_size": round(jobs_batched / self.batches_run, 2) if self.batches_run else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "avg_queue_wait_ms": round(self.total_queue_wait / self.jobs_completed * 1000.0, 2) if self.jobs_completed else 0.0
+        }
+
+    def _next_batch(self) -> List[TranscriptionJob]:
+        with self.condition:
+            while not self.pending and not self.exclusive and not self.stop_event.is_set():
+                self.condition.wait()
+            if self.stop_event.is_set() or not self.pending:
+                return []
+
+            # Hold the batch open until it fills up or the oldest job hits its deadline
+            oldest = next(iter(self.pending.values()))
+            deadline = oldest.submitted_at + self.max_wait
+            while len(self.pending) < self.max_batch_size and not self.stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch = []
+            while self.pending and len(batch) < self.max_batch_size:
+                _, job = self.pending.popitem(last=False)
+                if job.future.set_running_or_notify_cancel():
+                    batch.append(job)
+            return batch
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._decode_batch(batch)
+            self._run_exclusive()
+
+    def _run_exclusive(self):
+        # One call per pass of the loop, so live batches get the model in between
+        with self.condition:
+            if not self.exclusive:
+                return
+            fn, future = self.exclusive.popleft()
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+    def _decode_batch(self, batch: List[TranscriptionJob]):
+        started = time.monotonic()
+        try:
+            if len(batch) == 1 or self.batched_pipeline is None:
+                results = [self._decode_single(job) for job in batch]
+            else:
+                results = self._decode_batched(batch)
+        except Exception as e:
+            logger.error(f"Error in inference scheduler: {e}")
+            for job in batch:
+                job.future.set_exception(e)
+            return
+
+        decode_time = time.monotonic() - started
+        # A batch is one call, so every job in it shares the batch's real-time factor
+        rtf = decode_time / max(sum(len(job.audio) for job in batch) / SAMPLE_RATE, 1e-6)
+        for job, result in zip(batch, results):
+            job.queue_wait = started - job.submitted_at
+            job.decode_seconds = decode_time
+            job.rtf = rtf
+            self.total_queue_wait += job.queue_wait
+            if self.record_metrics:
+                session = session_label(job.session_id)
+                STAGE_SECONDS.observe(job.queue_wait, session=session, stage="queue_wait")
+                STAGE_SECONDS.observe(decode_time, session=session, stage="decode")
+                REAL_TIME_FACTOR.observe(rtf, session=session)
+                DECODES.inc(session=session)
+            job.future.set_result(result)
+
+        self.jobs_completed += len(batch)
+        self.batches_run += 1
+        self.last_batch_size = len(batch)
+        self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+
+    def _decode_single(self, job: TranscriptionJob) -> List[Dict]:
+        segments, info = self.model.transcribe(
+            job.audio,
+            vad_filter=True,
+            vad_parameters=VAD_PARAMETERS,
+            condition_on_previous_text=True,
+            initial_prompt=job.initial_prompt,
+            **DECODE_OPTIONS
+        )
+        return [segment_to_dict(segment) for segment in segments]
+
+    def _decode_batched(self, batch: List[TranscriptionJob]) -> List[List[Dict]]:
+        # Same VAD filter as a single decode: each job's speech is cut out and joined into one
+        # clip, the clips are laid end to end and the pipeline decodes each as one batch row
+        results: List[List[Dict]] = [[] for _ in batch]
+        rows = []
+        for i, job in enumerate(batch):
+            speech = self.get_speech_timestamps(job.audio, self.vad_options)
+            if speech:
+                audio = np.concatenate([job.audio[chunk["start"]:chunk["end"]] for chunk in speech])
+                rows.append((i, audio, self.speech_timestamps_map(speech, SAMPLE_RATE)))
+        if not rows:
+            return results
+
+        clips = []
+        offset = 0
+        for _, audio, _ in rows:
+            clips.append({"start": offset / SAMPLE_RATE, "end": (offset + len(audio)) / SAMPLE_RATE})
+            offset += len(audio)
+
+        segments, info = self.batched_pipeline.transcribe(
+            np.concatenate([audio for _, audio, _ in rows]),
+            clip_timestamps=clips,
+            batch_size=len(rows),
+            initial_prompt=DEFAULT_PROMPT,
+            **DECODE_OPTIONS
+        )
+
+        for segment in segments:
+            # Route each segment back to the clip containing its midpoint
+            midpoint = (segment.start + segment.end) / 2.0
+            for (i, _, speech_map), clip in zip(rows, clips):
+                if midpoint < clip["end"] or clip is clips[-1]:
+                    results[i].append(segment_to_dict(segment, clip["start"], speech_map))
+                    break
+        return results
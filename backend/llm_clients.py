@@ -0,0 +1,191 @@
+import json
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOCAL_MODEL_PREFIX = "local:"
+
+
+class OpenAIProvider:
+    """OpenAI, or any OpenAI-compatible server (llama.cpp, vLLM, LM Studio) when `base_url` is set."""
+
+    def __init__(self, api_key: Optional[str], base_url: Optional[str] = None):
+        import openai
+        # One client, and therefore one keep-alive connection pool, for every request
+        self.client = openai.AsyncOpenAI(api_key=api_key or "local", base_url=base_url)
+
+    async def stream_chat(self, model: str, messages: List[Dict], temperature: float) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self):
+        await self.client.close()
+
+
+class GeminiProvider:
+    """Gemini through google-generativeai; one GenerativeModel per model name."""
+
+    def __init__(self, api_key: Optional[str]):
+        # Imported here rather than at startup: the SDK is slow to import and only needed for Gemini models
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.models: Dict[str, object] = {}
+
+    async def stream_chat(self, model: str, messages: List[Dict], temperature: float) -> AsyncIterator[str]:
+        generative_model = self.models.get(model)
+        if generative_model is None:
+            import google.generativeai as genai
+            generative_model = genai.GenerativeModel(model)
+            self.models[model] = generative_model
+
+        contents = [
+            {"role": "user" if m["role"] == "user" else "model", "parts": [{"text": m["content"]}]}
+            for m in messages if m["role"] != "system"
+        ]
+        response = await generative_model.generate_content_async(
+            contents, generation_config={"temperature": temperature}, stream=True
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def close(self):
+        self.models.clear()
+
+
+class OllamaProvider:
+    """
+    Ollama's native chat API. The HTTP connection is kept alive between requests
+    and `keep_alive` asks Ollama to keep the model resident, so short prompts
+    don't pay for a reconnect or a model reload.
+    """
+
+    def __init__(self, base_url: str, keep_alive: str = "30m", timeout: float = 60.0):
+        import httpx
+        self.keep_alive = keep_alive
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=300.0)
+        )
+
+    async def stream_chat(self, model: str, messages: List[Dict], temperature: float) -> AsyncIterator[str]:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": temperature}
+        }
+        async with self.client.stream("POST", "/api/chat", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                content = chunk.get("message", {}).get("content")
+                if content:
+                    yield content
+                # No early exit on "done": the body has to be read to the end for the connection to be reused
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class LLMClientPool:
+    """
+    Long-lived LLM providers shared by every session, plus the rules that pick one per request.
+
+    Providers are created on first use and reused, so a suggestion rides on warm
+    connections instead of paying a new TLS handshake every time. Routing, in order:
+    1. `local:<model>` model names go to the local endpoint as `<model>`.
+    2. Models listed in `local_model_map` are served by their local replacement.
+    3. Prompts up to `local_max_prompt_chars` go to `local_model`.
+    4. Gemini models go to Gemini, everything else to OpenAI.
+    5. Without hosted API keys, everything goes to the local endpoint.
+    """
+
+    def __init__(self, openai_api_key: Optional[str] = None, gemini_api_key: Optional[str] = None,
+                 local_url: Optional[str] = None, local_api: str = "ollama", local_model: Optional[str] = None,
+                 local_keep_alive: str = "30m", local_model_map: Optional[Dict[str, str]] = None,
+                 local_max_prompt_chars: int = 0):
+        self.openai_api_key = openai_api_key
+        self.gemini_api_key = gemini_api_key
+        self.local_url = local_url
+        self.local_api = local_api
+        self.local_model = local_model
+        self.local_keep_alive = local_keep_alive
+        self.local_model_map = local_model_map or {}
+        self.local_max_prompt_chars = local_max_prompt_chars
+        self.providers: Dict[str, object] = {}
+
+        # Stats
+        self.requests_by_provider: Dict[str, int] = {}
+
+    def route(self, model: str, prompt: str = "") -> Tuple[Optional[str], str]:
+        """Returns (provider name, model name to send), or (None, model) if nothing can serve it."""
+        if self.local_url:
+            if model.startswith(LOCAL_MODEL_PREFIX):
+                return "local", model[len(LOCAL_MODEL_PREFIX):]
+            if model in self.local_model_map:
+                return "local", self.local_model_map[model]
+            if self.local_model and self.local_max_prompt_chars and 0 < len(prompt) <= self.local_max_prompt_chars:
+                return "local", self.local_model
+
+        if "gemini" in model.lower() and self.gemini_api_key:
+            return "gemini", model
+        if self.openai_api_key and not model.startswith(LOCAL_MODEL_PREFIX):
+            return "openai", model
+        if self.local_url:
+            return "local", self.local_model or model.replace(LOCAL_MODEL_PREFIX, "", 1)
+        return None, model
+
+    def provider(self, name: str):
+        provider = self.providers.get(name)
+        if provider is None:
+            if name == "openai":
+                provider = OpenAIProvider(self.openai_api_key)
+            elif name == "gemini":
+                provider = GeminiProvider(self.gemini_api_key)
+            elif self.local_api == "openai":
+                provider = OpenAIProvider(None, base_url=self.local_url)
+            else:
+                provider = OllamaProvider(self.local_url, keep_alive=self.local_keep_alive)
+            self.providers[name] = provider
+        return provider
+
+    async def stream_chat(self, model: str, messages: List[Dict], temperature: float = 0.7) -> AsyncIterator[str]:
+        """Yields the response text as it is generated. `messages` use the OpenAI chat format."""
+        prompt = messages[-1]["content"] if messages else ""
+        name, routed_model = self.route(model, prompt)
+        if name is None:
+            if model.startswith(LOCAL_MODEL_PREFIX):
+                raise RuntimeError(f"'{model}' needs a local LLM server, but LOCAL_LLM_URL is not set")
+            raise RuntimeError(f"No LLM provider configured for '{model}' (set an API key or LOCAL_LLM_URL)")
+        self.requests_by_provider[name] = self.requests_by_provider.get(name, 0) + 1
+        async for delta in self.provider(name).stream_chat(routed_model, messages, temperature):
+            yield delta
+
+    def stats(self) -> Dict:
+        return {
+            "local_url": self.local_url,
+            "local_api": self.local_api if self.local_url else None,
+            "local_model": self.local_model,
+            "local_max_prompt_chars": self.local_max_prompt_chars,
+            "requests_by_provider": dict(self.requests_by_provider)
+        }
+
+    async def close(self):
+        for provider in self.providers.values():
+            await provider.close()
+        self.providers.clear()
@@ -7,12 +7,28 @@ import queue
 import time
 import logging
 import os
-from typing import List, Dict, Set
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query
-from faster_whisper import WhisperModel
+from contextlib import asynccontextmanager
+from typing import List, Dict, Set, Optional, Tuple, Union
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from inference_scheduler import InferenceScheduler, DEFAULT_PROMPT, SAMPLE_RATE, warm_up as warm_up_whisper
+from inference_pool import ProcessInferencePool
+from client_channel import ClientChannel, is_answer_delta
+from serialization import dumps
+from vad import StreamingVAD, create_vad_backend, FRAME_SIZE
+from model_loader import ModelLoader
+from session_journal import SessionJournal
+from batch_transcriber import BatchTranscriber, ThoughtTimeline, decode_audio
+from audio_transport import FrameReceiver, FRAMING_VERSION, available_codecs, frame_capture_ms, negotiate
+from metrics import (
+    registry as metrics_registry, STAGE_SECONDS, AUDIO_SECONDS, AUDIO_DROPPED, BUFFER_TRIMS, MESSAGES, AI_REQUESTS,
+    WORDS_FORCE_COMMITTED, QUALITY_CHANGES, INGEST_THROTTLED
+)
+from quality_controller import QualityController, LEVELS as QUALITY_LEVELS
+from llm_clients import LLMClientPool
+from ai_dispatcher import AIDispatcher
+from response_cache import ResponseCache, conversation_fingerprint
 from dotenv import load_dotenv
-import openai
-import google.generativeai as genai
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -23,12 +39,19 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Local Transcription Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background so the server binds immediately; /ready reports progress
+    if session_journal is not None:
+        session_journal.start()
+    loading = asyncio.create_task(load_models())
+    yield
+    loading.cancel()
+    await shutdown_models()
+
+app = FastAPI(title="Local Transcription Backend", lifespan=lifespan)
 
 # Enable CORS for all origins (Required for mirrored networking and mobile access)
 app.add_middleware(
@@ -44,26 +67,163 @@ import os
 # Initialize Whisper Model
 MODEL_SIZE = os.getenv("WHISPER_MODEL", "base")
 MODEL_CACHE = os.getenv("WHISPER_CACHE", None)
-DEVICE = "cuda" if threading.active_count() > 0 else "cpu" 
-
-logger.info(f"Initializing with model size: {MODEL_SIZE}, cache: {MODEL_CACHE}")
+# "auto" uses CUDA when CTranslate2 sees a GPU; compute type defaults to float16 on CUDA, int8 on CPU
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "auto")
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE")
+# Consecutive decode passes that must agree before a word is committed (LocalAgreement-n)
+LOCAL_AGREEMENT_N = int(os.getenv("LOCAL_AGREEMENT_N", "2"))
+# Preallocated audio per listener; must exceed the decode window plus INGEST_MAX_BACKLOG_SECONDS
+AUDIO_BUFFER_SECONDS = float(os.getenv("AUDIO_BUFFER_SECONDS", "30"))
+# Cross-session decode batching
+INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "25"))
+# Decode in this many worker processes (each with its own model) instead of a thread of the hub; 0 keeps it in-process.
+# INFERENCE_DEVICES spreads them over GPUs ("0,1"); INFERENCE_CPU_THREADS sizes each CPU worker (0 = faster-whisper's default)
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))
+INFERENCE_DEVICES = [int(index) for index in os.getenv("INFERENCE_DEVICES", "").split(",") if index.strip()]
+INFERENCE_CPU_THREADS = int(os.getenv("INFERENCE_CPU_THREADS", "0"))
+INFERENCE_SHM_SECONDS = float(os.getenv("INFERENCE_SHM_SECONDS", "120"))  # Shared-memory audio ring per worker process
+INFERENCE_JOB_TIMEOUT = float(os.getenv("INFERENCE_JOB_TIMEOUT", "60"))  # A decode taking longer marks its worker as hung
+# Streaming VAD gate ahead of Whisper ("silero" or "energy")
+VAD_BACKEND = os.getenv("VAD_BACKEND", "silero")
+VAD_THRESHOLD = float(os.getenv("VAD_THRESHOLD", "0.5"))
+VAD_ENDPOINT_MS = int(os.getenv("VAD_ENDPOINT_MS", "1200"))
+# Framed listener audio: lost stretches up to this long are filled with silence so timestamps stay aligned.
+# Longer than VAD_ENDPOINT_MS, so an outage ends the utterance instead of gluing speech across it.
+AUDIO_GAP_CONCEAL_MS = int(os.getenv("AUDIO_GAP_CONCEAL_MS", "1500"))
+# Minimum new audio before the worker re-decodes (it otherwise sleeps until audio arrives)
+MIN_DECODE_QUANTUM_MS = int(os.getenv("MIN_DECODE_QUANTUM_MS", "250"))
+# Adaptive quality: under decode overload a listener gives up partial frequency, window length and, with
+# WHISPER_FALLBACK_MODEL (e.g. "tiny.en", in-process inference only), model size before it gives up audio; 0 pins full quality
+ADAPTIVE_QUALITY = os.getenv("ADAPTIVE_QUALITY", "1") == "1"
+WHISPER_FALLBACK_MODEL = os.getenv("WHISPER_FALLBACK_MODEL")
+# Socket reads pause (pushing back on the client) while a listener has more than this much audio queued,
+# or its oldest queued audio has waited longer than this
+INGEST_MAX_BACKLOG_SECONDS = float(os.getenv("INGEST_MAX_BACKLOG_SECONDS", "3"))
+# Sessions: clients that don't pass a session_id share the default session
+DEFAULT_SESSION_ID = "default"
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+# History kept in memory per session, and the page size used for snapshots and paging
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", "1000"))
+# History is journaled to SQLite so it survives restarts; memory only keeps the newest HISTORY_MAX_ENTRIES ("" disables)
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "journal.db")
+JOURNAL_RETENTION_HOURS = float(os.getenv("JOURNAL_RETENTION_HOURS", "168"))  # 0 keeps sessions forever
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "100"))
+# Outbound messages buffered per client before partials are dropped / the client is cut off
+CLIENT_QUEUE_SIZE = int(os.getenv("CLIENT_QUEUE_SIZE", "256"))
+# Partial transcripts are coalesced to at most this many updates per second per listener
+PARTIAL_MAX_HZ = float(os.getenv("PARTIAL_MAX_HZ", "8"))
+# Segmenter embeddings are batched across sessions on a worker thread
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "10"))
+# "torch" (sentence-transformers) or "onnx" (int8 ONNX Runtime on CPU, no torch import)
+SEGMENTER_BACKEND = os.getenv("SEGMENTER_BACKEND", "torch")
+SEGMENTER_ONNX_DIR = os.getenv("SEGMENTER_ONNX_DIR")  # Local ONNX export; fetched from the model repo if unset
+# Finals within this window are merged into one AI request; requests in flight are capped across sessions
+AI_DEBOUNCE_MS = float(os.getenv("AI_DEBOUNCE_MS", "700"))
+AI_MAX_WAIT_MS = float(os.getenv("AI_MAX_WAIT_MS", "3000"))  # Longest a final waits while the speaker keeps going
+AI_MAX_SUPERSEDED = int(os.getenv("AI_MAX_SUPERSEDED", "2"))  # Answers cancelled in a row before one is let through
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+# Streamed answer tokens are broadcast in batches: at most one delta per interval, or sooner once this many chars pile up
+AI_DELTA_INTERVAL_MS = float(os.getenv("AI_DELTA_INTERVAL_MS", "50"))
+AI_DELTA_MAX_CHARS = int(os.getenv("AI_DELTA_MAX_CHARS", "400"))
+# Cache of AI answers for repeated questions (near-duplicates matched by embedding similarity; 0 disables that)
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "1") == "1"
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")  # JSON file to persist the cache to; in-memory only if unset
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "86400"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "1000"))
+AI_CACHE_SIMILARITY = float(os.getenv("AI_CACHE_SIMILARITY", "0.92"))
+# Local LLM (Ollama, or any OpenAI-compatible server with LOCAL_LLM_API=openai)
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL")  # e.g. http://localhost:11434 or http://localhost:8080/v1
+LOCAL_LLM_API = os.getenv("LOCAL_LLM_API", "ollama")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL")
+LOCAL_LLM_KEEP_ALIVE = os.getenv("LOCAL_LLM_KEEP_ALIVE", "30m")
+# Routing: hosted models served locally ("gpt-4o-mini=llama3.2:3b,..."), short prompts sent to LOCAL_LLM_MODEL
+LOCAL_LLM_MODEL_MAP = dict(
+    rule.split("=", 1) for rule in os.getenv("LOCAL_LLM_MODEL_MAP", "").split(",") if "=" in rule
+)
+LOCAL_LLM_MAX_PROMPT_CHARS = int(os.getenv("LOCAL_LLM_MAX_PROMPT_CHARS", "0"))
+# Offline file transcription (POST /transcribe): chunks per batched decode, files transcribed at once.
+# Live listeners wait behind every offline batch, so batches stay small (0: 4 chunks on CUDA, 1 on CPU)
+BATCH_TRANSCRIBE_SIZE = int(os.getenv("BATCH_TRANSCRIBE_SIZE", "0"))
+BATCH_TRANSCRIBE_MAX_JOBS = int(os.getenv("BATCH_TRANSCRIBE_MAX_JOBS", "1"))
+# Attach server-side timings to transcription messages, for end-to-end (audio to screen) latency tracing
+MESSAGE_TIMING = os.getenv("MESSAGE_TIMING", "0") == "1"
 
-try:
+def select_whisper_device() -> Tuple[str, str]:
+    device = WHISPER_DEVICE
+    if device == "auto":
+        try:
+            import ctranslate2
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        except Exception:
+            device = "cpu"
     # RTX 3080 supports float16
-    model = WhisperModel(
-        MODEL_SIZE, 
-        device="cuda", 
-        compute_type="float16", 
-        download_root=MODEL_CACHE
+    compute_type = WHISPER_COMPUTE_TYPE or ("float16" if device == "cuda" else "int8")
+    return device, compute_type
+
+DEVICE, COMPUTE_TYPE = select_whisper_device()
+
+logger.info(f"Initializing with model size: {MODEL_SIZE}, cache: {MODEL_CACHE}, device: {DEVICE} ({COMPUTE_TYPE})")
+
+# Set by load_models() once the server is up (with INFERENCE_PROCESSES the model lives in the workers and `model` stays None)
+model = None
+scheduler: Optional[Union[InferenceScheduler, ProcessInferencePool]] = None
+# Smaller model the quality controller falls back to under sustained overload
+fallback_scheduler: Optional[InferenceScheduler] = None
+FALLBACK_ENABLED = bool(WHISPER_FALLBACK_MODEL) and INFERENCE_PROCESSES == 0
+vad_backend = None
+model_loader = ModelLoader(["whisper", "vad", "segmenter"] + (["whisper_fallback"] if FALLBACK_ENABLED else []))
+
+def load_whisper_model(size: str = MODEL_SIZE):
+    from faster_whisper import WhisperModel
+    return WhisperModel(size, device=DEVICE, compute_type=COMPUTE_TYPE, download_root=MODEL_CACHE)
+
+def start_inference_pool() -> ProcessInferencePool:
+    pool = ProcessInferencePool(
+        INFERENCE_PROCESSES,
+        config={
+            "model_size": MODEL_SIZE,
+            "device": DEVICE,
+            "compute_type": COMPUTE_TYPE,
+            "cpu_threads": INFERENCE_CPU_THREADS,
+            "download_root": MODEL_CACHE
+        },
+        devices=INFERENCE_DEVICES,
+        max_batch_size=INFERENCE_MAX_BATCH,
+        max_wait_ms=INFERENCE_MAX_WAIT_MS,
+        ring_seconds=INFERENCE_SHM_SECONDS,
+        job_timeout=INFERENCE_JOB_TIMEOUT
     )
-    logger.info(f"Loaded Whisper model '{MODEL_SIZE}' on CUDA.")
-except Exception as e:
-    logger.warning(f"Failed to load CUDA, falling back to CPU: {e}")
-    model = WhisperModel(MODEL_SIZE, device="cpu", compute_type="int8")
+    pool.start()
+    try:
+        pool.wait_ready()
+    except Exception:
+        pool.stop()
+        raise
+    return pool
+
+def warm_up_vad(backend):
+    backend.stream()(np.zeros((4, FRAME_SIZE), dtype=np.float32))
 
 @app.get("/")
 async def root():
-    return {"status": "online", "model": MODEL_SIZE, "device": model.model.device}
+    return {"status": "online", "model": MODEL_SIZE, "device": DEVICE}
+
+@app.get("/ready")
+async def ready():
+    # Transcription needs Whisper and the VAD; the segmenter is optional
+    is_ready = model_loader.is_ready("whisper") and model_loader.is_ready("vad")
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, "models": model_loader.stats()}
+    )
+
+@app.get("/scheduler")
+async def get_scheduler_stats():
+    if scheduler is None:
+        return {"ready": False}
+    return scheduler.stats()
 
 @app.get("/config")
 async def get_backend_config():
@@ -71,37 +231,106 @@ async def get_backend_config():
         "status": "online",
         "openai_available": bool(OPENAI_API_KEY),
         "gemini_available": bool(GEMINI_API_KEY),
+        "local_llm_available": bool(LOCAL_LLM_URL),
         "whisper_model": MODEL_SIZE,
-        "device": DEVICE
+        "device": DEVICE,
+        "audio_codecs": available_codecs()
     }
 
 # ... imports ...
-from semantic_segmenter import SemanticSegmenter
+from semantic_segmenter import SemanticSegmenter, load_semantic_model
+from embedding_service import EmbeddingService
+from streaming import HypothesisBuffer, PartialStream, words_to_segment
+from audio_buffer import AudioRingBuffer
 
 # ... existing code ...
 
+# Provider clients are created once and shared by every session
+llm_pool = LLMClientPool(
+    openai_api_key=OPENAI_API_KEY,
+    gemini_api_key=GEMINI_API_KEY,
+    local_url=LOCAL_LLM_URL,
+    local_api=LOCAL_LLM_API,
+    local_model=LOCAL_LLM_MODEL,
+    local_keep_alive=LOCAL_LLM_KEEP_ALIVE,
+    local_model_map=LOCAL_LLM_MODEL_MAP,
+    local_max_prompt_chars=LOCAL_LLM_MAX_PROMPT_CHARS
+)
+
+# Caps AI requests in flight across every session
+ai_limiter = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+
 class SessionManager:
-    def __init__(self):
+    def __init__(self, session_id: str = DEFAULT_SESSION_ID, embedding_service: Optional[EmbeddingService] = None,
+                 journal: Optional[SessionJournal] = None):
+        self.session_id = session_id
+        self.last_activity = time.monotonic()
         self.active_viewers: Set[WebSocket] = set()
         self.active_listeners: Set[WebSocket] = set()
+        # Every write to a client goes through its channel's bounded queue
+        self.channels: Dict[WebSocket, ClientChannel] = {}
+        # Recent history only (older entries are in the journal); every entry carries a monotonically increasing `seq`
+        self.journal = journal
         self.history: List[Dict] = []
+        # Encoded form of each history entry, so snapshots are assembled by concatenation
+        self.history_frames: List[str] = []
+        self.next_seq = 1
         self.lock = asyncio.Lock()
+        # Rate limiting and delta state for partial transcripts, one per listener
+        self.partial_streams: Dict[str, PartialStream] = {}
+        # Deferred partial flushes; held here so they aren't garbage collected, and cancelled on close
+        self.tasks: Set[asyncio.Task] = set()
         
         # AI Config
         self.ai_enabled = True
         self.ai_model = os.getenv("DEFAULT_AI_MODEL", "gpt-4o-mini")
         self.system_prompt = "You are a helpful interview assistant. Provide concise feedback based on the conversation."
+        self.next_ai_response = 1
+        self.ai_dispatcher = AIDispatcher(
+            self.call_ai, ai_limiter, debounce_ms=AI_DEBOUNCE_MS, max_wait_ms=AI_MAX_WAIT_MS, max_superseded=AI_MAX_SUPERSEDED
+        )
 
-        # Initialize Semantic Segmenter
-        try:
-            self.segmenter = SemanticSegmenter()
-        except Exception as e:
-            logger.error(f"Failed to load Segmenter (likely missing dependencies): {e}")
-            self.segmenter = None
+        # Segmenter state is per session; the embedding model behind it is shared
+        self.segmenter = None
+        if embedding_service:
+            self.attach_segmenter(embedding_service)
+
+    def attach_segmenter(self, embedding_service: EmbeddingService):
+        if self.segmenter is None:
+            self.segmenter = SemanticSegmenter(model=embedding_service.model, encoder=embedding_service)
+
+    def restore(self):
+        """Reloads the newest history window and the AI settings from the journal (after a restart or eviction)."""
+        if self.journal is None:
+            return
+        restored = self.journal.restore(self.session_id, HISTORY_MAX_ENTRIES)
+        if restored is None:
+            return
+        state, entries = restored
+        self.history_frames = [frame for _, frame in entries]
+        self.history = [json.loads(frame) for frame in self.history_frames]
+        self.next_seq = max(state.get("next_seq", 1), entries[-1][0] + 1 if entries else 1)
+        self.ai_enabled = state.get("ai_enabled", self.ai_enabled)
+        self.ai_model = state.get("ai_model", self.ai_model)
+        self.next_ai_response = state.get("next_ai_response", self.next_ai_response)
+        logger.info(f"Restored session '{self.session_id}' from the journal ({len(entries)} recent entries, next seq {self.next_seq})")
+
+    def save_state(self):
+        if self.journal is not None:
+            self.journal.save_state(self.session_id, {
+                "next_seq": self.next_seq,
+                "ai_enabled": self.ai_enabled,
+                "ai_model": self.ai_model,
+                "next_ai_response": self.next_ai_response
+            })
+
+    @property
+    def client_count(self) -> int:
+        return len(self.active_viewers) + len(self.active_listeners)
 
     async def handle_force_segment(self):
         if self.segmenter:
-            decision = self.segmenter.manual_segment_trigger()
+            decision = await self.segmenter.manual_segment_trigger_async()
             if decision:
                 logger.info(f"Manual Force Segment Triggered: {decision}")
                 await self.broadcast({
@@ -111,26 +340,104 @@ class SessionManager:
                     "thought_segment": decision
                 })
 
-    async def add_viewer(self, websocket: WebSocket):
+    def _index_after(self, seq: int) -> int:
+        if not self.history:
+            return 0
+        return min(len(self.history), max(0, seq + 1 - self.history[0]["seq"]))
+
+    def _index_before(self, seq: int) -> int:
+        if not self.history:
+            return 0
+        return max(0, min(len(self.history), seq - self.history[0]["seq"]))
+
+    @staticmethod
+    def _encode_with_history(header: Dict, frames: List[str]) -> str:
+        """Splices already encoded history frames into the encoded header."""
+        encoded = dumps(header)
+        return f'{encoded[:-1]},"history":[{",".join(frames)}]}}'
+
+    def _build_sync(self, last_seq: Optional[int], state: Dict) -> Tuple[Dict, str]:
+        """
+        Returns what a (re)connecting client needs to catch up: only the entries after
+        `last_seq` if it is still covered by memory, otherwise a snapshot of the latest page.
+        """
+        latest_seq = self.next_seq - 1
+        oldest_seq = self.history[0]["seq"] if self.history else self.next_seq
+        can_delta = (
+            last_seq is not None
+            and oldest_seq - 1 <= last_seq <= latest_seq
+            and latest_seq - last_seq <= HISTORY_PAGE_SIZE
+        )
+        if can_delta:
+            start = self._index_after(last_seq)
+        else:
+            start = max(0, len(self.history) - HISTORY_PAGE_SIZE)
+
+        header = {
+            "type": "session_state",
+            "mode": "delta" if can_delta else "snapshot",
+            "last_seq": latest_seq,
+            # Snapshots only carry the latest page; older entries are fetched with `history_page`
+            "has_more": not can_delta and (start > 0 or (self.journal is not None and oldest_seq > 1)),
+            **state
+        }
+        return header, self._encode_with_history(header, self.history_frames[start:])
+
+    async def _sync_client(self, websocket: WebSocket, clients: Set[WebSocket], role: str,
+                           last_seq: Optional[int], state: Dict):
+        # The sync payload is queued first and the client registered in the same critical
+        # section, so it sees every later broadcast exactly once and in order. Sending
+        # happens on the channel's own task, outside the lock.
         async with self.lock:
-            self.active_viewers.add(websocket)
-            await websocket.send_json({
-                "type": "session_state",
-                "history": self.history,
-                "ai_enabled": self.ai_enabled,
-                "ai_model": self.ai_model
-            })
+            channel = ClientChannel(websocket, role, max_queue=CLIENT_QUEUE_SIZE, on_close=self._on_channel_closed)
+            channel.send(*self._build_sync(last_seq, state))
+            self.channels[websocket] = channel
+            clients.add(websocket)
+
+    def _on_channel_closed(self, channel: ClientChannel):
+        self.channels.pop(channel.websocket, None)
+        self.active_viewers.discard(channel.websocket)
+        self.active_listeners.discard(channel.websocket)
+        self.last_activity = time.monotonic()
+
+    async def add_viewer(self, websocket: WebSocket, last_seq: Optional[int] = None):
+        await self._sync_client(websocket, self.active_viewers, "viewer", last_seq, {
+            "ai_enabled": self.ai_enabled,
+            "ai_model": self.ai_model
+        })
+
+    async def send_history_page(self, websocket: WebSocket, before_seq: int, limit: int = HISTORY_PAGE_SIZE):
+        limit = min(max(1, limit), HISTORY_PAGE_SIZE)
+        async with self.lock:
+            channel = self.channels.get(websocket)
+            if not channel:
+                return
+            end = self._index_before(before_seq)
+            start = max(0, end - limit)
+            frames = self.history_frames[start:end]
+            oldest_seq = self.history[start]["seq"] if start < end else min(before_seq, self.history[0]["seq"] if self.history else self.next_seq)
+        has_more = start > 0
+
+        # Whatever memory no longer holds is read from the journal, off the event loop
+        if start == 0 and len(frames) < limit and self.journal is not None and oldest_seq > 1:
+            older, has_more = await asyncio.to_thread(self.journal.read_before, self.session_id, oldest_seq, limit - len(frames))
+            frames = [frame for _, frame in older] + frames
+
+        header = {"type": "history_page", "has_more": has_more}
+        channel.send(header, self._encode_with_history(header, frames))
 
     async def toggle_ai(self, enabled: bool):
         async with self.lock:
             self.ai_enabled = enabled
             logger.info(f"AI Toggled: {self.ai_enabled}")
+            self.save_state()
         await self.broadcast({
             "type": "ai_state",
             "enabled": self.ai_enabled
         })
 
-    async def call_ai(self, text: str):
+    async def call_ai(self, text: str, is_current=None):
+        """`is_current` (from the dispatcher) turns False once newer speech has superseded this request."""
         if not self.ai_enabled:
             return
 
@@ -145,127 +452,744 @@ class SessionManager:
         
         messages.append({"role": "user", "content": text})
 
+        # Stock questions are answered from the cache without a round trip, as long as
+        # they come with the same conversation (the answer may depend on it)
+        fingerprint = conversation_fingerprint(self.ai_model, messages[:-1])
+        if response_cache is not None:
+            cached = await response_cache.lookup(text, fingerprint)
+            if cached is not None:
+                AI_REQUESTS.inc(session=self.session_id, outcome="cached")
+                response_id = f"{self.session_id}-{self.next_ai_response}"
+                self.next_ai_response += 1
+                await self.broadcast({
+                    "type": "ai_log",
+                    "id": response_id,
+                    "text": cached["response"],
+                    "role": "assistant",
+                    "cached": cached["match"]
+                }, save_to_history=True)
+                return
+
+        # Tokens are streamed to clients in small batches; only the consolidated answer goes into history
+        response_id = f"{self.session_id}-{self.next_ai_response}"
+        self.next_ai_response += 1
+        response_text = ""
+        sent_chars = 0
+        started = last_delta_at = time.monotonic()
         try:
-            response_text = ""
-            if "gemini" in self.ai_model.lower() and GEMINI_API_KEY:
-                model = genai.GenerativeModel(self.ai_model)
-                contents = []
-                for m in messages:
-                    role = "user" if m["role"] == "user" else "model"
-                    if m["role"] == "system": continue 
-                    contents.append({"role": role, "parts": [{"text": m["content"]}]})
-                
-                response = await asyncio.to_thread(model.generate_content, contents)
-                response_text = response.text
-                
-            elif OPENAI_API_KEY:
-                client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
-                response = await client.chat.completions.create(
-                    model=self.ai_model,
-                    messages=messages,
-                    temperature=0.7
-                )
-                response_text = response.choices[0].message.content
-            
+            async for delta in llm_pool.stream_chat(self.ai_model, messages):
+                if not delta:
+                    continue
+                now = time.monotonic()
+                if not response_text:
+                    STAGE_SECONDS.observe(now - started, session=self.session_id, stage="llm_first_token")
+                response_text += delta
+                # The first tokens go out at once; the rest are batched
+                if sent_chars and now - last_delta_at < AI_DELTA_INTERVAL_MS / 1000.0 and len(response_text) - sent_chars < AI_DELTA_MAX_CHARS:
+                    continue
+                await self.broadcast({
+                    "type": "ai_log_delta",
+                    "id": response_id,
+                    "text": response_text[sent_chars:],
+                    "role": "assistant"
+                })
+                sent_chars = len(response_text)
+                last_delta_at = now
+
+            if is_current is not None and not is_current():
+                # Out of date: the next request already covers newer speech
+                await self._discard_answer(response_id, sent_chars > 0)
+                return
+            STAGE_SECONDS.observe(time.monotonic() - started, session=self.session_id, stage="llm_total")
+            AI_REQUESTS.inc(session=self.session_id, outcome="completed")
             if response_text:
                 await self.broadcast({
                     "type": "ai_log",
+                    "id": response_id,
                     "text": response_text,
                     "role": "assistant"
                 }, save_to_history=True)
+                if response_cache is not None:
+                    await response_cache.store(text, fingerprint, response_text)
 
+        except asyncio.CancelledError:
+            await self._discard_answer(response_id, sent_chars > 0)
+            raise
         except Exception as e:
             logger.error(f"AI Service Error: {e}")
+            AI_REQUESTS.inc(session=self.session_id, outcome="error")
             await self.broadcast({
                 "type": "error",
                 "message": f"AI Error: {str(e)}"
             })
 
+    async def _discard_answer(self, response_id: str, streamed: bool):
+        AI_REQUESTS.inc(session=self.session_id, outcome="cancelled")
+        if streamed:
+            # Let clients discard the partial answer
+            await self.broadcast({"type": "ai_log_cancelled", "id": response_id})
+
     async def remove_viewer(self, websocket: WebSocket):
-        async with self.lock:
-            self.active_viewers.remove(websocket)
+        await self._remove_client(websocket)
 
-    async def add_listener(self, websocket: WebSocket):
-        async with self.lock:
-            self.active_listeners.add(websocket)
-            await websocket.send_json({
-                "type": "session_state",
-                "history": self.history
-            })
+    async def add_listener(self, websocket: WebSocket, last_seq: Optional[int] = None):
+        await self._sync_client(websocket, self.active_listeners, "listener", last_seq, {})
 
     async def remove_listener(self, websocket: WebSocket):
+        await self._remove_client(websocket)
+
+    async def _remove_client(self, websocket: WebSocket):
         async with self.lock:
-            self.active_listeners.remove(websocket)
+            channel = self.channels.get(websocket)
+            if channel:
+                channel.close()
+            else:
+                self.active_viewers.discard(websocket)
+                self.active_listeners.discard(websocket)
+            self.last_activity = time.monotonic()
+
+    def send_to(self, websocket: WebSocket, message: Dict):
+        """Queues a message for one client only (replies to that client's requests)."""
+        channel = self.channels.get(websocket)
+        if channel:
+            channel.send(message)
 
-    async def broadcast(self, message: Dict, save_to_history: bool = False):
+    def client_stats(self) -> List[Dict]:
+        return [channel.stats() for channel in list(self.channels.values())]
+
+    async def broadcast(self, message: Dict, save_to_history: bool = False, keyframe: Optional[Dict] = None):
+        started = time.monotonic()
         async with self.lock:
             if save_to_history:
-                self.history.append({
+                message = {
                     **message,
-                    "timestamp": asyncio.get_event_loop().time()
-                })
-            
-            all_clients = self.active_viewers.union(self.active_listeners)
-            disconnected = []
-            for client in all_clients:
-                try:
-                    await client.send_json(message)
-                except Exception:
-                    disconnected.append(client)
-            
-            for client in disconnected:
-                if client in self.active_viewers:
-                    self.active_viewers.remove(client)
-                if client in self.active_listeners:
-                    self.active_listeners.remove(client)
-
-    async def broadcast_update(self, segments: List[Dict], is_final: bool):
+                    "timestamp": asyncio.get_event_loop().time(),
+                    "seq": self.next_seq
+                }
+            # Encoded once for every client (and for every future snapshot if it's history).
+            # Raises TypeError for what can't be encoded, before any state has changed
+            frame = dumps(message)
+            if save_to_history:
+                self.next_seq += 1
+                self.history.append(message)
+                self.history_frames.append(frame)
+                if self.journal is not None:
+                    self.journal.append(self.session_id, message["seq"], frame)
+                    self.save_state()
+                if len(self.history) > HISTORY_MAX_ENTRIES:
+                    excess = len(self.history) - HISTORY_MAX_ENTRIES
+                    del self.history[:excess]
+                    del self.history_frames[:excess]
+            channels = list(self.channels.values())
+
+        encode_keyframe = None
+        if keyframe is not None:
+            # Only clients that are out of step with a delta need the keyframe; encode it at most once
+            cache = []
+            def encode_keyframe() -> str:
+                if not cache:
+                    cache.append(dumps(keyframe))
+                return cache[0]
+
+        # Answer deltas queued behind a slow client are merged with this one once, not once per client
+        merges = {} if is_answer_delta(message) else None
+
+        # The lock only covers state mutation; fan-out just enqueues per client
+        for channel in channels:
+            channel.send(message, frame, keyframe=encode_keyframe, merges=merges)
+        STAGE_SECONDS.observe(time.monotonic() - started, session=self.session_id, stage="broadcast")
+        MESSAGES.inc(session=self.session_id, type=message.get("type"))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background task in session '{self.session_id}' failed: {task.exception()!r}")
+
+    def close(self):
+        self.ai_dispatcher.close()
+        for task in list(self.tasks):
+            task.cancel()
+
+    async def _flush_partial(self, stream: PartialStream, delay: float = 0.0):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        stream.timer = None
+        update = stream.take_delta(asyncio.get_running_loop().time())
+        if update:
+            delta, keyframe = update
+            if stream.timing:
+                delta["timing"] = keyframe["timing"] = {**stream.timing, "broadcast_at": time.time()}
+            await self.broadcast(delta, keyframe=keyframe)
+
+    def end_partial_stream(self, source: str):
+        stream = self.partial_streams.pop(source, None)
+        if stream:
+            stream.reset()
+
+    async def broadcast_update(self, segments: List[Dict], is_final: bool, committed: str = "", tentative: str = "",
+                               source: Optional[str] = None, timing: Optional[Dict] = None):
+        """`timing` (with MESSAGE_TIMING) is attached to the message as its `timing` field."""
+        # Partials are rate limited and sent as deltas against the previous one
+        if not is_final and source is not None:
+            stream = self.partial_streams.get(source)
+            if stream is None:
+                stream = self.partial_streams[source] = PartialStream(source, PARTIAL_MAX_HZ)
+            text = " ".join(part for part in (committed, tentative) if part)
+            if not stream.offer(text, len(committed)):
+                return
+            # The newest hypothesis's timings ride along with whichever delta carries it
+            stream.timing = timing
+            if stream.timer is not None:
+                return
+            loop = asyncio.get_running_loop()
+            wait = stream.last_sent_at + stream.min_interval - loop.time()
+            if wait <= 0:
+                await self._flush_partial(stream)
+            else:
+                stream.timer = self._spawn(self._flush_partial(stream, delay=wait))
+            return
+
+        if source is not None:
+            # The final supersedes any partial still waiting on the rate limit
+            stream = self.partial_streams.get(source)
+            if stream:
+                stream.reset()
+
         # 1. Process Semantic Segmentation (Integrated)
         thought_payload = None
         if self.segmenter and is_final:
             full_text = " ".join([s["text"] for s in segments])
-            thought_payload = self.segmenter.process(full_text)
+            segmenter_started = time.monotonic()
+            thought_payload = await self.segmenter.process_async(full_text)
+            segmenter_time = time.monotonic() - segmenter_started
+            STAGE_SECONDS.observe(segmenter_time, session=self.session_id, stage="segmenter")
+            if timing:
+                timing = {**timing, "segmenter_ms": round(segmenter_time * 1000.0, 1)}
 
         # 2. Prepare Message
         message = {
             "type": "transcription",
             "segments": segments,
-            "is_final": is_final
+            "is_final": is_final,
+            "committed": committed,
+            "tentative": tentative
         }
+        if source is not None:
+            message["source"] = source
         
         if thought_payload:
             message["thought_segment"] = thought_payload
+        if timing:
+            message["timing"] = {**timing, "broadcast_at": time.time()}
 
         await self.broadcast(message, save_to_history=is_final)
         
         # 3. Auto-trigger AI if it's a final sentence
         if is_final:
             full_text = " ".join([s["text"] for s in segments])
-            if full_text.strip():
-                asyncio.create_task(self.call_ai(full_text))
+            if full_text.strip() and self.ai_enabled:
+                self.ai_dispatcher.submit(full_text)
+
+class SessionRegistry:
+    """
+    Routes `/ws/session` connections to isolated sessions keyed by session id.
+
+    Each session keeps its own history, segmenter state, AI config and clients.
+    The SentenceTransformer is loaded once and shared by every session's segmenter
+    through an EmbeddingService, so encodes never run on the event loop.
+    Sessions without clients are evicted after `idle_timeout` seconds; with a
+    journal, a session is rebuilt from disk when it is next used.
+    """
+
+    def __init__(self, idle_timeout: float, journal: Optional[SessionJournal] = None):
+        self.idle_timeout = idle_timeout
+        self.journal = journal
+        self.sessions: Dict[str, SessionManager] = {}
+        # Sessions being restored from the journal; concurrent connections wait for the same restore
+        self.creating: Dict[str, asyncio.Task] = {}
 
-session_manager = SessionManager()
+        # Attached by load_models() once the segmenter model is ready
+        self.embedding_service: Optional[EmbeddingService] = None
+
+    def attach_embedding_service(self, embedding_service: EmbeddingService):
+        """Sessions created while the model was still loading get their segmenter now."""
+        self.embedding_service = embedding_service
+        for session in self.sessions.values():
+            session.attach_segmenter(embedding_service)
+
+    async def get(self, session_id: str) -> SessionManager:
+        self.evict_idle()
+        session = self.sessions.get(session_id)
+        if session is None:
+            creating = self.creating.get(session_id)
+            if creating is None:
+                creating = self.creating[session_id] = asyncio.create_task(self._create(session_id))
+            session = await asyncio.shield(creating)
+        session.last_activity = time.monotonic()
+        return session
+
+    async def _create(self, session_id: str) -> SessionManager:
+        try:
+            session = SessionManager(session_id, embedding_service=self.embedding_service, journal=self.journal)
+            # The journal read is a blocking SQLite query; the session isn't visible to anyone until it's done
+            await asyncio.to_thread(session.restore)
+            if self.embedding_service is not None:
+                # The segmenter model may have finished loading while the journal was read
+                session.attach_segmenter(self.embedding_service)
+            self.sessions[session_id] = session
+            logger.info(f"Created session '{session_id}' ({len(self.sessions)} active)")
+            return session
+        finally:
+            self.creating.pop(session_id, None)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        expired = [
+            session_id for session_id, session in self.sessions.items()
+            if session.client_count == 0 and now - session.last_activity > self.idle_timeout
+        ]
+        for session_id in expired:
+            self.sessions.pop(session_id).close()
+            metrics_registry.forget(session=session_id)
+            logger.info(f"Evicted idle session '{session_id}'")
+
+    def stats(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                "session_id": session_id,
+                "viewers": len(session.active_viewers),
+                "listeners": len(session.active_listeners),
+                "history_length": len(session.history),
+                "idle_seconds": round(now - session.last_activity, 1) if session.client_count == 0 else 0.0,
+                "clients": session.client_stats(),
+                "ai": session.ai_dispatcher.stats()
+            }
+            for session_id, session in self.sessions.items()
+        ]
+
+session_journal = SessionJournal(JOURNAL_PATH, retention_hours=JOURNAL_RETENTION_HOURS) if JOURNAL_PATH else None
+session_registry = SessionRegistry(idle_timeout=SESSION_IDLE_TIMEOUT, journal=session_journal)
+
+# Sampled when /metrics is scraped
+SESSION_CLIENTS = metrics_registry.gauge("session_clients", "Connected clients per session and role.", ["session", "role"])
+INFERENCE_QUEUE_DEPTH = metrics_registry.gauge("inference_queue_depth", "Decode jobs waiting for the inference scheduler.")
+
+# Near-duplicate lookup reuses the segmenter's embedding model when it is available
+response_cache = ResponseCache(
+    path=AI_CACHE_PATH,
+    ttl_seconds=AI_CACHE_TTL,
+    max_entries=AI_CACHE_MAX_ENTRIES,
+    similarity_threshold=AI_CACHE_SIMILARITY,
+    embedder=session_registry.embedding_service
+) if AI_CACHE_ENABLED else None
+
+async def load_whisper():
+    global model, scheduler
+    if INFERENCE_PROCESSES > 0:
+        # Each worker process loads and warms up its own model
+        scheduler = await model_loader.load("whisper", start_inference_pool)
+        return
+    loaded = await model_loader.load("whisper", load_whisper_model, warm_up_whisper)
+    if loaded is not None:
+        model = loaded
+        # All listeners share one model; the scheduler batches their decodes
+        scheduler = InferenceScheduler(model, max_batch_size=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS)
+        scheduler.start()
+
+async def load_fallback_whisper():
+    global fallback_scheduler
+    if not FALLBACK_ENABLED:
+        return
+    loaded = await model_loader.load("whisper_fallback", lambda: load_whisper_model(WHISPER_FALLBACK_MODEL), warm_up_whisper)
+    if loaded is not None:
+        fallback_scheduler = InferenceScheduler(loaded, max_batch_size=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS)
+        fallback_scheduler.start()
+
+async def load_vad():
+    global vad_backend
+    # One model serves every listener; each StreamingVAD keeps its own recurrent state
+    vad_backend = await model_loader.load("vad", lambda: create_vad_backend(VAD_BACKEND), warm_up_vad)
+
+async def load_segmenter():
+    semantic_model = await model_loader.load(
+        "segmenter",
+        lambda: load_semantic_model(backend=SEGMENTER_BACKEND, model_dir=SEGMENTER_ONNX_DIR),
+        lambda m: m.encode(["Warming up the thought segmenter."])
+    )
+    if semantic_model is None:
+        return
+    embedding_service = EmbeddingService(semantic_model, max_batch_size=EMBEDDING_MAX_BATCH, max_wait_ms=EMBEDDING_MAX_WAIT_MS)
+    embedding_service.start()
+    session_registry.attach_embedding_service(embedding_service)
+    if response_cache is not None and AI_CACHE_SIMILARITY > 0:
+        response_cache.embedder = embedding_service
+
+async def load_models():
+    # Independent of each other, so they load side by side
+    await asyncio.gather(load_whisper(), load_vad(), load_segmenter(), load_fallback_whisper())
+
+async def shutdown_models():
+    for session in session_registry.sessions.values():
+        session.close()
+    if scheduler is not None:
+        await asyncio.to_thread(scheduler.stop)
+    if fallback_scheduler is not None:
+        await asyncio.to_thread(fallback_scheduler.stop)
+    if session_registry.embedding_service is not None:
+        await asyncio.to_thread(session_registry.embedding_service.stop)
+    await llm_pool.close()
+    if session_journal is not None:
+        # Commits whatever is still queued
+        await asyncio.to_thread(session_journal.stop)
+
+@app.get("/sessions")
+async def list_sessions():
+    session_registry.evict_idle()
+    return {"sessions": session_registry.stats()}
+
+@app.get("/llm")
+async def llm_stats():
+    return llm_pool.stats()
+
+@app.get("/ai_cache")
+async def ai_cache_stats():
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of the per-stage latency histograms and counters."""
+    for session_id, session in session_registry.sessions.items():
+        SESSION_CLIENTS.set(len(session.active_listeners), session=session_id, role="listener")
+        SESSION_CLIENTS.set(len(session.active_viewers), session=session_id, role="viewer")
+    if scheduler is not None:
+        INFERENCE_QUEUE_DEPTH.set(scheduler.stats()["queue_depth"])
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/journal")
+async def journal_stats():
+    if session_journal is None:
+        return {"enabled": False}
+    return {"enabled": True, **session_journal.stats()}
+
+@app.get("/embeddings")
+async def embedding_stats():
+    if session_registry.embedding_service is None:
+        return {"enabled": False}
+    return {"enabled": True, **session_registry.embedding_service.stats()}
+
+# Offline jobs share the GPU with live listeners, so only a few run at once
+batch_limiter = asyncio.Semaphore(BATCH_TRANSCRIBE_MAX_JOBS)
+
+@app.post("/transcribe")
+async def transcribe_file(request: Request, stream: bool = True, thoughts: bool = True):
+    """
+    Transcribes a recorded WAV (or raw 16-bit 16kHz PCM) file sent as the request body.
+    With `stream` the response is NDJSON: a `started` line, a `progress` line with the
+    new segments after every decoded batch, `thought` lines as thoughts close, and a
+    final `result`. Otherwise only the result is returned, once everything is done.
+    """
+    if not (await model_loader.wait("whisper") and await model_loader.wait("vad")):
+        return JSONResponse(status_code=503, content={"error": "Transcription model unavailable"})
+    if model is None:
+        # Offline jobs decode with the in-process model, which INFERENCE_PROCESSES leaves unloaded
+        return JSONResponse(status_code=503, content={"error": "Offline transcription is unavailable with INFERENCE_PROCESSES; use batch_transcriber.py"})
+    try:
+        audio = decode_audio(await request.body())
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"Unreadable audio: {e}"})
+
+    duration = len(audio) / SAMPLE_RATE
+    embedding_service = session_registry.embedding_service if thoughts else None
+
+    async def events():
+        async with batch_limiter:
+            started = time.monotonic()
+            # Own VAD instance: the energy fallback adapts its noise floor to the audio it sees
+            batch_size = BATCH_TRANSCRIBE_SIZE or (4 if DEVICE == "cuda" else 1)
+            transcriber = BatchTranscriber(model, create_vad_backend(VAD_BACKEND), batch_size=batch_size, threshold=VAD_THRESHOLD)
+            chunks = await asyncio.to_thread(transcriber.split, audio)
+            yield {"type": "started", "duration": round(duration, 2), "chunks": len(chunks)}
+
+            timeline = ThoughtTimeline(SemanticSegmenter(model=embedding_service.model)) if embedding_service else None
+            batches = transcriber.transcribe(audio, chunks)
+            segments = []
+            while True:
+                # Each step decodes one batch on the scheduler's thread, between live listeners' batches
+                progress = await asyncio.wrap_future(scheduler.run_exclusive(lambda: next(batches, None)))
+                if progress is None:
+                    break
+                segments.extend(progress["segments"])
+                yield {"type": "progress", "duration": round(duration, 2), **progress}
+
+                if timeline:
+                    texts = [segment["text"].strip() for segment in progress["segments"]]
+                    # Submitted together, so the embedding service encodes them as one batch
+                    embeddings = await asyncio.gather(*(embedding_service.encode(text) for text in texts if text))
+                    embeddings = iter(embeddings)
+                    for segment, text in zip(progress["segments"], texts):
+                        if text:
+                            thought = timeline.add(segment, next(embeddings))
+                            if thought:
+                                yield {"type": "thought", **thought}
+            if timeline:
+                thought = timeline.finish()
+                if thought:
+                    yield {"type": "thought", **thought}
+
+            elapsed = time.monotonic() - started
+            yield {
+                "type": "result",
+                "duration": round(duration, 2),
+                "elapsed": round(elapsed, 2),
+                # Meaningless for a body with (next to) no audio
+                "rtf": round(elapsed / duration, 4) if duration >= 0.01 else None,
+                "segments": segments,
+                "thoughts": timeline.thoughts if timeline else []
+            }
+
+    if stream:
+        async def ndjson():
+            async for event in events():
+                yield dumps(event) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    result = None
+    async for event in events():
+        result = event
+    return result
 
 class TranscriptionWorker:
-    def __init__(self, model, websocket, session_manager):
-        self.model = model
+    def __init__(self, scheduler, websocket, session_manager):
+        self.scheduler = scheduler
+        self.job_key = f"{session_manager.session_id}/listener-{id(self)}"
+        self.session_id = session_manager.session_id
         self.websocket = websocket
         self.session_manager = session_manager
         self.audio_queue = queue.Queue()
+        # Framed audio (negotiated with an "audio_format" message) is unpacked here, on the worker thread
+        self.receiver = FrameReceiver(self.session_id)
+        self.max_conceal_samples = int(AUDIO_GAP_CONCEAL_MS / 1000.0 * 16000)
         self.stop_event = threading.Event()
         self.thread = threading.Thread(target=self._run)
-        self.buffer = np.array([], dtype=np.float32)
+        self.buffer = AudioRingBuffer(capacity_seconds=AUDIO_BUFFER_SECONDS)
         self.loop = asyncio.get_running_loop()
 
+        # Streaming state: buffer[0] sits at `buffer_offset` seconds into the current utterance
+        self.buffer_offset = 0.0
+        self.hypothesis = HypothesisBuffer(agreement=LOCAL_AGREEMENT_N)
+        self.samples_since_decode = 0
+        # Utterance time up to which some decode pass has heard the audio
+        self.decoded_until = 0.0
+        # Decode cadence, window and partials follow the measured load (quality_controller.py)
+        levels = [level for level in QUALITY_LEVELS if FALLBACK_ENABLED or not level["fallback"]]
+        self.quality = QualityController(levels if ADAPTIVE_QUALITY else levels[:1])
+        # Bounded ingest: queued messages, the audio they hold and when the oldest of them arrived
+        self.ingest_lock = threading.Lock()
+        self.queued = 0
+        self.queued_seconds = 0.0
+        self.queued_since = 0.0
+        self.last_capture_ms: Optional[int] = None
+        # Ring overflow already reported as dropped
+        self.ring_dropped = 0
+        self.ingest_lag = 0.0
+        self.ingest_waiting = False
+        self.drained = asyncio.Event()
+        # Wall-clock arrival of the newest ingested audio, and the timings of the last decode
+        self.last_audio_at = 0.0
+        self.timing: Dict = {}
+        self.vad = StreamingVAD(
+            backend=vad_backend,
+            threshold=VAD_THRESHOLD,
+            endpoint_silence_ms=VAD_ENDPOINT_MS
+        )
+
     def start(self):
         self.thread.start()
 
     def stop(self):
         self.stop_event.set()
+        self.audio_queue.put(None)  # Wake the worker if it is blocked waiting for audio
         self.thread.join()
 
-    def add_audio(self, data):
-        self.audio_queue.put(data)
+    def add_audio(self, data: bytes, framed: bool = False):
+        # Raw int16 PCM, or a frame to unpack and decode; either way the work happens on the worker thread
+        arrived_at = time.time()
+        seconds = self._audio_seconds(data, framed)
+        with self.ingest_lock:
+            if not self.queued:
+                self.queued_since = arrived_at
+            self.queued += 1
+            self.queued_seconds += seconds
+        self.audio_queue.put((arrived_at, data, framed, seconds))
+
+    def _audio_seconds(self, data: bytes, framed: bool) -> float:
+        """How much audio a message adds, without decoding it."""
+        if not framed:
+            return len(data) / 2 / 16000.0
+        # Compressed frames don't say how long they are, but consecutive capture times do (gaps count up to what gets concealed)
+        captured_ms = frame_capture_ms(data)
+        if captured_ms is None:
+            return 0.0
+        previous, self.last_capture_ms = self.last_capture_ms, captured_ms
+        if previous is None:
+            return 0.0
+        return min(max(captured_ms - previous, 0), AUDIO_GAP_CONCEAL_MS) / 1000.0
+
+    @property
+    def backlog_seconds(self) -> float:
+        """How long the oldest audio still in the queue has been waiting for the worker."""
+        with self.ingest_lock:
+            return time.time() - self.queued_since if self.queued else 0.0
+
+    @property
+    def ingest_backlogged(self) -> bool:
+        """More audio queued, or queued for longer, than the worker should have to catch up on."""
+        with self.ingest_lock:
+            queued_seconds = self.queued_seconds
+        return max(queued_seconds, self.backlog_seconds) > INGEST_MAX_BACKLOG_SECONDS
+
+    async def wait_for_room(self):
+        """Stops reading the listener's socket until the worker catches up, so the backlog can't grow without bound."""
+        started = time.monotonic()
+        self.ingest_waiting = True
+        while self.ingest_backlogged and not self.stop_event.is_set():
+            self.drained.clear()
+            try:
+                await asyncio.wait_for(self.drained.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+        self.ingest_waiting = False
+        INGEST_THROTTLED.inc(time.monotonic() - started, session=self.session_id)
+
+    def _mark_drained(self, count: int, seconds: float, oldest_arrival: float):
+        with self.ingest_lock:
+            self.queued -= count
+            self.queued_seconds = max(self.queued_seconds - seconds, 0.0) if self.queued else 0.0
+            if self.queued:
+                # Whatever is left arrived while this batch was being ingested
+                self.queued_since = time.time()
+        self.ingest_lag = max(self.ingest_lag, time.time() - oldest_arrival)
+        if self.ingest_waiting:
+            self.loop.call_soon_threadsafe(self.drained.set)
+
+    @property
+    def decode_quantum_samples(self) -> int:
+        return int(MIN_DECODE_QUANTUM_MS * self.quality.settings["quantum_scale"] / 1000.0 * 16000)
+
+    def _ingest(self, data: bytes, arrived_at: float, framed: bool):
+        if framed:
+            try:
+                data, lost_samples = self.receiver.decode(data)
+            except ValueError as e:
+                logger.warning(f"Dropping audio frame from {self.job_key}: {e}")
+                return
+            if lost_samples:
+                # Silence stands in for the lost audio; a long outage reads as an endpoint to the VAD
+                self._write_pcm(bytes(min(lost_samples, self.max_conceal_samples) * 2))
+        written = self._write_pcm(data)
+        self.last_audio_at = arrived_at
+        AUDIO_SECONDS.inc(written / 16000.0, session=self.session_id)
+
+    def _write_pcm(self, data: bytes) -> int:
+        written = self.buffer.write_pcm16(data)
+        self.samples_since_decode += written
+        overflow = self.buffer.dropped_samples - self.ring_dropped
+        if overflow:
+            # The ring dropped its oldest audio to make room; keep timestamps aligned and count the loss
+            self.ring_dropped = self.buffer.dropped_samples
+            self.buffer_offset += overflow / 16000.0
+            AUDIO_DROPPED.inc(overflow / 16000.0, session=self.session_id)
+        # The VAD classifies each chunk as it lands in the buffer
+        self.vad.feed(self.buffer.view(len(self.buffer) - written))
+        return written
+
+    def _trim_buffer(self, seconds: float):
+        """Drops audio from the front of the buffer, keeping utterance timestamps stable."""
+        samples = min(int(seconds * 16000), len(self.buffer))
+        if samples <= 0:
+            return
+        self.buffer.discard(samples)
+        self.buffer_offset += samples / 16000.0
+
+    def _slide_window(self, seconds: float):
+        """
+        Drops audio that has fallen out of the decode window. Words the latest pass heard there are
+        committed as heard (slightly worse text beats missing text); only audio no pass reached is lost.
+        """
+        cut_at = self.buffer_offset + seconds
+        forced = self.hypothesis.commit_before(cut_at)
+        if forced:
+            WORDS_FORCE_COMMITTED.inc(len(forced), session=self.session_id)
+        unheard = cut_at - max(self.decoded_until, self.buffer_offset)
+        if unheard > 0:
+            AUDIO_DROPPED.inc(unheard, session=self.session_id)
+            logger.warning(f"Transcription lagging: {unheard:.1f}s of audio left the window undecoded ({self.job_key})")
+        BUFFER_TRIMS.inc(session=self.session_id)
+        self._trim_buffer(seconds)
+
+    def _update_quality(self, pass_seconds: float, budget_seconds: float):
+        previous = self.quality.level
+        settings = self.quality.observe(pass_seconds, budget_seconds, self.ingest_lag)
+        self.ingest_lag = 0.0
+        if settings is None:
+            return
+        direction = "degrade" if self.quality.level > previous else "restore"
+        QUALITY_CHANGES.inc(session=self.session_id, direction=direction)
+        logger.info(f"Listener {self.job_key}: {direction} to '{settings['mode']}' (load {self.quality.load:.2f})")
+        # Clients can tell the user why partials slowed down or stopped
+        asyncio.run_coroutine_threadsafe(
+            self.session_manager.broadcast({
+                "type": "transcription_quality",
+                "source": self.job_key,
+                "level": self.quality.level,
+                "mode": settings["mode"],
+                "degraded": self.quality.degraded,
+                "partials": settings["partials"]
+            }),
+            self.loop
+        )
+
+    def _reset_utterance(self):
+        self.buffer.clear()
+        self.buffer_offset = 0.0
+        self.decoded_until = 0.0
+        self.hypothesis.reset()
+        self.vad.reset_utterance()
+
+    def _send_update(self, is_final: bool):
+        # Finals wait out the VAD endpoint silence, so they get their own stage
+        STAGE_SECONDS.observe(
+            time.time() - self.timing.get("audio_at", time.time()),
+            session=self.session_id, stage="audio_to_final" if is_final else "audio_to_partial"
+        )
+        asyncio.run_coroutine_threadsafe(
+            self.session_manager.broadcast_update(
+                self._build_message_segments(),
+                is_final,
+                committed=self.hypothesis.committed_text(),
+                tentative=self.hypothesis.tentative_text(),
+                source=self.job_key,
+                timing=dict(self.timing) if MESSAGE_TIMING else None
+            ),
+            self.loop
+        )
+
+    def _build_message_segments(self) -> List[Dict]:
+        segments = []
+        if self.hypothesis.committed:
+            segments.append(words_to_segment(self.hypothesis.committed, 0))
+        if self.hypothesis.tentative:
+            segments.append(words_to_segment(self.hypothesis.tentative, len(segments)))
+        return segments
 
     def _run(self):
         # List of common Whisper hallucinations to ignore
@@ -277,146 +1201,213 @@ class TranscriptionWorker:
         
         while not self.stop_event.is_set():
             try:
-                # 1. Drain the queue completely to catch up to the latest audio
-                new_data = []
-                while not self.audio_queue.empty():
+                # 1. Sleep until audio arrives. With undecoded speech pending, only wait one
+                # quantum so a stalled stream doesn't hold back the last words.
+                timeout = self.decode_quantum_samples / 16000.0 if self.vad.has_new_speech else None
+                try:
+                    item = self.audio_queue.get(timeout=timeout)
+                    stalled = False
+                except queue.Empty:
+                    item = (0.0, b"", False, 0.0)
+                    stalled = True
+
+                # Then drain the queue completely to catch up to the latest audio
+                drained, drained_seconds, oldest_arrival = 0, 0.0, time.time()
+                while item is not None:
+                    arrived_at, data, framed, seconds = item
+                    if arrived_at:
+                        drained += 1
+                        drained_seconds += seconds
+                        oldest_arrival = min(oldest_arrival, arrived_at)
+                    if data:
+                        self._ingest(data, arrived_at, framed)
                     try:
-                        new_data.append(self.audio_queue.get_nowait())
+                        item = self.audio_queue.get_nowait()
                     except queue.Empty:
                         break
-                
-                if new_data:
-                    self.buffer = np.concatenate([self.buffer] + new_data)
-
-                total_duration = len(self.buffer) / 16000.0
-
-                # 2. Lag Protection: If we have more than 15s in the queue/buffer and aren't finishing, 
-                # we are likely falling behind. Trim it.
-                if total_duration > 20.0:
-                    logger.warning(f"Transcription lagging ({total_duration:.1f}s). Trimming buffer.")
-                    self.buffer = self.buffer[-16000 * 10:]
-                    total_duration = 10.0
-
-                # 3. Process if we have enough audio
-                if total_duration >= 1.0: 
-                    # Use a smaller window (10s) for re-transcription to keep it fast
-                    audio_to_process = self.buffer
-                    if len(audio_to_process) > 16000 * 10:
-                        audio_to_process = audio_to_process[-16000 * 10:]
-
-                    # 4. Streamlined transcription call
-                    segments, info = self.model.transcribe(
-                        audio_to_process,
-                        beam_size=1,        # Fast processing (3080 handles this in ms)
-                        language="en", 
-                        vad_filter=True,
-                        vad_parameters=dict(min_silence_duration_ms=600),
-                        condition_on_previous_text=True,
-                        initial_prompt="Interview transcription. Stable and fast."
-                    )
+                if drained:
+                    self._mark_drained(drained, drained_seconds, oldest_arrival)
+                if item is None:
+                    break
+
+                buffer_duration = self.buffer.duration
+                settings = self.quality.settings
+
+                # 2. Silence gate: only decode when speech arrived since the last pass, and
+                # batch up at least one quantum of new audio unless the utterance just ended
+                quantum_ready = self.samples_since_decode >= self.decode_quantum_samples or stalled
+                if self.vad.has_new_speech and (
+                    (buffer_duration >= 1.0 and quantum_ready) or self.vad.utterance_ended
+                ):
+                    self.vad.mark_decoded()
+                    # The real time this pass has to finish in before it falls behind the stream. Stall and
+                    # endpoint passes cover too little new audio to say anything about the load
+                    budget = self.samples_since_decode / 16000.0
+                    measured = self.samples_since_decode >= self.decode_quantum_samples
+                    self.samples_since_decode = 0
+
+                    # Only the uncommitted tail is in the buffer; audio beyond the current quality
+                    # level's window is committed as last heard and dropped to keep passes bounded
+                    if buffer_duration > settings["window_s"]:
+                        self._slide_window(buffer_duration - settings["window_s"])
+                        buffer_duration = self.buffer.duration
+                    audio_to_process = self.buffer.view()
+                    window_offset = self.buffer_offset
+
+                    # Committed text carries the context the trimmed audio no longer does
+                    # (a batching scheduler replaces it with the shared default prompt)
+                    prompt = DEFAULT_PROMPT
+                    committed_text = self.hypothesis.committed_text()
+                    if committed_text:
+                        prompt = f"{prompt} {committed_text[-200:]}"
+
+                    # 3. Decode through the shared scheduler (blocks until our batch has run)
+                    scheduler = fallback_scheduler if settings["fallback"] and fallback_scheduler else self.scheduler
+                    audio_at = self.last_audio_at
+                    decode_started = time.monotonic()
+                    segments = scheduler.transcribe(self.job_key, audio_to_process, prompt)
+                    elapsed = time.monotonic() - decode_started
+                    self.timing = {
+                        "audio_at": audio_at,
+                        "inference_ms": round(elapsed * 1000.0, 1)
+                    }
+                    self.decoded_until = self.buffer_offset + buffer_duration
                     
-                    results = []
-                    last_segment_end = 0.0
+                    words = []
                     for segment in segments:
-                        text = segment.text.strip()
+                        text = segment["text"].strip()
                         if text in HALLUCINATIONS or len(text) <= 1:
                             continue
-                            
-                        results.append({
-                            "start": round(segment.start, 2),
-                            "end": round(segment.end, 2),
-                            "text": text,
-                            "id": segment.id
-                        })
-                        last_segment_end = segment.end
-                    
-                    is_final = False
-                    should_clear_buffer = False
-                    
-                    if results:
-                        # 5. Faster Finalization: 0.8s of silence is usually a safe break point
-                        silence_duration = total_duration - last_segment_end
-                        if silence_duration > 1.2: 
-                            is_final = True
-                            should_clear_buffer = True
-                    else:
-                        if total_duration > 3.0: # Clear silence faster
-                            should_clear_buffer = True
-
-                    if results:
-                        asyncio.run_coroutine_threadsafe(
-                            self.session_manager.broadcast_update(results, is_final),
-                            self.loop
-                        )
-                    
-                    if should_clear_buffer:
-                        self.buffer = np.array([], dtype=np.float32)
-                
-                # Small sleep to prevent tight-loop CPU hogging
-                time.sleep(0.05)
+                        for word in segment["words"]:
+                            words.append({
+                                "start": word["start"] + window_offset,
+                                "end": word["end"] + window_offset,
+                                "word": word["word"]
+                            })
+
+                    # 4. LocalAgreement: commit the prefix consecutive passes agree on
+                    self.hypothesis.insert(words)
+                    newly_committed = self.hypothesis.flush()
+                    if newly_committed:
+                        # Committed audio never needs decoding again
+                        self._trim_buffer(self.hypothesis.last_committed_end - self.buffer_offset)
+
+                    if (newly_committed or words) and settings["partials"] and not self.vad.utterance_ended:
+                        self._send_update(is_final=False)
+
+                    if measured:
+                        self._update_quality(elapsed, budget)
+
+                # 5. Endpointing comes from the VAD: enough trailing silence after speech
+                if self.vad.utterance_ended:
+                    if self.hypothesis.committed or self.hypothesis.tentative:
+                        self.hypothesis.complete()
+                        self._send_update(is_final=True)
+                    self._reset_utterance()
+                elif not self.vad.utterance_has_speech and buffer_duration > 3.0:
+                    # Clear silence faster, keeping a short pre-roll so the next onset isn't clipped
+                    self._trim_buffer(buffer_duration - 0.5)
                 
             except Exception as e:
                 logger.error(f"Error in transcription worker: {e}")
-                time.sleep(0.1)
+                self.stop_event.wait(0.1)
+
+async def handle_client_message(session: SessionManager, websocket: WebSocket, data: Dict):
+    if not isinstance(data, dict):
+        return
+    if data.get("type") == "toggle_ai":
+        await session.toggle_ai(data["enabled"])
+    elif data.get("type") == "change_model":
+        session.ai_model = data["model"]
+        session.save_state()
+    elif data.get("type") == "force_segment":
+        await session.handle_force_segment()
+    elif data.get("type") == "history_page":
+        # Older history is fetched a page at a time instead of replayed on connect
+        await session.send_history_page(websocket, int(data.get("before_seq", session.next_seq)), int(data.get("limit", HISTORY_PAGE_SIZE)))
+    else:
+        # Relay other state updates to all viewers
+        try:
+            await session.broadcast(data, save_to_history=True)
+        except TypeError as e:
+            # Valid JSON the encoder refuses (e.g. integers beyond 64 bits); drop it, keep the client
+            logger.warning(f"Not relaying client message that can't be encoded: {e}")
 
 @app.websocket("/ws/session")
-async def session_websocket(websocket: WebSocket, role: str = Query(...)):
+async def session_websocket(
+    websocket: WebSocket,
+    role: str = Query(...),
+    session_id: str = Query(DEFAULT_SESSION_ID),
+    last_seq: Optional[int] = Query(None)
+):
     await websocket.accept()
-    logger.info(f"New client connected as {role}")
+    session = await session_registry.get(session_id)
+    logger.info(f"New client connected as {role} to session '{session_id}'")
     
     if role == "viewer":
-        await session_manager.add_viewer(websocket)
+        await session.add_viewer(websocket, last_seq)
         try:
             while True:
                 # Viewers can also send relay messages (like manual adjustments)
                 message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
                 if "text" in message:
                     try:
-                        data = json.loads(message["text"])
-                        if data.get("type") == "toggle_ai":
-                            await session_manager.toggle_ai(data["enabled"])
-                        elif data.get("type") == "change_model":
-                            session_manager.ai_model = data["model"]
-                        elif data.get("type") == "force_segment":
-                            await session_manager.handle_force_segment()
-                        else:
-                            await session_manager.broadcast(data, save_to_history=True)
+                        await handle_client_message(session, websocket, json.loads(message["text"]))
                     except json.JSONDecodeError:
                         pass
         except WebSocketDisconnect:
-            await session_manager.remove_viewer(websocket)
-            logger.info("Viewer disconnected")
+            await session.remove_viewer(websocket)
+            logger.info(f"Viewer disconnected from session '{session_id}'")
     
     elif role in ["listener", "candidate"]:
-        await session_manager.add_listener(websocket)
-        worker = TranscriptionWorker(model, websocket, session_manager)
+        # Models load after startup; hold the listener until transcription is possible
+        if not (await model_loader.wait("whisper") and await model_loader.wait("vad")):
+            await websocket.close(code=1011, reason="Transcription model unavailable")
+            return
+        await session.add_listener(websocket, last_seq)
+        worker = TranscriptionWorker(scheduler, websocket, session)
         worker.start()
+        # Raw PCM until the client negotiates framed audio
+        framed = False
         try:
             while True:
                 message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
                 if "bytes" in message:
-                    data = message["bytes"]
-                    audio_chunk = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
-                    worker.add_audio(audio_chunk)
+                    worker.add_audio(message["bytes"], framed)
+                    if worker.ingest_backlogged:
+                        # Backpressure: leave further audio in the socket until the worker catches up
+                        await worker.wait_for_room()
                 elif "text" in message:
                     try:
                         data = json.loads(message["text"])
-                        if data.get("type") == "toggle_ai":
-                            await session_manager.toggle_ai(data["enabled"])
-                        elif data.get("type") == "change_model":
-                            session_manager.ai_model = data["model"]
-                        elif data.get("type") == "force_segment":
-                            await session_manager.handle_force_segment()
-                        else:
-                            # Relay other state updates to all viewers
-                            await session_manager.broadcast(data, save_to_history=True)
                     except json.JSONDecodeError:
-                        pass
+                        continue
+                    if data.get("type") == "audio_format":
+                        # The reply names the codec to switch to; frames sent before it are still decoded by their codec id
+                        framed = data.get("framing") == FRAMING_VERSION
+                        session.send_to(websocket, {
+                            "type": "audio_format",
+                            "framing": FRAMING_VERSION if framed else None,
+                            "codec": negotiate(data.get("codecs", [])) if framed else "pcm16",
+                            "sample_rate": 16000
+                        })
+                    else:
+                        await handle_client_message(session, websocket, data)
         except WebSocketDisconnect:
-            await session_manager.remove_listener(websocket)
-            logger.info("Listener disconnected")
+            await session.remove_listener(websocket)
+            logger.info(f"Listener disconnected from session '{session_id}'")
         finally:
-            worker.stop()
+            # The join waits out a decode in flight (up to INFERENCE_JOB_TIMEOUT for a hung worker); keep it off the loop
+            await asyncio.to_thread(worker.stop)
+            session.end_partial_stream(worker.job_key)
+            if framed:
+                logger.info(f"Listener audio for {worker.job_key}: {worker.receiver.stats()}")
+            if worker.quality.degrades:
+                logger.info(f"Listener quality for {worker.job_key}: {worker.quality.stats()}")
     else:
         await websocket.close(code=4000, reason="Invalid role")
 
@@ -0,0 +1,180 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans sub-millisecond enqueues up to slow LLM answers
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        # Observed from worker threads and the event loop alike
+        self.lock = threading.Lock()
+        self.series: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def forget(self, **labels):
+        """Drops every series matching `labels` (e.g. an evicted session)."""
+        with self.lock:
+            for key in [k for k in self.series if all(
+                k[self.label_names.index(name)] == str(value)
+                for name, value in labels.items() if name in self.label_names
+            )]:
+                del self.series[key]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            series = list(self.series.items())
+        for key, value in sorted(series):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.series[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # Per-bucket counts (+Inf last), sum, count; made cumulative only when rendered
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, key, value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus-compatible metrics: counters, gauges and histograms with
+    labels, rendered in the text exposition format. Recording is a dict lookup
+    and an increment under a lock, cheap enough for the decode and broadcast paths.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def forget(self, **labels):
+        for metric in self.metrics:
+            if any(name in metric.label_names for name in labels):
+                metric.forget(**labels)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Hot-path metrics, shared by the modules that record them
+STAGE_SECONDS = registry.histogram(
+    "transcription_stage_seconds",
+    "Time spent per pipeline stage (queue_wait, decode, segmenter, broadcast, audio_to_partial, audio_to_final, llm_first_token, llm_total).",
+    ["session", "stage"]
+)
+REAL_TIME_FACTOR = registry.histogram(
+    "transcription_real_time_factor",
+    "Decode time divided by the audio duration decoded.",
+    ["session"], buckets=RTF_BUCKETS
+)
+CLIENT_SEND_SECONDS = registry.histogram(
+    "client_send_seconds",
+    "Time from enqueueing a message for a client to the websocket write completing.",
+    ["role"]
+)
+AUDIO_SECONDS = registry.counter("audio_received_seconds_total", "Seconds of audio received from listeners.", ["session"])
+DECODES = registry.counter("decodes_total", "Decode passes run by the inference scheduler.", ["session"])
+AUDIO_BYTES = registry.counter("audio_received_bytes_total", "Framed listener audio received, by codec.", ["session", "codec"])
+AUDIO_LOST = registry.counter("audio_lost_seconds_total", "Seconds of framed listener audio missing from sequence gaps (lost in transit or skipped by the client).", ["session"])
+AUDIO_FRAMES_DISCARDED = registry.counter("audio_frames_discarded_total", "Framed audio dropped on arrival (late, malformed, unsupported or undecodable).", ["session", "reason"])
+AUDIO_DROPPED = registry.counter("audio_dropped_seconds_total", "Seconds of audio dropped undecoded because a listener fell behind.", ["session"])
+BUFFER_TRIMS = registry.counter("lag_trims_total", "Times the decode window slid past audio whose words were not committed yet.", ["session"])
+WORDS_FORCE_COMMITTED = registry.counter("words_force_committed_total", "Words committed without agreement because their audio left the decode window.", ["session"])
+QUALITY_CHANGES = registry.counter("transcription_quality_changes_total", "Adaptive quality level changes, by direction (degrade, restore).", ["session", "direction"])
+INGEST_THROTTLED = registry.counter("ingest_throttled_seconds_total", "Seconds a listener's socket reads were paused because its queued audio was too old.", ["session"])
+MESSAGES = registry.counter("messages_broadcast_total", "Messages broadcast to session clients, by type.", ["session", "type"])
+INFERENCE_RESTARTS = registry.counter("inference_worker_restarts_total", "Inference worker processes restarted after a crash, hang or failed start.")
+AI_REQUESTS = registry.counter("ai_requests_total", "AI requests by outcome (completed, cached, cancelled, error).", ["session", "outcome"])
+
+
+def session_label(job_key: Optional[str]) -> str:
+    """Listener job keys look like "<session>/listener-<id>"; metrics are kept per session."""
+    return (job_key or "").split("/", 1)[0]
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoader:
+    """
+    Loads models on background threads once the server is up, and records how it went.
+
+    Each model goes pending -> loading -> warming_up -> ready (or failed). The
+    warm-up runs one synthetic call so the first real request doesn't pay for
+    kernel selection and lazy initialization. Callers that need a model
+    `await wait(name)` instead of assuming it is there.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.status: Dict[str, Dict] = {}
+        self.events: Dict[str, asyncio.Event] = {}
+        for name in names:
+            self._entry(name)
+
+    def _entry(self, name: str) -> Dict:
+        if name not in self.status:
+            self.status[name] = {"state": "pending"}
+            self.events[name] = asyncio.Event()
+        return self.status[name]
+
+    async def load(self, name: str, load: Callable[[], Any],
+                   warm_up: Optional[Callable[[Any], Any]] = None) -> Optional[Any]:
+        """Runs `load` (then `warm_up` on its result) off the event loop. Returns None if it failed."""
+        status = self._entry(name)
+        status["state"] = "loading"
+        started = time.monotonic()
+        try:
+            loaded = await asyncio.to_thread(load)
+            status["load_ms"] = round((time.monotonic() - started) * 1000.0, 1)
+
+            if warm_up is not None:
+                status["state"] = "warming_up"
+                warm_started = time.monotonic()
+                await asyncio.to_thread(warm_up, loaded)
+                status["warmup_ms"] = round((time.monotonic() - warm_started) * 1000.0, 1)
+
+            status["state"] = "ready"
+            logger.info(f"Model '{name}' ready (load {status['load_ms']}ms, warm-up {status.get('warmup_ms', 0)}ms)")
+            return loaded
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = str(e)
+            logger.error(f"Failed to load model '{name}': {e}")
+            return None
+        finally:
+            self.events[name].set()
+
+    def skip(self, name: str, reason: str):
+        status = self._entry(name)
+        status["state"] = "disabled"
+        status["reason"] = reason
+        self.events[name].set()
+
+    async def wait(self, name: str) -> bool:
+        """Waits until `name` has finished loading. Returns whether it is usable."""
+        self._entry(name)
+        await self.events[name].wait()
+        return self.status[name]["state"] == "ready"
+
+    def is_ready(self, name: str) -> bool:
+        return self.status.get(name, {}).get("state") == "ready"
+
+    @property
+    def settled(self) -> bool:
+        """Every model has finished loading, one way or another."""
+        return all(event.is_set() for event in self.events.values())
+
+    def stats(self) -> Dict:
+        return {name: dict(status) for name, status in self.status.items()}
@@ -0,0 +1,101 @@
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Degradation ladder, cheapest concessions first. `quantum_scale` multiplies the minimum
+# new audio between decodes, `window_s` caps the audio each pass re-decodes, `partials`
+# controls whether mid-utterance hypotheses are broadcast, and `fallback` routes decodes
+# to the smaller fallback model when one is configured.
+LEVELS: List[Dict] = [
+    {"mode": "full", "quantum_scale": 1, "window_s": 10.0, "partials": True, "fallback": False},
+    {"mode": "slower_updates", "quantum_scale": 2, "window_s": 10.0, "partials": True, "fallback": False},
+    {"mode": "short_window", "quantum_scale": 4, "window_s": 6.0, "partials": True, "fallback": False},
+    {"mode": "finals_only", "quantum_scale": 8, "window_s": 5.0, "partials": False, "fallback": False},
+    {"mode": "fallback_model", "quantum_scale": 8, "window_s": 5.0, "partials": False, "fallback": True},
+]
+
+
+class QualityController:
+    """
+    Feedback loop between one listener's decode load and its transcription quality.
+
+    After every decode pass the worker reports how long the pass took (queueing
+    in the shared scheduler included), how much real time it had for it (the
+    audio that arrived since the previous pass) and how long audio has been
+    waiting to be ingested. The load is the smoothed ratio of the two: near 1
+    the worker decodes back to back and latency starts to pile up. Above
+    `high_load` (or with more than `max_backlog_s` of audio waiting) it steps
+    one level down the ladder; once the load has stayed under `low_load` for
+    `restore_after_s` it steps back up. Degrading is quick, restoring is slow,
+    so a noisy load doesn't flap between levels.
+    """
+
+    def __init__(self, levels: Optional[List[Dict]] = None, high_load: float = 0.8, low_load: float = 0.4,
+                 max_backlog_s: float = 2.0, degrade_after_s: float = 1.0, restore_after_s: float = 5.0,
+                 smoothing: float = 0.3):
+        self.levels = levels or LEVELS
+        self.high_load = high_load
+        self.low_load = low_load
+        self.max_backlog = max_backlog_s
+        self.degrade_after = degrade_after_s
+        self.restore_after = restore_after_s
+        self.smoothing = smoothing
+
+        self.level = 0
+        self.load: Optional[float] = None
+        self.changed_at = time.monotonic()
+        self.calm_since: Optional[float] = None
+
+        # Stats
+        self.degrades = 0
+        self.restores = 0
+
+    @property
+    def settings(self) -> Dict:
+        return self.levels[self.level]
+
+    @property
+    def degraded(self) -> bool:
+        return self.level > 0
+
+    def observe(self, pass_seconds: float, budget_seconds: float, backlog_seconds: float = 0.0) -> Optional[Dict]:
+        """Feeds one decode pass. Returns the new level's settings when the level changes."""
+        sample = pass_seconds / max(budget_seconds, 1e-3)
+        self.load = sample if self.load is None else (1.0 - self.smoothing) * self.load + self.smoothing * sample
+        now = time.monotonic()
+
+        overloaded = self.load > self.high_load or backlog_seconds > self.max_backlog
+        if overloaded:
+            self.calm_since = None
+            if self.level < len(self.levels) - 1 and now - self.changed_at >= self.degrade_after:
+                self.degrades += 1
+                return self._set(self.level + 1, now)
+            return None
+
+        if self.load < self.low_load:
+            if self.calm_since is None:
+                self.calm_since = now
+            if self.level > 0 and now - self.calm_since >= self.restore_after and now - self.changed_at >= self.restore_after:
+                self.restores += 1
+                # Each restored level has to prove itself for another full period
+                self.calm_since = now
+                return self._set(self.level - 1, now)
+        else:
+            self.calm_since = None
+        return None
+
+    def _set(self, level: int, now: float) -> Dict:
+        self.level = level
+        self.changed_at = now
+        return self.settings
+
+    def stats(self) -> Dict:
+        return {
+            "level": self.level,
+            "mode": self.settings["mode"],
+            "load": round(self.load, 3) if self.load is not None else None,
+            "degrades": self.degrades,
+            "restores": self.restores
+        }
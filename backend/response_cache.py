@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import string
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+def normalize_prompt(text: str) -> str:
+    """Case, punctuation and whitespace differences don't make a question new."""
+    return re.sub(r"\s+", " ", text.lower().translate(_PUNCTUATION)).strip()
+
+
+def context_fingerprint(*parts: str) -> str:
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def conversation_fingerprint(model: str, messages: List[Dict]) -> str:
+    """Fingerprint of everything sent along with a question: the model plus the system prompt and conversation window."""
+    return context_fingerprint(model, *(f"{m['role']}:{m['content']}" for m in messages))
+
+
+class ResponseCache:
+    """
+    Local cache of AI answers for questions that come up again and again.
+
+    Entries are keyed by the normalized prompt plus a context fingerprint (the
+    model, system prompt and conversation window sent with the question), so an
+    answer is only reused under the same setup and the same conversation.
+    With an `embedder` (the segmenter's EmbeddingService) a miss falls back to
+    a near-duplicate lookup: the most similar cached prompt with the same
+    fingerprint is reused if its cosine similarity clears
+    `similarity_threshold`. Entries expire after `ttl_seconds`, the least
+    recently used are evicted beyond `max_entries`, and the cache is persisted
+    to `path` (JSON) when one is given.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: float = 86400.0, max_entries: int = 1000,
+                 similarity_threshold: float = 0.92, embedder=None):
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder if similarity_threshold > 0 else None
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.save_task: Optional[asyncio.Task] = None
+        self.dirty = False
+
+        # Stats
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if path:
+            self._load()
+
+    async def lookup(self, prompt: str, fingerprint: str) -> Optional[Dict]:
+        """Returns the cached entry (with `match` set to "exact" or "semantic"), or None."""
+        self._expire()
+        normalized = normalize_prompt(prompt)
+        key = context_fingerprint(fingerprint, normalized)
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return {**entry, "match": "exact"}
+
+        if self.embedder is not None:
+            candidates = [(k, e) for k, e in self.entries.items() if e["fingerprint"] == fingerprint and e.get("embedding") is not None]
+            if candidates:
+                query = await self._embed(normalized)
+                if query is not None:
+                    matrix = np.stack([e["embedding"] for _, e in candidates])
+                    scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        best_key, best_entry = candidates[best]
+                        self.entries.move_to_end(best_key)
+                        self.semantic_hits += 1
+                        return {**best_entry, "match": "semantic", "similarity": float(scores[best])}
+
+        self.misses += 1
+        return None
+
+    async def store(self, prompt: str, fingerprint: str, response: str):
+        normalized = normalize_prompt(prompt)
+        if not normalized or not response:
+            return
+        key = context_fingerprint(fingerprint, normalized)
+        self.entries[key] = {
+            "prompt": normalized,
+            "fingerprint": fingerprint,
+            "response": response,
+            "created_at": time.time(),
+            "embedding": await self._embed(normalized) if self.embedder is not None else None
+        }
+        self.entries.move_to_end(key)
+        self.stores += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self._schedule_save()
+
+    def stats(self) -> Dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "semantic_lookup": self.embedder is not None,
+            "persistent": bool(self.path)
+        }
+
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            return np.asarray(await self.embedder.encode(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Response cache embedding failed: {e}")
+            return None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        expired = [key for key, entry in self.entries.items() if entry["created_at"] < cutoff]
+        for key in expired:
+            del self.entries[key]
+            self.evictions += 1
+
+    def _schedule_save(self):
+        if not self.path:
+            return
+        self.dirty = True
+        if self.save_task is None or self.save_task.done():
+            self.save_task = asyncio.create_task(self._save())
+
+    async def _save(self):
+        # Stores during a write are picked up by the next pass
+        while self.dirty:
+            self.dirty = False
+            # Snapshot on the loop, write on a thread
+            await asyncio.to_thread(self._write, self._serialize())
+
+    def _serialize(self) -> List[Dict]:
+        return [
+            {**entry, "key": key, "embedding": entry["embedding"].tolist() if entry.get("embedding") is not None else None}
+            for key, entry in self.entries.items()
+        ]
+
+    def _write(self, snapshot: List[Dict]):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not persist response cache to {self.path}: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load response cache from {self.path}: {e}")
+            return
+        for item in snapshot:
+            key = item.pop("key")
+            if item.get("embedding") is not None:
+                item["embedding"] = np.asarray(item["embedding"], dtype=np.float32)
+            self.entries[key] = item
+        self._expire()
+        logger.info(f"Loaded {len(self.entries)} cached AI responses from {self.path}")
@@ -1,23 +1,62 @@
+import asyncio
+import hashlib
 import logging
-from sentence_transformers import SentenceTransformer, util
-import torch
+from collections import OrderedDict
+from embedding_backends import cosine_similarity, create_embedding_backend
+
+def load_semantic_model(model_name='all-MiniLM-L6-v2', backend='torch', model_dir=None):
+    """
+    Loads the embedding model once so several segmenters can share it.
+    `backend` is 'torch' (sentence-transformers) or 'onnx' (int8 ONNX Runtime, no torch).
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Loading Semantic Model: {model_name} ({backend})...")
+    model = create_embedding_backend(model_name, backend=backend, model_dir=model_dir)
+    logger.info(f"Model loaded on {model.device}")
+    return model
 
 class SemanticSegmenter:
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, model_name='all-MiniLM-L6-v2', model=None, cache_size=512, encoder=None, backend='torch'):
         self.logger = logging.getLogger(__name__)
-        self.logger.info(f"Loading Semantic Model: {model_name}...")
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        self.model = SentenceTransformer(model_name, device=self.device)
-        self.logger.info(f"Model loaded on {self.device}")
+        # Segmentation state is per instance; the model can be shared across sessions
+        self.model = model if model is not None else load_semantic_model(model_name, backend=backend)
+        # Optional async encoder (EmbeddingService) used by process_async()
+        self.encoder = encoder
+        self.lock = asyncio.Lock()
 
         # State
         self.current_thought_buffer = ""
         self.current_thought_embedding = None
         self.similarity_threshold = 0.45  # Tunable threshold for "Same Thought"
 
-    def process(self, text_chunk):
+        # The thought embedding is a running, length-weighted mean of its chunk embeddings,
+        # so each chunk is encoded once instead of re-encoding the whole buffer
+        self.thought_embedding_sum = None
+        self.thought_weight = 0
+
+        # Chunk embeddings by text hash (LRU), so repeated phrases aren't re-encoded
+        self.embedding_cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def process_async(self, text_chunk):
+        """Same as process(), but the chunk is encoded by `encoder` without blocking the event loop."""
+        text = text_chunk.strip()
+        if not text:
+            return None
+
+        # Decisions depend on the previous chunk, so apply them in arrival order
+        async with self.lock:
+            embedding = self.cached_embedding(text)
+            if embedding is None:
+                embedding = await self.encoder.encode(text)
+                self.cache_embedding(text, embedding)
+            return self.process(text, embedding)
+
+    def process(self, text_chunk, embedding=None):
         """
-        Ingests a new text chunk (sentence/phrase).
+        Ingests a new text chunk (sentence/phrase), optionally with its precomputed embedding.
         Returns a decision dict:
         {
             "action": "CONTINUE" | "FINAL",
@@ -28,22 +67,21 @@ class SemanticSegmenter:
         text = text_chunk.strip()
         if not text:
             return None
+        new_embedding = embedding if embedding is not None else self.encode_chunk(text)
 
         # 1. If buffer is empty, just start
         if not self.current_thought_buffer:
             self.current_thought_buffer = text
-            self.update_embedding(text)
+            self.start_thought(text, new_embedding)
             return {
                 "action": "UPDATE",
                 "text": self.current_thought_buffer
             }
 
         # 2. Compute similarity with current thought
-        new_embedding = self.model.encode(text, convert_to_tensor=True)
-        
         # We compare New chunk vs Current Thought Context
         # (Could essentially be the whole buffer or just the last few sentences)
-        similarity = util.cos_sim(self.current_thought_embedding, new_embedding).item()
+        similarity = cosine_similarity(self.current_thought_embedding, new_embedding)
         
         self.logger.info(f"Similarity: {similarity:.4f} | Chunk: '{text[:20]}...'")
 
@@ -58,7 +96,7 @@ class SemanticSegmenter:
             
             # Start New Thought
             self.current_thought_buffer = text
-            self.update_embedding(text)
+            self.start_thought(text, new_embedding)
             
             return {
                 "action": "FINAL",
@@ -69,9 +107,8 @@ class SemanticSegmenter:
         else:
             # Continue Thought
             self.current_thought_buffer += " " + text
-            # Update embedding using the WHOLE buffer to keep the "center of gravity" of the topic
-            # averaging might be better, but re-encoding buffer is safer for now for short thoughts
-            self.update_embedding(self.current_thought_buffer)
+            # Fold the chunk into the running mean to keep the "center of gravity" of the topic
+            self.extend_thought(text, new_embedding)
             
             return {
                 "action": "UPDATE",
@@ -79,8 +116,49 @@ class SemanticSegmenter:
                 "similarity_score": similarity
             }
 
+    def encode_chunk(self, text):
+        embedding = self.cached_embedding(text)
+        if embedding is None:
+            embedding = self.model.encode([text])[0]
+            self.cache_embedding(text, embedding)
+        return embedding
+
+    def cached_embedding(self, text):
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        embedding = self.embedding_cache.get(key)
+        if embedding is None:
+            self.cache_misses += 1
+            return None
+        self.embedding_cache.move_to_end(key)
+        self.cache_hits += 1
+        return embedding
+
+    def cache_embedding(self, text, embedding):
+        self.embedding_cache[hashlib.sha1(text.encode("utf-8")).hexdigest()] = embedding
+        if len(self.embedding_cache) > self.cache_size:
+            self.embedding_cache.popitem(last=False)
+
+    def start_thought(self, text, embedding):
+        self.thought_embedding_sum = None
+        self.thought_weight = 0
+        self.extend_thought(text, embedding)
+
+    def extend_thought(self, text, embedding):
+        # Longer chunks carry more of the topic, so they weigh more (by word count)
+        weight = max(1, len(text.split()))
+        weighted = embedding * weight
+        self.thought_embedding_sum = weighted if self.thought_embedding_sum is None else self.thought_embedding_sum + weighted
+        self.thought_weight += weight
+        self.current_thought_embedding = self.thought_embedding_sum / self.thought_weight
+
     def update_embedding(self, text):
-        self.current_thought_embedding = self.model.encode(text, convert_to_tensor=True)
+        """Resets the thought representation to `text` encoded as a single chunk."""
+        self.start_thought(text, self.encode_chunk(text))
+
+    async def manual_segment_trigger_async(self):
+        """Same as manual_segment_trigger(), but ordered with process_async() so a chunk in flight can't interleave."""
+        async with self.lock:
+            return self.manual_segment_trigger()
 
     def manual_segment_trigger(self):
         """Called when user presses 'End Thought' button"""
@@ -90,6 +168,8 @@ class SemanticSegmenter:
         final_text = self.current_thought_buffer
         self.current_thought_buffer = ""
         self.current_thought_embedding = None
+        self.thought_embedding_sum = None
+        self.thought_weight = 0
         
         return {
             "action": "FINAL",
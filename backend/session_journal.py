@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    frame TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SessionJournal:
+    """
+    Append-only, on-disk record of every session's history (SQLite in WAL mode).
+
+    Sessions hand their encoded history frames to `append()`, which only
+    enqueues: a writer thread commits whatever has accumulated in one
+    transaction, so the event loop never waits on the disk. Entries are
+    clustered by (session_id, seq), which makes restoring a session's latest
+    window and paging back through older entries a single index range scan.
+    Sessions not updated for `retention_hours` are purged at startup.
+
+    Every record gets a ticket in queue order. Reads that must see a session's
+    latest appends wait (at most `read_timeout` seconds) for that session's
+    last ticket to be written, not for the whole queue to drain.
+    """
+
+    def __init__(self, path: str, retention_hours: float = 0.0, read_timeout: float = 5.0):
+        self.path = path
+        self.retention = retention_hours * 3600.0
+        self.read_timeout = read_timeout
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.writer = self._connect()
+        self.writer.executescript(SCHEMA)
+        # Reads run on worker threads while the writer commits; WAL lets them proceed side by side
+        self.reader = self._connect()
+        self.reader_lock = threading.Lock()
+
+        self.queue: "queue.Queue" = queue.Queue()
+        self.condition = threading.Condition()
+        self.enqueued = 0
+        # Highest ticket the writer is done with (committed, or failed and logged)
+        self.written = 0
+        self.last_ticket: Dict[str, int] = {}
+        self.thread = threading.Thread(target=self._run, name="session-journal", daemon=True)
+
+        # Stats
+        self.entries_written = 0
+        self.batches_written = 0
+        self.last_batch_ms = 0.0
+
+        self._purge()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only syncs at checkpoints: commits survive a process crash without an fsync each
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.close()
+        self.reader.close()
+
+    def append(self, session_id: str, seq: int, frame: str):
+        self._enqueue(session_id, ("entry", session_id, seq, frame))
+
+    def save_state(self, session_id: str, state: Dict):
+        self._enqueue(session_id, ("state", session_id, json.dumps(state), time.time()))
+
+    def _enqueue(self, session_id: str, record: Tuple):
+        with self.condition:
+            # Tickets are handed out under the lock, so they follow queue order
+            self.enqueued += 1
+            self.last_ticket[session_id] = self.enqueued
+            self.queue.put((self.enqueued, record))
+
+    def flush(self, session_id: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until everything enqueued so far (for `session_id` only, if given) is written.
+        Returns False if that didn't happen within `timeout` or the writer thread isn't running.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            ticket = self.enqueued if session_id is None else self.last_ticket.get(session_id, 0)
+            while self.written < ticket:
+                if not self.thread.is_alive():
+                    return False
+                remaining = deadline - time.monotonic() if deadline is not None else 1.0
+                if remaining <= 0:
+                    return False
+                # Bounded wait, so a writer that dies mid-wait is noticed
+                self.condition.wait(min(remaining, 1.0))
+            return True
+
+    def restore(self, session_id: str, limit: int) -> Optional[Tuple[Dict, List[Tuple[int, str]]]]:
+        """Returns (state, latest `limit` entries as (seq, frame), oldest first), or None for an unknown session."""
+        with self.reader_lock:
+            row = self.reader.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            entries = self.reader.execute(
+                "SELECT seq, frame FROM entries WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        return json.loads(row[0]), entries[::-1]
+
+    def read_before(self, session_id: str, before_seq: int, limit: int) -> Tuple[List[Tuple[int, str]], bool]:
+        """Returns up to `limit` entries with seq < `before_seq` (oldest first) and whether older ones exist."""
+        if not self.flush(session_id, self.read_timeout):
+            # Serve what is on disk rather than hang the caller
+            logger.warning(f"Session journal writes for '{session_id}' are not on disk yet; history page may be incomplete")
+        with self.reader_lock:
+            rows = self.reader.execute(
+                "SELECT seq, frame FROM entries WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (session_id, before_seq, limit + 1)
+            ).fetchall()
+        return rows[:limit][::-1], len(rows) > limit
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "queue_depth": self.queue.qsize(),
+            "entries_written": self.entries_written,
+            "batches_written": self.batches_written,
+            "last_batch_ms": round(self.last_batch_ms, 2)
+        }
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            # Everything that piled up during the last commit goes into this one
+            while item is not None:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            tickets = [entry for entry in batch if entry is not None]
+            if tickets:
+                self._write([record for _, record in tickets])
+                with self.condition:
+                    self.written = tickets[-1][0]
+                    self.condition.notify_all()
+            if len(tickets) < len(batch):
+                return
+
+    def _write(self, records: List[Tuple]):
+        started = time.monotonic()
+        entries = [record[1:] for record in records if record[0] == "entry"]
+        states = {}
+        for record in records:
+            if record[0] == "state":
+                states[record[1]] = record[2:]
+        try:
+            self.writer.execute("BEGIN")
+            self.writer.executemany("INSERT OR REPLACE INTO entries (session_id, seq, frame) VALUES (?, ?, ?)", entries)
+            # Only the latest state per session in this batch matters
+            self.writer.executemany(
+                "INSERT OR REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+                [(session_id, state, updated_at) for session_id, (state, updated_at) in states.items()]
+            )
+            self.writer.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error(f"Session journal write failed: {e}")
+            try:
+                self.writer.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            return
+        self.entries_written += len(entries)
+        self.batches_written += 1
+        self.last_batch_ms = (time.monotonic() - started) * 1000.0
+
+    def _purge(self):
+        if self.retention <= 0:
+            return
+        cutoff = time.time() - self.retention
+        expired = [row[0] for row in self.writer.execute("SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff,))]
+        for session_id in expired:
+            self.writer.execute("DELETE FROM entries WHERE session_id = ?", (session_id,))
+            self.writer.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        if expired:
+            logger.info(f"Purged {len(expired)} sessions older than {self.retention / 3600.0:.0f}h from the journal")
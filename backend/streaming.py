@@ -0,0 +1,204 @@
+import logging
+import string
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
+
+def normalize_word(text: str) -> str:
+    """Comparison key for a word: case and punctuation differences between passes don't count."""
+    return text.strip().lower().translate(_PUNCTUATION)
+
+
+def words_to_segment(words: List[Dict], segment_id: int) -> Dict:
+    """Collapses a run of timestamped words into the segment dict the frontend expects."""
+    return {
+        "start": round(words[0]["start"], 2),
+        "end": round(words[-1]["end"], 2),
+        "text": "".join(w["word"] for w in words).strip(),
+        "id": segment_id
+    }
+
+
+class HypothesisBuffer:
+    """
+    LocalAgreement-n commit policy for streaming Whisper output.
+
+    Every decode pass inserts its word hypothesis (timestamps relative to the
+    utterance start). A word is committed once `agreement` consecutive passes
+    agree on it as part of the same prefix; everything after that prefix stays
+    tentative and may still change on the next pass.
+    """
+
+    def __init__(self, agreement: int = 2):
+        self.agreement = max(2, agreement)
+        self.committed: List[Dict] = []
+        self.hypotheses: List[List[Dict]] = []
+        self.last_committed_end = 0.0
+
+    def insert(self, words: List[Dict]):
+        # 1. Ignore anything the committed prefix already covers (small tolerance for timestamp jitter)
+        new = [w for w in words if w["start"] > self.last_committed_end - 0.1]
+
+        # 2. The decode window overlaps the committed tail slightly, so Whisper may repeat
+        # the last few committed words. Strip the longest such n-gram.
+        if new and self.committed and abs(new[0]["start"] - self.last_committed_end) < 1.0:
+            for n in range(min(len(self.committed), len(new), 5), 0, -1):
+                tail = [normalize_word(w["word"]) for w in self.committed[-n:]]
+                head = [normalize_word(w["word"]) for w in new[:n]]
+                if tail == head:
+                    new = new[n:]
+                    break
+
+        self.hypotheses.append(new)
+        self.hypotheses = self.hypotheses[-self.agreement:]
+
+    def flush(self) -> List[Dict]:
+        """Commits and returns the prefix the last `agreement` passes agree on."""
+        if len(self.hypotheses) < self.agreement:
+            return []
+
+        latest = self.hypotheses[-1]
+        previous = self.hypotheses[:-1]
+        agreed = 0
+        for i, word in enumerate(latest):
+            key = normalize_word(word["word"])
+            if all(len(h) > i and normalize_word(h[i]["word"]) == key for h in previous):
+                agreed += 1
+            else:
+                break
+
+        if not agreed:
+            return []
+
+        # Timestamps of the newest pass are the most accurate (it saw the most audio)
+        newly_committed = latest[:agreed]
+        self.committed.extend(newly_committed)
+        self.last_committed_end = newly_committed[-1]["end"]
+        self.hypotheses = [h[agreed:] for h in self.hypotheses]
+        return newly_committed
+
+    def complete(self) -> List[Dict]:
+        """End of utterance: whatever is still tentative is the best we will get, commit it."""
+        remaining = self.tentative
+        if remaining:
+            self.committed.extend(remaining)
+            self.last_committed_end = remaining[-1]["end"]
+        self.hypotheses = []
+        return remaining
+
+    def commit_before(self, t: float) -> List[Dict]:
+        """
+        Commits the latest pass's words that begin before `t` without waiting for agreement.
+        Used when their audio is about to leave the decode window: one pass's guess beats losing them.
+        """
+        latest = self.tentative
+        count = 0
+        while count < len(latest) and latest[count]["start"] < t:
+            count += 1
+        if not count:
+            return []
+        forced = latest[:count]
+        self.committed.extend(forced)
+        self.last_committed_end = forced[-1]["end"]
+        # Older passes no longer line up with what is left; agreement starts over from the next pass
+        self.hypotheses = [latest[count:]]
+        return forced
+
+    @property
+    def tentative(self) -> List[Dict]:
+        return self.hypotheses[-1] if self.hypotheses else []
+
+    @property
+    def last_word_end(self) -> float:
+        if self.tentative:
+            return self.tentative[-1]["end"]
+        return self.last_committed_end
+
+    def committed_text(self) -> str:
+        return "".join(w["word"] for w in self.committed).strip()
+
+    def tentative_text(self) -> str:
+        return "".join(w["word"] for w in self.tentative).strip()
+
+    def reset(self):
+        self.committed = []
+        self.hypotheses = []
+        self.last_committed_end = 0.0
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class PartialStream:
+    """
+    Partial-transcript state for one listener within a session.
+
+    Partials are rate limited to `max_rate_hz` (newer hypotheses replace a pending
+    one) and sent as deltas against the last hypothesis sent: keep the first
+    `keep` characters, append `text`. Each delta names the revision it applies to,
+    so a client that missed one can wait for the next keyframe (`keep == 0`).
+    """
+
+    def __init__(self, source: str, max_rate_hz: float):
+        self.source = source
+        self.min_interval = 1.0 / max_rate_hz if max_rate_hz > 0 else 0.0
+        self.rev = 0
+        self.sent_text = ""
+        self.last_sent_at = 0.0
+        self.pending = None
+        self.timer = None
+        # Server timings for the pending hypothesis (MESSAGE_TIMING)
+        self.timing = None
+
+    def offer(self, text: str, committed_chars: int) -> bool:
+        """Stashes a new hypothesis. Returns False if it is unchanged and can be suppressed."""
+        latest = self.pending[0] if self.pending else self.sent_text
+        if text == latest:
+            return False
+        self.pending = (text, committed_chars)
+        return True
+
+    def take_delta(self, now: float) -> Optional[Tuple[Dict, Dict]]:
+        """
+        Turns the pending hypothesis into the next revision, if it still differs.
+        Returns the delta message and its keyframe (same revision, whole hypothesis).
+        """
+        if self.pending is None:
+            return None
+        text, committed_chars = self.pending
+        self.pending = None
+        if text == self.sent_text:
+            return None
+
+        keep = common_prefix_length(self.sent_text, text)
+        self.rev += 1
+        message = {
+            "type": "transcription",
+            "is_final": False,
+            "source": self.source,
+            "rev": self.rev,
+            "base_rev": self.rev - 1,
+            "keep": keep,
+            "text": text[keep:],
+            "committed_chars": committed_chars
+        }
+        self.sent_text = text
+        self.last_sent_at = now
+        return message, {**message, "base_rev": 0, "keep": 0, "text": text}
+
+    def reset(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.rev = 0
+        self.sent_text = ""
+        self.pending = None
+        self.timing = None
@@ -0,0 +1,539 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import types
+import urllib.request
+import zlib
+from collections import namedtuple
+
+import numpy as np
+import websockets
+
+# Replays recordings into /ws/session and measures what viewers see.
+#
+# Each of --listeners sessions gets one listener streaming a corpus file (at
+# --rate times real time; 0 = as fast as possible) and --viewers viewers.
+# Latencies come from the server's `timing` field (MESSAGE_TIMING=1), so
+# they cover audio arriving at the server to the message reaching a viewer.
+#
+#   # Self-contained, CPU-only: spawns the server with stub Whisper/segmenter models and a stub LLM
+#   python tests/benchmark_session_hub.py --spawn --stub-models --stub-llm --listeners 4 --viewers 2 --rate 0
+#   # Against a running server (start it with MESSAGE_TIMING=1)
+#   python tests/benchmark_session_hub.py --url ws://localhost:8000 --rate 1 --output results.json
+#   # Framed Opus audio over a lossy uplink (needs opuslib on both ends)
+#   python tests/benchmark_session_hub.py --spawn --stub-models --codec opus --loss 0.02
+#
+# Results are printed (or written to --output) as JSON for regression tracking.
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(TESTS_DIR)
+SAMPLE_RATE = 16000
+
+JFK_REFERENCE = "And so my fellow Americans, ask not what your country can do for you, ask what you can do for your country."
+
+# --- Stub models (server side) ---------------------------------------------------------------
+
+StubWord = namedtuple("StubWord", "start end word probability")
+StubSegment = namedtuple("StubSegment", "id start end text words")
+STUB_VOCABULARY = ["ask", "not", "what", "your", "country", "can", "do", "for", "you", "and", "so", "my", "fellow", "americans"]
+
+
+class StubWhisperModel:
+    """
+    Stands in for faster_whisper.WhisperModel: every voiced run in the audio becomes
+    a word (picked from the run's own samples, so re-decoding the same audio gives
+    the same text) and each call sleeps `rtf` x the audio duration to mimic compute.
+    """
+
+    def __init__(self, *args, rtf: float = 0.05, **kwargs):
+        self.rtf = rtf
+        self.model = types.SimpleNamespace(device="stub")
+
+    def transcribe(self, audio, **kwargs):
+        time.sleep(len(audio) / SAMPLE_RATE * self.rtf)
+        frame = SAMPLE_RATE // 50
+        usable = len(audio) - len(audio) % frame
+        voiced = np.sqrt(np.mean(audio[:usable].reshape(-1, frame) ** 2, axis=1)) > 0.02 if usable else []
+
+        words = []
+        start = None
+        for i, is_voiced in enumerate(list(voiced) + [False]):
+            if is_voiced and start is None:
+                start = i
+            elif not is_voiced and start is not None:
+                if i - start >= 5:
+                    run = audio[start * frame:i * frame]
+                    word = STUB_VOCABULARY[int(np.abs(run).sum() * 10) % len(STUB_VOCABULARY)]
+                    words.append(StubWord(start * frame / SAMPLE_RATE, i * frame / SAMPLE_RATE, " " + word, 1.0))
+                start = None
+        if not words:
+            return iter([]), None
+        return iter([StubSegment(0, words[0].start, words[-1].end, "".join(w.word for w in words), words)]), None
+
+
+class StubEmbeddingModel:
+    """Stands in for the sentence embedding model: hashed bag of words, normalized."""
+
+    device = "stub"
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, zlib.crc32(word.encode()) % 64] += 1.0
+        return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+def serve(args):
+    """Runs the backend in this process, optionally with stub models."""
+    if args.stub_models:
+        stub = types.ModuleType("faster_whisper")
+        stub.WhisperModel = lambda *a, **k: StubWhisperModel(rtf=args.stub_rtf)
+        sys.modules["faster_whisper"] = stub
+        os.environ["VAD_BACKEND"] = "energy"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    if args.stub_models:
+        import semantic_segmenter
+        semantic_segmenter.load_semantic_model = lambda *a, **k: StubEmbeddingModel()
+
+    import main
+    import uvicorn
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+# --- Measurements ----------------------------------------------------------------------------
+
+def load_corpus(paths):
+    """Returns [(name, int16 PCM bytes, reference text or None)]. References come from a sibling .txt file."""
+    sys.path.insert(0, BACKEND_DIR)
+    from batch_transcriber import decode_audio
+
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as f:
+            audio = decode_audio(f.read())
+        reference = None
+        text_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(text_path):
+            with open(text_path, encoding="utf-8") as f:
+                reference = f.read().strip()
+        elif os.path.basename(path) == "jfk.wav":
+            reference = JFK_REFERENCE
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        corpus.append((os.path.basename(path), pcm, reference))
+    return corpus
+
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def percentiles(values_ms):
+    if not values_ms:
+        return {"count": 0}
+    values = np.asarray(values_ms)
+    return {
+        "count": len(values),
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p90": round(float(np.percentile(values, 90)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+        "p99": round(float(np.percentile(values, 99)), 1),
+        "max": round(float(values.max()), 1)
+    }
+
+
+def scrape_metrics(http_url):
+    """Parses /metrics into {(name, ((label, value), ...)): value}."""
+    try:
+        text = urllib.request.urlopen(f"{http_url}/metrics", timeout=5).read().decode()
+    except Exception as e:
+        print(f"Could not scrape metrics: {e}", file=sys.stderr)
+        return {}
+    samples = {}
+    for line in text.splitlines():
+        match = re.match(r'^(\w+)(?:\{(.*)\})? (\S+)$', line)
+        if not match or line.startswith("#"):
+            continue
+        labels = tuple(sorted(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or "")))
+        samples[(match.group(1), labels)] = float(match.group(3))
+    return samples
+
+
+def metric_delta(before, after, name, sessions, **labels):
+    total = 0.0
+    for (metric, metric_labels), value in after.items():
+        label_dict = dict(metric_labels)
+        if metric != name or label_dict.get("session") not in sessions:
+            continue
+        if any(label_dict.get(k) != v for k, v in labels.items()):
+            continue
+        total += value - before.get((metric, metric_labels), 0.0)
+    return total
+
+
+# --- Clients ---------------------------------------------------------------------------------
+
+class ViewerLog:
+    def __init__(self):
+        self.partial_latencies = []
+        self.final_latencies = []
+        self.ai_latencies = []
+        self.finals = []
+        self.messages = 0
+        self.partials = 0
+        self.last_message_at = time.time()
+        self.last_final_at = None
+        self.ai_ids = set()
+        self.untimed = 0
+
+
+async def run_viewer(ws_url, session_id, log, stop, ai):
+    async with websockets.connect(f"{ws_url}/ws/session?role=viewer&session_id={session_id}", max_size=None) as ws:
+        await ws.recv()  # Initial sync
+        if not ai:
+            await ws.send(json.dumps({"type": "toggle_ai", "enabled": False}))
+        while not stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            now = time.time()
+            message = json.loads(raw)
+            log.messages += 1
+            log.last_message_at = now
+            kind = message.get("type")
+            if kind == "transcription":
+                timing = message.get("timing")
+                if message.get("is_final"):
+                    log.finals.append(" ".join(s["text"].strip() for s in message.get("segments", [])))
+                    log.last_final_at = now
+                    if timing:
+                        log.final_latencies.append((now - timing["audio_at"]) * 1000.0)
+                else:
+                    log.partials += 1
+                    if timing:
+                        log.partial_latencies.append((now - timing["audio_at"]) * 1000.0)
+                if not timing:
+                    log.untimed += 1
+            elif kind == "ai_log_delta" and message.get("id") not in log.ai_ids:
+                log.ai_ids.add(message.get("id"))
+                if log.last_final_at:
+                    log.ai_latencies.append((now - log.last_final_at) * 1000.0)
+
+
+class FramePacker:
+    """Frames listener audio the way LocalTranscriptionService.js does; Opus packets are 20 ms (needs opuslib)."""
+
+    OPUS_FRAME_SAMPLES = SAMPLE_RATE // 50
+
+    def __init__(self, codec):
+        sys.path.insert(0, BACKEND_DIR)
+        from audio_transport import encode_frame
+
+        self.encode_frame = encode_frame
+        self.codec = codec
+        self.seq = 0
+        self.samples = 0
+        self.started_ms = time.time() * 1000.0
+        self.encoder = None
+        self.pending = b""
+        if codec == "opus":
+            import opuslib
+            self.encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+
+    def pack(self, pcm):
+        if self.encoder is None:
+            return [self._frame(pcm, len(pcm) // 2)]
+        self.pending += pcm
+        step = self.OPUS_FRAME_SAMPLES * 2
+        frames = []
+        while len(self.pending) >= step:
+            packet = self.encoder.encode(self.pending[:step], self.OPUS_FRAME_SAMPLES)
+            frames.append(self._frame(packet, self.OPUS_FRAME_SAMPLES))
+            self.pending = self.pending[step:]
+        return frames
+
+    def _frame(self, payload, samples):
+        frame = self.encode_frame(self.codec, self.seq, self.started_ms + self.samples * 1000.0 / SAMPLE_RATE, payload)
+        self.seq += 1
+        self.samples += samples
+        return frame
+
+
+async def negotiate_framing(ws, codec):
+    """Asks for framed audio in `codec`; returns a packer for the codec the server picked."""
+    await ws.send(json.dumps({"type": "audio_format", "framing": 1, "codecs": [codec, "pcm16"]}))
+    while True:
+        message = json.loads(await ws.recv())
+        if message.get("type") == "audio_format":
+            if message.get("codec") != codec:
+                print(f"Server can't decode {codec}, sending {message.get('codec')}", file=sys.stderr)
+            return FramePacker(message.get("codec") or "pcm16")
+
+
+async def run_listener(ws_url, session_id, pcm, rate, chunk_ms, tail_silence, sent, stop, codec="raw", loss=0.0, sent_bytes=None):
+    chunk_bytes = int(SAMPLE_RATE * chunk_ms / 1000.0) * 2
+    # Trailing silence lets the VAD endpoint the last utterance
+    pcm = pcm + bytes(int(SAMPLE_RATE * tail_silence) * 2)
+    # Seeded per session so runs drop the same frames
+    rng = random.Random(session_id)
+    async with websockets.connect(f"{ws_url}/ws/session?role=listener&session_id={session_id}", max_size=None) as ws:
+        await ws.recv()
+        packer = await negotiate_framing(ws, codec) if codec != "raw" else None
+        started = time.monotonic()
+        for i, offset in enumerate(range(0, len(pcm), chunk_bytes)):
+            chunk = pcm[offset:offset + chunk_bytes]
+            for payload in (packer.pack(chunk) if packer else [chunk]):
+                # Dropped frames still take a sequence number, like a lossy uplink
+                if loss and rng.random() < loss:
+                    continue
+                await ws.send(payload)
+                if sent_bytes is not None:
+                    sent_bytes.append(len(payload))
+            if rate > 0:
+                # Pace against the clock, not per chunk, so send overhead doesn't accumulate
+                delay = started + (i + 1) * chunk_ms / 1000.0 / rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+        sent.append(len(pcm) / 2 / SAMPLE_RATE)
+        # Disconnecting stops the server's worker, so stay until the run has settled
+        await stop.wait()
+
+
+async def benchmark(args, corpus):
+    ws_url = args.url.rstrip("/")
+    http_url = ws_url.replace("ws://", "http://").replace("wss://", "https://")
+    run_id = f"bench-{int(time.time())}"
+    sessions = [f"{run_id}-{i}" for i in range(args.listeners)]
+
+    before = scrape_metrics(http_url)
+    stop = asyncio.Event()
+    logs = {session: [ViewerLog() for _ in range(args.viewers)] for session in sessions}
+    viewer_tasks = [
+        asyncio.create_task(run_viewer(ws_url, session, log, stop, args.ai or args.stub_llm))
+        for session in sessions for log in logs[session]
+    ]
+    await asyncio.sleep(0.5)
+
+    started = time.time()
+    sent_seconds = []
+    sent_bytes = []
+    listener_tasks = [
+        asyncio.create_task(run_listener(
+            ws_url, session, corpus[i % len(corpus)][1], args.rate, args.chunk_ms, args.tail_silence, sent_seconds, stop,
+            codec=args.codec, loss=args.loss, sent_bytes=sent_bytes
+        ))
+        for i, session in enumerate(sessions)
+    ]
+    while len(sent_seconds) < len(sessions) and not any(task.done() for task in listener_tasks):
+        await asyncio.sleep(0.05)
+    sent_at = time.time()
+
+    # Wait for the pipeline to drain: no viewer message for --settle seconds
+    all_logs = [log for session_logs in logs.values() for log in session_logs]
+    while time.time() - max(log.last_message_at for log in all_logs) < args.settle and time.time() - sent_at < args.timeout:
+        await asyncio.sleep(0.1)
+    finished = time.time()
+    last_message_at = max(log.last_message_at for log in all_logs)
+    stop.set()
+    await asyncio.gather(*viewer_tasks, *listener_tasks, return_exceptions=True)
+    after = scrape_metrics(http_url)
+
+    per_session = []
+    for i, session in enumerate(sessions):
+        name, _, reference = corpus[i % len(corpus)]
+        transcript = " ".join(logs[session][0].finals) if logs[session] else ""
+        per_session.append({
+            "session_id": session,
+            "audio": name,
+            "audio_seconds": round(len(corpus[i % len(corpus)][1]) / 2 / SAMPLE_RATE + args.tail_silence, 2),
+            "finals": len(logs[session][0].finals) if logs[session] else 0,
+            "transcript": transcript,
+            "wer": round(word_error_rate(reference, transcript), 4) if reference is not None else None
+        })
+
+    wall = finished - started
+    audio_sent = sum(sent_seconds)
+    audio_received = metric_delta(before, after, "audio_received_seconds_total", sessions)
+    decode_seconds = metric_delta(before, after, "transcription_stage_seconds_sum", sessions, stage="decode")
+    decodes = metric_delta(before, after, "decodes_total", sessions)
+    rtf_sum = metric_delta(before, after, "transcription_real_time_factor_sum", sessions)
+    wers = [s["wer"] for s in per_session if s["wer"] is not None]
+
+    if sum(log.untimed for log in all_logs):
+        print("Transcription messages carry no timing; start the server with MESSAGE_TIMING=1 to measure latency.", file=sys.stderr)
+
+    return {
+        "config": {
+            "url": args.url,
+            "listeners": args.listeners,
+            "viewers": args.viewers,
+            "rate": args.rate,
+            "chunk_ms": args.chunk_ms,
+            "codec": args.codec,
+            "loss": args.loss,
+            "corpus": [name for name, _, _ in corpus],
+            "stub_models": args.stub_models,
+            "stub_llm": args.stub_llm,
+            "ai": args.ai or args.stub_llm
+        },
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "wall_seconds": round(wall, 2),
+        "latency_ms": {
+            "audio_to_partial": percentiles([v for log in all_logs for v in log.partial_latencies]),
+            "audio_to_final": percentiles([v for log in all_logs for v in log.final_latencies]),
+            "final_to_ai_first_token": percentiles([v for log in all_logs for v in log.ai_latencies])
+        },
+        "rtf": {
+            # Decode time over audio decoded, and the server's mean per decode pass
+            "decode": round(decode_seconds / audio_received, 4) if audio_received else None,
+            "mean_per_decode": round(rtf_sum / decodes, 4) if decodes else None,
+            # Time until the last message reached a viewer, over the audio of one listener
+            "wall": round((last_message_at - started) / (audio_sent / len(sessions)), 4) if audio_sent else None
+        },
+        "audio": {
+            "sent_seconds": round(audio_sent, 2),
+            "received_seconds": round(audio_received, 2),
+            "dropped_seconds": round(metric_delta(before, after, "audio_dropped_seconds_total", sessions), 2),
+            "lost_seconds": round(metric_delta(before, after, "audio_lost_seconds_total", sessions), 2),
+            # Uplink bandwidth per listener, frame headers included
+            "kbps": round(sum(sent_bytes) * 8 / 1000.0 / (audio_sent / len(sessions)) / len(sessions), 1) if audio_sent else None,
+            "lag_trims": int(metric_delta(before, after, "lag_trims_total", sessions))
+        },
+        "messages": {
+            "received": sum(log.messages for log in all_logs),
+            "per_second": round(sum(log.messages for log in all_logs) / wall, 1) if wall else 0.0,
+            "partials": sum(log.partials for log in all_logs),
+            "finals": sum(len(log.finals) for log in all_logs)
+        },
+        "wer": {"mean": round(float(np.mean(wers)), 4) if wers else None},
+        "sessions": per_session
+    }
+
+
+# --- Process management ----------------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def spawn_servers(args):
+    processes = []
+    env = dict(os.environ, MESSAGE_TIMING="1", AI_CACHE_ENABLED="0")
+    if args.stub_llm:
+        llm_port = free_port()
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(TESTS_DIR, "stub_llm_server.py"), "--port", str(llm_port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+        env.update(LOCAL_LLM_URL=f"http://127.0.0.1:{llm_port}", DEFAULT_AI_MODEL="local:stub")
+
+    port = free_port()
+    command = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port), "--stub-rtf", str(args.stub_rtf)]
+    if args.stub_models:
+        command.append("--stub-models")
+    processes.append(subprocess.Popen(command, env=env))
+    args.url = f"ws://127.0.0.1:{port}"
+
+    # /ready answers 503 until the models are loaded and warmed up
+    if not wait_for(f"http://127.0.0.1:{port}/ready", args.startup_timeout):
+        stop_servers(processes)
+        raise RuntimeError("Server did not become ready")
+    return processes
+
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for /ws/session.")
+    parser.add_argument("--url", default="ws://localhost:8000", help="Server to benchmark (ignored with --spawn)")
+    parser.add_argument("--audio", action="append", help="Corpus file(s); a sibling .txt is the reference text (default: tests/jfk.wav)")
+    parser.add_argument("--listeners", type=int, default=1, help="Concurrent listeners, one session each")
+    parser.add_argument("--viewers", type=int, default=1, help="Viewers per session")
+    parser.add_argument("--rate", type=float, default=1.0, help="Replay speed (1 = real time, 0 = as fast as possible)")
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    parser.add_argument("--codec", choices=["raw", "pcm16", "opus"], default="raw", help="Unframed PCM, or framed audio in this codec")
+    parser.add_argument("--loss", type=float, default=0.0, help="Fraction of audio messages the listeners drop")
+    parser.add_argument("--tail-silence", type=float, default=2.0, help="Silence sent after each file so the last utterance ends")
+    parser.add_argument("--settle", type=float, default=3.0, help="Quiet period that ends the run")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", "-o", help="Write the JSON results here (default: stdout)")
+    parser.add_argument("--spawn", action="store_true", help="Start a server (and stubs) for the run")
+    parser.add_argument("--stub-models", action="store_true", help="With --spawn: stub Whisper and the segmenter model")
+    parser.add_argument("--stub-llm", action="store_true", help="With --spawn: answer AI requests from tests/stub_llm_server.py")
+    parser.add_argument("--ai", action="store_true", help="Keep AI suggestions on with the server's configured provider")
+    parser.add_argument("--stub-rtf", type=float, default=0.05, help="Simulated decode cost of the stub model")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8000, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        sys.exit(0)
+
+    corpus = load_corpus(args.audio or [os.path.join(TESTS_DIR, "jfk.wav")])
+    processes = spawn_servers(args) if args.spawn else []
+    try:
+        results = asyncio.run(benchmark(args, corpus))
+    finally:
+        stop_servers(processes)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    latency = results["latency_ms"]
+    print(
+        f"partial p50/p95 {latency['audio_to_partial'].get('p50')}/{latency['audio_to_partial'].get('p95')} ms, "
+        f"final p50/p95 {latency['audio_to_final'].get('p50')}/{latency['audio_to_final'].get('p95')} ms, "
+        f"decode RTF {results['rtf']['decode']}, WER {results['wer']['mean']}, "
+        f"dropped {results['audio']['dropped_seconds']}s",
+        file=sys.stderr
+    )
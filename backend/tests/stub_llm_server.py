@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Stands in for a local model: answers every chat request with a canned reply,
+# streamed word by word in both the Ollama (/api/chat, NDJSON) and the
+# OpenAI-compatible (/v1/chat/completions, SSE) formats.
+#
+#   python tests/stub_llm_server.py --port 11434
+#   LOCAL_LLM_URL=http://localhost:11434 LOCAL_LLM_MODEL=stub python main.py
+#   LOCAL_LLM_URL=http://localhost:11434/v1 LOCAL_LLM_API=openai LOCAL_LLM_MODEL=stub python main.py
+
+app = FastAPI(title="Stub local LLM")
+settings = {"reply": "This is a stub answer from the local model.", "token_delay": 0.01, "first_token_delay": 0.05}
+stats = {"requests": 0, "connections": set()}
+
+
+def reply_tokens(messages):
+    prompt = messages[-1]["content"] if messages else ""
+    words = f"{settings['reply']} (prompt: {prompt[:40]})".split(" ")
+    return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+
+def record(request: Request):
+    stats["requests"] += 1
+    if request.client:
+        stats["connections"].add(f"{request.client.host}:{request.client.port}")
+
+
+@app.post("/api/chat")
+async def ollama_chat(request: Request):
+    record(request)
+    body = await request.json()
+
+    async def stream():
+        await asyncio.sleep(settings["first_token_delay"])
+        for token in reply_tokens(body.get("messages", [])):
+            yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+            await asyncio.sleep(settings["token_delay"])
+        yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    record(request)
+    body = await request.json()
+    created = int(time.time())
+
+    def chunk(content, finish_reason=None):
+        return "data: " + json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish_reason}]
+        }) + "\n\n"
+
+    async def stream():
+        await asyncio.sleep(settings["first_token_delay"])
+        for token in reply_tokens(body.get("messages", [])):
+            yield chunk(token)
+            await asyncio.sleep(settings["token_delay"])
+        yield chunk(None, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def get_stats():
+    # Distinct client ports show whether callers reuse their connections
+    return {"requests": stats["requests"], "connections": len(stats["connections"])}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local LLM server for tests.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--reply", default=settings["reply"])
+    parser.add_argument("--token-delay", type=float, default=settings["token_delay"])
+    parser.add_argument("--first-token-delay", type=float, default=settings["first_token_delay"])
+    args = parser.parse_args()
+    settings.update(reply=args.reply, token_delay=args.token_delay, first_token_delay=args.first_token_delay)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,95 @@
+import asyncio
+
+from ai_dispatcher import AIDispatcher
+
+
+class FakeAI:
+    """Answers take `seconds`; records which prompts were answered in full."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = []
+        self.answered = []
+
+    async def __call__(self, prompt, is_current):
+        self.started.append(prompt)
+        await asyncio.sleep(self.seconds)
+        if is_current():
+            self.answered.append(prompt)
+
+
+def make(ai, **kwargs):
+    return AIDispatcher(ai, asyncio.Semaphore(4), **kwargs)
+
+
+def test_new_final_during_the_debounce_leaves_the_answer_in_flight():
+    async def run():
+        ai = FakeAI(0.1)
+        dispatcher = make(ai, debounce_ms=200)
+        dispatcher.submit("first")
+        await asyncio.sleep(0.25)
+        # "first" is being answered; a new final only restarts the debounce
+        dispatcher.submit("second")
+        await asyncio.sleep(0.1)
+        assert ai.answered == ["first"] and ai.started == ["first"]
+        await asyncio.sleep(0.3)
+        return ai, dispatcher
+
+    ai, dispatcher = asyncio.run(run())
+    assert ai.answered == ["first", "second"]
+    assert dispatcher.requests_cancelled == 0
+
+
+def test_firing_request_supersedes_and_folds_in_the_answer_in_flight():
+    async def run():
+        ai = FakeAI(0.2)
+        dispatcher = make(ai, debounce_ms=20)
+        dispatcher.submit("first")
+        await asyncio.sleep(0.05)
+        dispatcher.submit("second")
+        await asyncio.sleep(0.3)
+        return ai, dispatcher
+
+    ai, dispatcher = asyncio.run(run())
+    assert ai.started == ["first", "first second"]
+    assert ai.answered == ["first second"]
+    assert dispatcher.requests_cancelled == 1
+
+
+def test_steady_stream_of_finals_still_gets_answers():
+    async def run():
+        ai = FakeAI(0.15)
+        dispatcher = make(ai, debounce_ms=50, max_wait_ms=100, max_superseded=2)
+        # A final every 20 ms for 1.5 s: shorter than the debounce, so the speaker never pauses
+        for i in range(75):
+            dispatcher.submit(f"s{i}")
+            await asyncio.sleep(0.02)
+        answered_while_talking = list(ai.answered)
+        await asyncio.sleep(0.5)
+        dispatcher.close()
+        return ai, dispatcher, answered_while_talking
+
+    ai, dispatcher, answered_while_talking = asyncio.run(run())
+    assert answered_while_talking
+    assert dispatcher.requests_let_finish >= 1
+    # Every final made it into an answered prompt, in order
+    answered = " ".join(ai.answered).split()
+    assert answered == [f"s{i}" for i in range(75)]
+
+
+def test_request_superseded_while_waiting_for_a_slot_is_dropped():
+    async def run():
+        ai = FakeAI(0.01)
+        limiter = asyncio.Semaphore(1)
+        dispatcher = AIDispatcher(ai, limiter, debounce_ms=10)
+        async with limiter:
+            dispatcher.submit("first")
+            await asyncio.sleep(0.03)
+            dispatcher.submit("second")
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.05)
+        return ai, dispatcher
+
+    ai, dispatcher = asyncio.run(run())
+    assert ai.started == ["first second"]
+    assert dispatcher.requests_cancelled == 1 and dispatcher.requests_started == 1
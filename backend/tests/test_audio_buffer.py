@@ -0,0 +1,47 @@
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+
+
+def test_view_stays_contiguous_across_wraparound():
+    ring = AudioRingBuffer(capacity_seconds=1.0, sample_rate=10)
+    ring.write(np.arange(7, dtype=np.float32))
+    ring.discard(5)
+    # Head is at 5, so this write wraps past the end of the storage
+    assert ring.write(np.arange(7, 15, dtype=np.float32)) == 8
+    assert len(ring) == 10 and ring.duration == 1.0
+    view = ring.view()
+    assert view.flags["C_CONTIGUOUS"] and np.shares_memory(view, ring._storage)
+    np.testing.assert_array_equal(view, np.arange(5, 15))
+    np.testing.assert_array_equal(ring.view(3), np.arange(8, 15))
+    assert ring.dropped_samples == 0
+
+
+def test_overflow_drops_oldest_audio_and_counts_it():
+    ring = AudioRingBuffer(capacity_seconds=1.0, sample_rate=10)
+    ring.write(np.arange(8, dtype=np.float32))
+    ring.write(np.arange(8, 12, dtype=np.float32))
+    assert ring.dropped_samples == 2
+    np.testing.assert_array_equal(ring.view(), np.arange(2, 12))
+
+    # A single write larger than the ring keeps only its newest samples
+    assert ring.write(np.arange(100, 125, dtype=np.float32)) == 10
+    assert ring.dropped_samples == 2 + 15 + 10
+    np.testing.assert_array_equal(ring.view(), np.arange(115, 125))
+
+
+def test_pcm16_is_scaled_into_float32():
+    ring = AudioRingBuffer(capacity_seconds=1.0, sample_rate=4)
+    ring.write_pcm16(np.array([0, 16384, -32768], dtype="<i2").tobytes())
+    np.testing.assert_array_equal(ring.view(), np.array([0.0, 0.5, -1.0], dtype=np.float32))
+    assert ring.view().dtype == np.float32
+
+
+def test_discard_and_clear_clamp_to_buffered_audio():
+    ring = AudioRingBuffer(capacity_seconds=1.0, sample_rate=10)
+    ring.write(np.ones(4, dtype=np.float32))
+    ring.discard(10)
+    assert len(ring) == 0 and len(ring.view(2)) == 0
+    ring.write(np.ones(4, dtype=np.float32))
+    ring.clear()
+    assert len(ring) == 0
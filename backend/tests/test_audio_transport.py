@@ -0,0 +1,65 @@
+import pytest
+
+from audio_transport import FRAME_HEADER, FrameReceiver, encode_frame, frame_capture_ms
+
+# 20 ms of 16 kHz int16 audio
+FRAME_BYTES = 640
+FRAME_SAMPLES = 320
+
+
+def frame(seq, captured_ms, payload=b"\x01\x00" * FRAME_SAMPLES):
+    return encode_frame("pcm16", seq, captured_ms, payload)
+
+
+def test_in_order_frames_report_no_loss():
+    receiver = FrameReceiver()
+    for seq in range(3):
+        pcm, lost = receiver.decode(frame(seq, 1000 + seq * 20))
+        assert len(pcm) == FRAME_BYTES and lost == 0
+    assert receiver.stats() == {"frames": 3, "lost_frames": 0, "lost_ms": 0.0, "codecs": ["pcm16"]}
+
+
+def test_sequence_gap_reports_lost_audio_from_capture_times():
+    receiver = FrameReceiver()
+    receiver.decode(frame(0, 1000))
+    receiver.decode(frame(1, 1020))
+    # Frames 2 and 3 never arrived: 40 ms missing between the end of frame 1 and frame 4
+    _, lost = receiver.decode(frame(4, 1080))
+    assert lost == 2 * FRAME_SAMPLES
+    assert receiver.lost_frames == 2 and receiver.lost_ms == 40.0
+
+
+def test_gap_with_a_clock_jump_falls_back_to_frame_length():
+    receiver = FrameReceiver()
+    receiver.decode(frame(0, 5000))
+    _, lost = receiver.decode(frame(3, 10))
+    assert lost == 2 * FRAME_SAMPLES
+
+
+def test_late_and_duplicate_frames_are_dropped():
+    receiver = FrameReceiver()
+    receiver.decode(frame(5, 1000))
+    assert receiver.decode(frame(5, 1000)) == (b"", 0)
+    assert receiver.decode(frame(2, 940)) == (b"", 0)
+    _, lost = receiver.decode(frame(6, 1020))
+    assert lost == 0 and receiver.frames == 2
+
+
+@pytest.mark.parametrize("data", [
+    b"\x01\x00",
+    bytes([9]) + frame(0, 0)[1:],
+    encode_frame("pcm16", 0, 0, b"")[:1] + bytes([7]) + encode_frame("pcm16", 0, 0, b"")[2:],
+])
+def test_unusable_frames_raise_value_error(data):
+    with pytest.raises(ValueError):
+        FrameReceiver().decode(data)
+
+
+def test_odd_payload_byte_is_trimmed():
+    pcm, _ = FrameReceiver().decode(frame(0, 0, b"\x01\x00\x02"))
+    assert pcm == b"\x01\x00"
+
+
+def test_capture_time_is_read_without_decoding():
+    assert frame_capture_ms(frame(7, 1234567890123)) == 1234567890123
+    assert frame_capture_ms(b"\x00" * (FRAME_HEADER.size - 1)) is None
@@ -6,7 +6,7 @@ import sys
 import os
 
 AUDIO_FILE = "tests/jfk.wav"
-SERVER_URL = "ws://localhost:8000/ws/transcribe"
+SERVER_URL = "ws://localhost:8000/ws/session?role=listener"
 
 async def send_audio():
     if not os.path.exists(AUDIO_FILE):
@@ -48,8 +48,11 @@ async def send_audio():
                         response = await websocket.recv()
                         data = json.loads(response)
                         if data.get("type") == "transcription":
-                            final_tag = "[FINAL]" if data.get("is_final") else "[PARTIAL]"
-                            print(f"\n[RECEIVED TRANSCRIPTION] {final_tag}:")
+                            if not data.get("is_final"):
+                                # Partials are deltas against the previous revision
+                                print(f"\n[RECEIVED TRANSCRIPTION] [PARTIAL]: {data.get('text')}")
+                                continue
+                            print("\n[RECEIVED TRANSCRIPTION] [FINAL]:")
                             for segment in data["segments"]:
                                 print(f"  {segment['start']}-{segment['end']}: {segment['text']}")
                 except websockets.exceptions.ConnectionClosed:
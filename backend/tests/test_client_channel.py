@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+from client_channel import ClientChannel
+
+
+class SlowSocket:
+    """Holds every send until `release` is set, like a client on a stalled connection."""
+
+    client = None
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.sent = []
+        self.closed_with = None
+
+    async def send_text(self, frame):
+        await self.release.wait()
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code=None):
+        self.closed_with = code
+
+
+def partial(source, rev, base_rev, text="x"):
+    return {"type": "transcription", "is_final": False, "source": source, "rev": rev, "base_rev": base_rev, "keep": 0, "text": text}
+
+
+def delta(response_id, text):
+    return {"type": "ai_log_delta", "id": response_id, "text": text, "role": "assistant"}
+
+
+async def stalled_channel(max_queue=256):
+    socket = SlowSocket()
+    channel = ClientChannel(socket, "viewer", max_queue=max_queue)
+    # The first message is taken by the sender and blocks there
+    channel.send({"type": "ai_state", "enabled": True})
+    await asyncio.sleep(0)
+    return socket, channel
+
+
+async def drain(socket, channel):
+    socket.release.set()
+    while channel.queue:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    channel.close()
+    return socket.sent[1:]
+
+
+def test_newer_partial_replaces_queued_one_and_keyframes_the_gap():
+    async def run():
+        socket, channel = await stalled_channel()
+        channel.send(partial("l1", 1, 0))
+        channel.send(partial("l1", 2, 1, "y"), keyframe=lambda: json.dumps({**partial("l1", 2, 0, "full"), "keyframe": True}))
+        channel.send(partial("l2", 1, 0))
+        assert channel.dropped == 1
+        return await drain(socket, channel)
+
+    sent = asyncio.run(run())
+    # l1's rev 1 never reached the client, so rev 2 goes out as a keyframe
+    assert [(m["source"], m["rev"], m.get("keyframe", False)) for m in sent] == [("l1", 2, True), ("l2", 1, False)]
+
+
+def test_full_queue_drops_partials_before_disconnecting():
+    async def run():
+        socket, channel = await stalled_channel(max_queue=2)
+        channel.send(partial("l1", 1, 0))
+        channel.send({"type": "transcription", "is_final": True, "source": "l2", "segments": []})
+        assert channel.send({"type": "ai_log", "id": "a", "text": "t", "role": "assistant"})
+        assert channel.dropped == 1 and not channel.closed
+        assert not channel.send({"type": "ai_log", "id": "b", "text": "t", "role": "assistant"})
+        await asyncio.sleep(0)
+        return socket, channel
+
+    socket, channel = asyncio.run(run())
+    assert channel.closed and socket.closed_with == 1013
+
+
+def test_queued_answer_deltas_are_merged_per_answer():
+    async def run():
+        socket, channel = await stalled_channel(max_queue=4)
+        for i in range(1000):
+            assert channel.send(delta("a", f"{i} "))
+            channel.send(delta("b", "z"))
+        assert len(channel.queue) == 2
+        return await drain(socket, channel)
+
+    sent = asyncio.run(run())
+    assert sent[0]["id"] == "a" and sent[0]["text"] == "".join(f"{i} " for i in range(1000))
+    assert sent[1] == delta("b", "z" * 1000)
+
+
+def test_final_answer_supersedes_queued_deltas():
+    async def run():
+        socket, channel = await stalled_channel()
+        channel.send(delta("a", "Hel"))
+        channel.send(delta("b", "Other"))
+        channel.send({"type": "ai_log", "id": "a", "text": "Hello", "role": "assistant"})
+        channel.send({"type": "ai_log_cancelled", "id": "b"})
+        return await drain(socket, channel)
+
+    sent = asyncio.run(run())
+    assert [m["type"] for m in sent] == ["ai_log", "ai_log_cancelled"]
+
+
+def test_merged_delta_is_encoded_once_for_clients_in_step():
+    async def run():
+        channels = [await stalled_channel() for _ in range(3)]
+        for i in range(5):
+            merges = {}
+            message = delta("a", f"{i} ")
+            frame = json.dumps(message)
+            for _, channel in channels:
+                assert channel.send(message, frame, merges=merges)
+        frames = [channel.queue[-1][2] for _, channel in channels]
+        return channels, frames
+
+    channels, frames = asyncio.run(run())
+    # Every client holds the very same merged frame, not an equal copy per client
+    assert all(frame is frames[0] for frame in frames)
+    assert json.loads(frames[0])["text"] == "0 1 2 3 4 "
@@ -0,0 +1,133 @@
+import time
+
+import numpy as np
+import pytest
+
+from inference_pool import ProcessInferencePool, SharedAudioRing
+
+# Stand-in for faster_whisper in the worker processes: answers every window with one word,
+# and hangs on a window starting with HANG so the test can kill the worker mid-job
+FAKE_FASTER_WHISPER = '''
+import time
+from collections import namedtuple
+
+Word = namedtuple("Word", "start end word probability")
+Segment = namedtuple("Segment", "id start end text words")
+HANG = 0.5
+
+
+class WhisperModel:
+    def __init__(self, model_size, **kwargs):
+        pass
+
+    def transcribe(self, audio, **kwargs):
+        if len(audio) and audio[0] == HANG:
+            time.sleep(600)
+        word = Word(0.0, 0.5, " hello", 1.0)
+        return iter([Segment(0, 0.0, 0.5, " hello", [word])]), None
+'''
+HANG = 0.5
+
+
+@pytest.fixture
+def ring():
+    ring = SharedAudioRing(10)
+    yield ring
+    ring.close()
+
+
+def samples(value, n):
+    return np.full(n, value, dtype=np.float32)
+
+
+def test_ring_wraps_around_once_the_oldest_region_is_released(ring):
+    assert ring.write(samples(1, 4)) == 0
+    assert ring.write(samples(2, 4)) == 4
+    # Only 2 samples left at the end and the start is still reserved
+    assert ring.write(samples(3, 4)) is None
+
+    ring.release(0)
+    assert ring.write(samples(3, 4)) == 0
+    np.testing.assert_array_equal(ring.array[:8], [3] * 4 + [2] * 4)
+    assert ring.used == 8
+    # Wrapped: the only free space is between head (4) and the oldest region (4)
+    assert ring.write(samples(4, 1)) is None
+
+
+def test_out_of_order_releases_wait_for_the_oldest_region(ring):
+    first = ring.write(samples(1, 4))
+    second = ring.write(samples(2, 4))
+    ring.release(second)
+    assert ring.used == 8
+    ring.release(first)
+    assert ring.used == 0 and not ring.regions
+    # Unknown or repeated offsets are ignored
+    ring.release(first)
+    # An empty ring starts over at the beginning
+    assert ring.write(samples(5, 10)) == 0
+
+
+def test_ring_rejects_windows_that_can_never_fit(ring):
+    assert ring.write(samples(1, 11)) is None
+    assert ring.write(samples(1, 0)) is None
+    assert ring.used == 0
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    package = tmp_path / "faster_whisper"
+    package.mkdir()
+    (package / "__init__.py").write_text(FAKE_FASTER_WHISPER)
+    # Worker processes inherit the environment, so they import the stand-in
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+
+    pool = ProcessInferencePool(
+        1, config={"model_size": "fake", "device": "cpu", "compute_type": "int8", "cpu_threads": 1, "download_root": None},
+        max_batch_size=1, max_wait_ms=0.0, ring_seconds=1.0, job_timeout=30.0, health_interval=0.1, startup_timeout=30.0
+    )
+    pool.start()
+    try:
+        pool.wait_ready(timeout=30.0)
+        yield pool
+    finally:
+        pool.stop()
+
+
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_pool_decodes_through_shared_memory(pool):
+    segments = pool.transcribe("listener", samples(0.1, 16000))
+    assert [segment["text"] for segment in segments] == [" hello"]
+    worker = pool.stats()["workers"][0]
+    assert worker["jobs_completed"] == 1 and worker["inline_jobs"] == 0 and worker["ring_used_seconds"] == 0.0
+
+
+def test_killed_worker_fails_its_jobs_and_is_respawned(pool):
+    worker = pool.workers[0]
+    future = pool.submit("listener", samples(HANG, 16000))
+    wait_for(lambda: worker.ring.used)
+    worker.process.kill()
+
+    with pytest.raises(RuntimeError, match="Inference worker 0"):
+        future.result(timeout=10.0)
+    assert worker.ring.used == 0 and not worker.jobs
+
+    # Restarted after the first backoff step; the new process takes jobs again
+    wait_for(lambda: worker.state == "ready")
+    assert worker.restarts == 1 and worker.last_error.startswith("exited")
+    assert pool.transcribe("listener", samples(0.1, 16000))[0]["text"] == " hello"
+
+
+def test_job_held_past_the_timeout_restarts_the_worker(pool):
+    pool.job_timeout = 0.5
+    worker = pool.workers[0]
+    future = pool.submit("listener", samples(HANG, 16000))
+    with pytest.raises(RuntimeError, match="has held a job"):
+        future.result(timeout=10.0)
+    wait_for(lambda: worker.state == "ready")
+    assert worker.restarts == 1
@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from inference_scheduler import DEFAULT_PROMPT, SAMPLE_RATE, InferenceScheduler, segment_to_dict
+
+Word = namedtuple("Word", "start end word probability")
+Segment = namedtuple("Segment", "id start end text words")
+
+
+class FakeModel:
+    def __init__(self):
+        self.prompts = []
+
+    def transcribe(self, audio, initial_prompt=None, **kwargs):
+        self.prompts.append(initial_prompt)
+        assert kwargs["vad_filter"]
+        return iter([]), None
+
+
+class FakePipeline:
+    """Answers every clip with one word 0.1 s into it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, clip_timestamps, batch_size, initial_prompt, **kwargs):
+        self.calls.append((initial_prompt, batch_size, len(audio)))
+        segments = []
+        for i, clip in enumerate(clip_timestamps):
+            word = Word(clip["start"] + 0.1, clip["start"] + 0.4, f" w{i}", 1.0)
+            segments.append(Segment(i, word.start, word.end, word.word, [word]))
+        return iter(segments), None
+
+
+def make_scheduler(speech):
+    vad = pytest.importorskip("faster_whisper.vad")
+    scheduler = InferenceScheduler(FakeModel(), max_batch_size=1, max_wait_ms=200.0, record_metrics=False)
+    # Batching on, with a stand-in pipeline and VAD
+    scheduler.max_batch_size = 8
+    scheduler.batched_pipeline = FakePipeline()
+    scheduler.vad_options = None
+    scheduler.get_speech_timestamps = lambda audio, options: speech
+    scheduler.speech_timestamps_map = vad.SpeechTimestampsMap
+    return scheduler
+
+
+def test_sessions_with_their_own_context_prompts_share_a_batch():
+    scheduler = make_scheduler([{"start": 0, "end": SAMPLE_RATE}])
+    scheduler.start()
+    try:
+        audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        # What listeners send mid-utterance: the default prompt plus their own committed text
+        committed = [
+            "so tell me about a project you led last year",
+            "I led the migration of our billing service to",
+            "and what was the hardest part of that migration",
+        ]
+        futures = [scheduler.submit(f"listener-{i}", audio, f"{DEFAULT_PROMPT} {text}") for i, text in enumerate(committed)]
+        results = [future.result(timeout=5) for future in futures]
+    finally:
+        scheduler.stop()
+
+    assert scheduler.batched_pipeline.calls == [(DEFAULT_PROMPT, 3, 3 * SAMPLE_RATE)]
+    assert scheduler.stats()["batch_size_counts"] == {3: 1}
+    assert [result[0]["text"] for result in results] == [" w0", " w1", " w2"]
+    assert scheduler.model.prompts == []
+
+
+def test_lone_job_gets_the_same_prompt_as_a_batched_one():
+    scheduler = make_scheduler([{"start": 0, "end": SAMPLE_RATE}])
+    scheduler.start()
+    try:
+        scheduler.submit("a", np.zeros(SAMPLE_RATE, dtype=np.float32), f"{DEFAULT_PROMPT} committed words").result(timeout=5)
+    finally:
+        scheduler.stop()
+    assert scheduler.model.prompts == [DEFAULT_PROMPT]
+
+
+def test_unbatched_scheduler_keeps_context_prompts():
+    scheduler = InferenceScheduler(FakeModel(), max_batch_size=1, record_metrics=False)
+    scheduler.start()
+    try:
+        scheduler.submit("a", np.zeros(SAMPLE_RATE, dtype=np.float32), f"{DEFAULT_PROMPT} committed words").result(timeout=5)
+    finally:
+        scheduler.stop()
+    assert scheduler.model.prompts == [f"{DEFAULT_PROMPT} committed words"]
+
+
+def test_batched_timestamps_restore_silence_cut_by_vad():
+    # Speech from 1.0 s to 2.0 s of a 3 s window; the VAD cuts the rest
+    scheduler = make_scheduler([{"start": SAMPLE_RATE, "end": 2 * SAMPLE_RATE}])
+    audio = np.zeros(3 * SAMPLE_RATE, dtype=np.float32)
+    jobs = [type("Job", (), {"audio": audio})() for _ in range(2)]
+
+    results = scheduler._decode_batched(jobs)
+
+    for result in results:
+        assert len(result) == 1
+        assert result[0]["words"][0]["start"] == pytest.approx(1.1)
+        assert result[0]["end"] == pytest.approx(1.4)
+
+
+def test_jobs_without_speech_skip_the_pipeline():
+    scheduler = make_scheduler([])
+    job = type("Job", (), {"audio": np.zeros(SAMPLE_RATE, dtype=np.float32)})()
+    assert scheduler._decode_batched([job, job]) == [[], []]
+    assert scheduler.batched_pipeline.calls == []
+
+
+def test_segment_to_dict_shifts_chunk_times_to_file_times():
+    word = Word(0.5, 0.9, " hi", 1.0)
+    segment = segment_to_dict(Segment(3, 0.5, 0.9, " hi", [word]), offset=-10.0)
+    assert segment == {"id": 3, "start": 10.5, "end": 10.9, "text": " hi", "words": [{"start": 10.5, "end": 10.9, "word": " hi"}]}
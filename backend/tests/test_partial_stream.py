@@ -0,0 +1,40 @@
+from streaming import PartialStream
+
+
+def test_partial_deltas_rebuild_the_hypothesis():
+    stream = PartialStream("listener", max_rate_hz=10)
+    client = ""
+    for hypothesis in ["hello", "hello wor", "hello world", "hello there"]:
+        assert stream.offer(hypothesis, committed_chars=0)
+        message, keyframe = stream.take_delta(now=1.0)
+        assert message["base_rev"] == message["rev"] - 1
+        client = client[:message["keep"]] + message["text"]
+        assert client == hypothesis
+        assert keyframe["rev"] == message["rev"] and keyframe["keep"] == 0 and keyframe["text"] == hypothesis
+    assert stream.rev == 4
+    assert message["keep"] == len("hello ") and message["text"] == "there"
+
+
+def test_partial_unchanged_hypothesis_is_suppressed():
+    stream = PartialStream("listener", max_rate_hz=10)
+    assert stream.offer("hi", committed_chars=0)
+    stream.take_delta(now=1.0)
+    assert not stream.offer("hi", committed_chars=0)
+    assert stream.take_delta(now=2.0) is None
+
+    # A newer hypothesis replaces the pending one; if it reverted to what was sent, nothing goes out
+    assert stream.offer("hi there", committed_chars=0)
+    assert stream.offer("hi", committed_chars=0)
+    assert stream.take_delta(now=2.0) is None
+    assert stream.rev == 1
+
+
+def test_partial_reset_starts_a_new_revision_chain():
+    stream = PartialStream("listener", max_rate_hz=0)
+    assert stream.min_interval == 0.0
+    stream.offer("hello", committed_chars=5)
+    stream.take_delta(now=1.0)
+    stream.reset()
+    stream.offer("next", committed_chars=0)
+    message, _ = stream.take_delta(now=2.0)
+    assert (message["rev"], message["base_rev"], message["keep"], message["text"]) == (1, 0, 0, "next")
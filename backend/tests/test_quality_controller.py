@@ -0,0 +1,58 @@
+import pytest
+
+import quality_controller
+from quality_controller import LEVELS, QualityController
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(quality_controller.time, "monotonic", lambda: now[0])
+    return now
+
+
+def run(controller, clock, seconds, load, backlog=0.0, step=0.25):
+    """Feeds passes of `step` seconds at `load`; returns the modes it switched to."""
+    changes = []
+    for _ in range(int(seconds / step)):
+        clock[0] += step
+        settings = controller.observe(load * step, step, backlog)
+        if settings is not None:
+            changes.append(settings["mode"])
+    return changes
+
+
+def test_overload_degrades_one_level_per_interval(clock):
+    controller = QualityController(smoothing=1.0)
+    assert run(controller, clock, 0.5, load=1.5) == []
+    assert run(controller, clock, 1.0, load=1.5) == ["slower_updates"]
+    assert run(controller, clock, 10.0, load=1.5) == [level["mode"] for level in LEVELS[2:]]
+    assert controller.level == len(LEVELS) - 1 and controller.degraded
+
+
+def test_ingest_backlog_degrades_without_decode_load(clock):
+    controller = QualityController(smoothing=1.0)
+    assert run(controller, clock, 1.25, load=0.1, backlog=3.0) == ["slower_updates"]
+
+
+def test_restores_one_level_after_sustained_calm(clock):
+    controller = QualityController(smoothing=1.0)
+    run(controller, clock, 2.5, load=1.5)
+    assert controller.level == 2
+
+    # Moderate load neither degrades nor counts towards restoring
+    assert run(controller, clock, 10.0, load=0.6) == []
+    assert run(controller, clock, 4.75, load=0.1) == []
+    assert run(controller, clock, 0.5, load=0.1) == ["slower_updates"]
+    assert run(controller, clock, 5.0, load=0.1) == ["full"]
+    assert not controller.degraded
+    assert (controller.degrades, controller.restores) == (2, 2)
+
+
+def test_smoothing_ignores_a_single_slow_pass(clock):
+    controller = QualityController()
+    run(controller, clock, 2.0, load=0.2)
+    clock[0] += 2.0
+    assert controller.observe(0.5, 0.25) is None
+    assert run(controller, clock, 2.0, load=0.2) == []
+    assert controller.level == 0
@@ -0,0 +1,40 @@
+import asyncio
+
+from response_cache import ResponseCache, conversation_fingerprint
+
+
+class SameEmbedding:
+    """Every text embeds to the same vector, so any cached prompt is a near duplicate."""
+
+    async def encode(self, text):
+        return [1.0, 0.0]
+
+
+SYSTEM = {"role": "system", "content": "You are a helpful interview assistant."}
+
+
+def fingerprint(*turns):
+    return conversation_fingerprint("gpt-4o-mini", [SYSTEM, *({"role": "user", "content": t} for t in turns)])
+
+
+def test_answers_are_only_reused_within_the_same_conversation():
+    async def run():
+        cache = ResponseCache(embedder=SameEmbedding())
+        await cache.store("What is a closure?", fingerprint("we were talking about Python"), "A function with its scope.")
+        same = await cache.lookup("what is a closure", fingerprint("we were talking about Python"))
+        other = await cache.lookup("What is a closure?", fingerprint("we were talking about Rust"))
+        return cache, same, other
+
+    cache, same, other = asyncio.run(run())
+    assert same["match"] == "exact" and same["response"] == "A function with its scope."
+    # Neither the exact nor the near-duplicate lookup crosses into another conversation
+    assert other is None
+    assert (cache.exact_hits, cache.semantic_hits, cache.misses) == (1, 0, 1)
+
+
+def test_fingerprint_covers_model_roles_and_system_prompt():
+    base = fingerprint("hello")
+    assert base == fingerprint("hello")
+    assert base != conversation_fingerprint("llama3", [SYSTEM, {"role": "user", "content": "hello"}])
+    assert base != conversation_fingerprint("gpt-4o-mini", [SYSTEM, {"role": "assistant", "content": "hello"}])
+    assert base != conversation_fingerprint("gpt-4o-mini", [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "hello"}])
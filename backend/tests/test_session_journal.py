@@ -0,0 +1,96 @@
+import json
+import time
+
+from session_journal import SessionJournal
+
+
+def make_journal(tmp_path, entries=0, session_id="s", **kwargs):
+    journal = SessionJournal(str(tmp_path / "journal.db"), **kwargs)
+    journal.start()
+    for seq in range(1, entries + 1):
+        journal.append(session_id, seq, json.dumps({"seq": seq}))
+    journal.save_state(session_id, {"next_seq": entries + 1, "ai_enabled": False})
+    journal.flush()
+    return journal
+
+
+def test_restore_returns_latest_window_and_state(tmp_path):
+    journal = make_journal(tmp_path, entries=12)
+    try:
+        state, entries = journal.restore("s", 5)
+        assert state == {"next_seq": 13, "ai_enabled": False}
+        assert [seq for seq, _ in entries] == [8, 9, 10, 11, 12]
+        assert json.loads(entries[-1][1]) == {"seq": 12}
+        assert journal.restore("unknown", 5) is None
+    finally:
+        journal.stop()
+
+
+def test_read_before_pages_back_to_the_first_entry(tmp_path):
+    journal = make_journal(tmp_path, entries=7)
+    try:
+        pages = []
+        before = 8
+        while True:
+            rows, has_more = journal.read_before("s", before, 3)
+            pages.append([seq for seq, _ in rows])
+            if not has_more:
+                break
+            before = rows[0][0]
+        assert pages == [[5, 6, 7], [2, 3, 4], [1]]
+    finally:
+        journal.stop()
+
+
+def test_history_survives_a_restart(tmp_path):
+    make_journal(tmp_path, entries=3).stop()
+    journal = SessionJournal(str(tmp_path / "journal.db"))
+    try:
+        state, entries = journal.restore("s", 10)
+        assert state["next_seq"] == 4 and [seq for seq, _ in entries] == [1, 2, 3]
+    finally:
+        journal.writer.close()
+        journal.reader.close()
+
+
+def test_expired_sessions_are_purged_at_startup(tmp_path):
+    journal = make_journal(tmp_path, entries=2)
+    journal.writer.execute("UPDATE sessions SET updated_at = ?", (time.time() - 7200,))
+    journal.stop()
+
+    journal = SessionJournal(str(tmp_path / "journal.db"), retention_hours=1)
+    try:
+        assert journal.restore("s", 10) is None
+        assert journal.read_before("s", 10, 10) == ([], False)
+    finally:
+        journal.writer.close()
+        journal.reader.close()
+
+
+def test_read_before_only_waits_for_its_own_session(tmp_path):
+    # The writer never runs, so nothing enqueued is ever written
+    journal = SessionJournal(str(tmp_path / "journal.db"), read_timeout=0.2)
+    try:
+        journal.append("busy", 1, json.dumps({"seq": 1}))
+        started = time.monotonic()
+        assert journal.read_before("quiet", 10, 10) == ([], False)
+        assert time.monotonic() - started < 0.1
+        # Its own pending write isn't on disk; the read gives up after read_timeout instead of hanging
+        assert journal.read_before("busy", 10, 10) == ([], False)
+        assert time.monotonic() - started < 1.0
+    finally:
+        journal.writer.close()
+        journal.reader.close()
+
+
+def test_flush_reports_a_writer_that_is_gone(tmp_path):
+    journal = make_journal(tmp_path, entries=1)
+    journal.queue.put(None)
+    journal.thread.join()
+    journal.append("s", 2, json.dumps({"seq": 2}))
+    started = time.monotonic()
+    assert not journal.flush("s", timeout=5.0)
+    assert journal.flush("other", timeout=5.0)
+    assert time.monotonic() - started < 1.0
+    journal.writer.close()
+    journal.reader.close()
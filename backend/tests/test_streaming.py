@@ -0,0 +1,57 @@
+from streaming import HypothesisBuffer
+
+
+def words(*spec):
+    """words("a", 0.0, 0.5, "b", 0.5, 1.0) -> Whisper-style word dicts."""
+    return [{"word": f" {spec[i]}", "start": spec[i + 1], "end": spec[i + 2]} for i in range(0, len(spec), 3)]
+
+
+def text(ws):
+    return "".join(w["word"] for w in ws).strip()
+
+
+def test_words_commit_once_two_passes_agree():
+    buffer = HypothesisBuffer(agreement=2)
+    buffer.insert(words("the", 0.0, 0.3, "quick", 0.3, 0.6, "brow", 0.6, 0.9))
+    assert buffer.flush() == []
+
+    buffer.insert(words("The", 0.0, 0.3, "quick,", 0.3, 0.6, "brown", 0.6, 0.9, "fox", 0.9, 1.2))
+    # Case and punctuation don't break agreement; the newest pass's words are the ones committed
+    assert text(buffer.flush()) == "The quick,"
+    assert buffer.committed_text() == "The quick,"
+    assert buffer.tentative_text() == "brown fox"
+    assert buffer.last_committed_end == 0.6
+
+
+def test_repeated_committed_tail_is_not_committed_twice():
+    buffer = HypothesisBuffer(agreement=2)
+    first = words("hello", 0.0, 0.4, "world", 0.4, 0.8)
+    buffer.insert(first)
+    buffer.insert(first)
+    assert text(buffer.flush()) == "hello world"
+
+    # The next window overlaps the committed tail and repeats "world" with jittered timestamps
+    again = words("world", 0.75, 0.8, "again", 0.8, 1.2)
+    buffer.insert(again)
+    buffer.insert(again)
+    assert text(buffer.flush()) == "again"
+    assert buffer.committed_text() == "hello world again"
+
+
+def test_complete_commits_whatever_is_tentative():
+    buffer = HypothesisBuffer(agreement=2)
+    buffer.insert(words("one", 0.0, 0.3, "two", 0.3, 0.6))
+    assert text(buffer.complete()) == "one two"
+    assert buffer.tentative == [] and buffer.last_committed_end == 0.6
+    assert buffer.complete() == []
+
+
+def test_commit_before_forces_words_leaving_the_window():
+    buffer = HypothesisBuffer(agreement=2)
+    buffer.insert(words("a", 0.0, 0.5, "b", 0.5, 1.0, "c", 1.0, 1.5))
+    assert text(buffer.commit_before(0.9)) == "a b"
+    assert buffer.tentative_text() == "c"
+    assert buffer.commit_before(0.9) == []
+    # Agreement starts over: the forced pass counts as one vote for what is left
+    buffer.insert(words("c", 1.0, 1.5))
+    assert text(buffer.flush()) == "c"
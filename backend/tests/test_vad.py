@@ -0,0 +1,75 @@
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from vad import FRAME_SIZE, EnergyVAD, StreamingVAD
+
+JFK = os.path.join(os.path.dirname(__file__), "jfk.wav")
+
+
+def load_jfk() -> np.ndarray:
+    with wave.open(JFK, "rb") as wf:
+        audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+    return audio[:len(audio) - len(audio) % FRAME_SIZE]
+
+
+def tone(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * 16000)) / 16000.0
+    return (amplitude * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+
+
+def feed_in_chunks(vad: StreamingVAD, audio: np.ndarray, chunk: int):
+    for i in range(0, len(audio), chunk):
+        vad.feed(audio[i:i + chunk])
+
+
+@pytest.mark.parametrize("chunk", [1600, 4096, 3 * FRAME_SIZE])
+def test_silero_stream_matches_one_shot_pass(chunk):
+    pytest.importorskip("onnxruntime")
+    vad_module = pytest.importorskip("faster_whisper.vad")
+    from vad import SileroVAD
+
+    audio = load_jfk()
+    expected = vad_module.get_vad_model()(audio).reshape(-1)
+
+    stream = SileroVAD().stream()
+    remainder = np.zeros(0, dtype=np.float32)
+    probs = []
+    for i in range(0, len(audio), chunk):
+        samples = np.concatenate([remainder, audio[i:i + chunk]])
+        usable = len(samples) - len(samples) % FRAME_SIZE
+        remainder = samples[usable:]
+        if usable:
+            probs.append(stream(samples[:usable].reshape(-1, FRAME_SIZE)))
+
+    np.testing.assert_allclose(np.concatenate(probs), expected, atol=1e-5)
+
+
+def test_endpoint_after_trailing_silence():
+    vad = StreamingVAD(backend=EnergyVAD(), endpoint_silence_ms=300)
+    feed_in_chunks(vad, np.zeros(8000, dtype=np.float32) + 1e-4, 1600)
+    assert not vad.has_new_speech
+
+    feed_in_chunks(vad, tone(1.0), 1600)
+    assert vad.has_new_speech
+    assert not vad.utterance_ended
+
+    feed_in_chunks(vad, np.zeros(8000, dtype=np.float32) + 1e-4, 1600)
+    assert vad.utterance_ended
+
+    vad.reset_utterance()
+    assert not vad.utterance_ended and not vad.has_new_speech
+
+
+def test_streams_keep_separate_state():
+    backend = EnergyVAD()
+    loud = StreamingVAD(backend=backend)
+    quiet = StreamingVAD(backend=backend)
+    # Noise raises one stream's floor; the shared backend and the other stream are untouched
+    feed_in_chunks(loud, np.random.default_rng(0).normal(0, 0.05, 16000).astype(np.float32), 1600)
+    assert backend.noise_floor_db == backend.min_db
+    feed_in_chunks(quiet, np.zeros(4000, dtype=np.float32) + 1e-4, 1600)
+    feed_in_chunks(quiet, tone(0.5, amplitude=0.02), 1600)
+    assert quiet.has_new_speech
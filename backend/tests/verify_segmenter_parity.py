@@ -0,0 +1,91 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from semantic_segmenter import SemanticSegmenter, load_semantic_model
+
+# Interview-style transcripts: each list is fed to a fresh segmenter chunk by chunk
+TRANSCRIPTS = [
+    [
+        "Thanks for joining us today.",
+        "Can you start by telling me a bit about yourself?",
+        "Sure, I've been a backend engineer for about six years.",
+        "Most of that time I worked on payment systems in Python and Go.",
+        "Before that I did a master's degree in distributed systems.",
+        "What made you interested in this role?",
+        "I want to work closer to the product and on real-time features.",
+    ],
+    [
+        "Let's talk about system design.",
+        "How would you design a rate limiter for a public API?",
+        "I'd start with a token bucket per API key stored in Redis.",
+        "Each request atomically decrements the bucket with a Lua script.",
+        "Buckets refill at a fixed rate based on the customer's plan.",
+        "For global limits we can shard keys across several Redis nodes.",
+        "What happens if Redis goes down?",
+        "Then we fail open with a local in-memory limiter as a fallback.",
+    ],
+    [
+        "Tell me about a time you disagreed with your manager.",
+        "We disagreed about rewriting our billing service from scratch.",
+        "I proposed migrating it incrementally behind a feature flag instead.",
+        "We ran both paths in parallel and compared the invoices.",
+        "The migration finished two months early without incidents.",
+        "Do you have any questions for us?",
+        "Yes, how does the team handle on-call rotations?",
+        "We rotate weekly and every incident gets a blameless review.",
+    ],
+]
+
+
+def run(segmenter: SemanticSegmenter, chunks):
+    decisions = []
+    for chunk in chunks:
+        decision = segmenter.process(chunk)
+        decisions.append((decision["action"], decision.get("similarity_score")))
+    return decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks that the ONNX int8 segmenter backend makes the same decisions as the torch one.")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-dir", default=os.getenv("SEGMENTER_ONNX_DIR"), help="Local ONNX export (fetched from the model repo if unset)")
+    args = parser.parse_args()
+
+    backends = {}
+    for name, kwargs in (("torch", {}), ("onnx", {"model_dir": args.onnx_dir})):
+        started = time.perf_counter()
+        backends[name] = load_semantic_model(args.model, backend=name, **kwargs)
+        print(f"{name}: loaded in {time.perf_counter() - started:.2f}s")
+
+    mismatches = 0
+    max_similarity_diff = 0.0
+    timings = {name: 0.0 for name in backends}
+    for i, chunks in enumerate(TRANSCRIPTS):
+        results = {}
+        for name, model in backends.items():
+            started = time.perf_counter()
+            results[name] = run(SemanticSegmenter(model=model), chunks)
+            timings[name] += time.perf_counter() - started
+
+        for j, ((torch_action, torch_sim), (onnx_action, onnx_sim)) in enumerate(zip(results["torch"], results["onnx"])):
+            if torch_sim is not None and onnx_sim is not None:
+                max_similarity_diff = max(max_similarity_diff, abs(torch_sim - onnx_sim))
+            if torch_action != onnx_action:
+                mismatches += 1
+                print(f"MISMATCH transcript {i} chunk {j}: torch={torch_action} ({torch_sim:.4f}) onnx={onnx_action} ({onnx_sim:.4f}) | {chunks[j]}")
+
+    total = sum(len(chunks) for chunks in TRANSCRIPTS)
+    print(f"Decisions: {total - mismatches}/{total} match, max similarity difference {max_similarity_diff:.4f}")
+    print("Segmentation time: " + ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in timings.items()))
+    if mismatches:
+        print("Parity check FAILED.")
+        sys.exit(1)
+    print("Parity check SUCCESS.")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,8 @@ async def test_session_hub():
                     await websocket_listener.send(chunk)
                     await asyncio.sleep(0.5) # Slight delay to simulate real-time
                 
+                # Trailing silence so the VAD ends the utterance and the server sends a final
+                await websocket_listener.send(bytes(chunk_size * 2))
                 print("Listener finished streaming audio.")
                 
                 # Now wait for the viewer to receive the transcription
@@ -45,12 +47,14 @@ async def test_session_hub():
                     try:
                         response = await asyncio.wait_for(websocket_viewer.recv(), timeout=10.0)
                         data = json.loads(response)
-                        if data.get("type") == "transcription_update":
-                            text = " ".join([seg["text"] for seg in data["segments"]])
-                            print(f"Viewer RECEIVED TRANSCRIPTION: {text}")
+                        if data.get("type") == "transcription":
                             if data.get("is_final"):
+                                text = " ".join([seg["text"] for seg in data["segments"]])
+                                print(f"Viewer RECEIVED TRANSCRIPTION: {text}")
                                 print("Final transcription received. Verification SUCCESS.")
                                 break
+                            # Partials are deltas: keep `keep` characters of the previous one, append `text`
+                            print(f"Viewer RECEIVED PARTIAL: {data.get('text')}")
                     except asyncio.TimeoutError:
                         print("Timed out waiting for transcription update.")
                         break
@@ -0,0 +1,170 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_SIZE = 512  # 32ms @ 16kHz, the frame size Silero expects
+CONTEXT_SIZE = 64  # Trailing samples of the previous frame Silero prepends to each frame
+
+
+class EnergyVAD:
+    """
+    Dependency-free fallback: a frame is speech when its energy clears an adaptive
+    noise floor and its zero-crossing rate doesn't look like broadband hiss.
+    The noise floor is per stream, so each listener gets its own copy via `stream()`.
+    """
+
+    def __init__(self, margin_db: float = 10.0, min_db: float = -50.0, max_zcr: float = 0.35):
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.max_zcr = max_zcr
+        self.noise_floor_db = min_db
+
+    def stream(self) -> "EnergyVAD":
+        return EnergyVAD(self.margin_db, self.min_db, self.max_zcr)
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        probs = np.zeros(len(frames), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            rms = np.sqrt(np.mean(frame * frame)) + 1e-10
+            db = 20.0 * np.log10(rms)
+            zcr = np.count_nonzero(np.diff(np.signbit(frame))) / len(frame)
+
+            is_speech = db > max(self.noise_floor_db + self.margin_db, self.min_db) and zcr < self.max_zcr
+            if is_speech:
+                probs[i] = 1.0
+            else:
+                # Only non-speech frames move the floor, so long utterances don't raise it
+                self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * db
+        return probs
+
+
+class SileroVAD:
+    """
+    The Silero ONNX model bundled with faster-whisper; one session is shared by every stream.
+
+    Silero is recurrent: each frame's probability depends on the LSTM state and the
+    tail of the frame before it. faster-whisper's wrapper starts from a cold state on
+    every call, so streams run the session themselves through `stream()`, which
+    carries that state from one chunk to the next.
+    """
+
+    def __init__(self):
+        from faster_whisper.vad import get_vad_model
+        self.session = get_vad_model().session
+
+    def stream(self) -> "SileroVADStream":
+        return SileroVADStream(self.session)
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        # One-shot: a fresh state for a self-contained block of audio
+        return self.stream()(frames)
+
+
+class SileroVADStream:
+    """One audio stream's Silero state (LSTM h/c and the previous frame's tail)."""
+
+    def __init__(self, session):
+        self.session = session
+        self.h = np.zeros((1, 1, 128), dtype=np.float32)
+        self.c = np.zeros((1, 1, 128), dtype=np.float32)
+        self.context = np.zeros(CONTEXT_SIZE, dtype=np.float32)
+
+    def __call__(self, frames: np.ndarray) -> np.ndarray:
+        if not len(frames):
+            return np.zeros(0, dtype=np.float32)
+        frames = frames.astype(np.float32, copy=False)
+        # Each frame is prefixed with the last samples of the one before it, across calls too
+        contexts = np.concatenate([self.context[None, :], frames[:-1, -CONTEXT_SIZE:]])
+        probs, self.h, self.c = self.session.run(
+            None, {"input": np.concatenate([contexts, frames], axis=1), "h": self.h, "c": self.c}
+        )
+        self.context = frames[-1, -CONTEXT_SIZE:].copy()
+        return probs.reshape(-1)
+
+
+def create_vad_backend(name: str = "silero"):
+    if name == "silero":
+        try:
+            return SileroVAD()
+        except Exception as e:
+            logger.warning(f"Silero VAD unavailable, falling back to energy VAD: {e}")
+    return EnergyVAD()
+
+
+class StreamingVAD:
+    """
+    Incremental speech/non-speech tracker for one listener.
+
+    Audio is fed as it arrives and classified in fixed frames, through the
+    backend's per-stream state so chunk boundaries don't matter. The worker asks
+    two questions: has speech arrived since the last decode (otherwise Whisper
+    has nothing new to say) and has the current utterance ended (enough
+    trailing silence after speech to finalize it).
+    """
+
+    def __init__(self, backend=None, threshold: float = 0.5, min_speech_ms: int = 90,
+                 endpoint_silence_ms: int = 1000, sample_rate: int = 16000):
+        self.model = (backend or create_vad_backend()).stream()
+        self.threshold = threshold
+        self.neg_threshold = max(threshold - 0.15, 0.01)
+        self.frame_duration = FRAME_SIZE / sample_rate
+        self.min_speech_frames = max(1, int(min_speech_ms / 1000.0 / self.frame_duration))
+        self.endpoint_silence_frames = max(1, int(endpoint_silence_ms / 1000.0 / self.frame_duration))
+
+        self.remainder = np.zeros(0, dtype=np.float32)
+        self.in_speech = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.utterance_has_speech = False
+        self.new_speech_frames = 0
+
+    def feed(self, samples: np.ndarray):
+        if len(self.remainder):
+            samples = np.concatenate([self.remainder, samples])
+        usable = len(samples) - len(samples) % FRAME_SIZE
+        self.remainder = samples[usable:].copy()
+        if not usable:
+            return
+
+        probs = self.model(samples[:usable].reshape(-1, FRAME_SIZE))
+        for prob in probs:
+            if self.in_speech:
+                if prob < self.neg_threshold:
+                    self.silence_run += 1
+                    if self.silence_run >= self.endpoint_silence_frames:
+                        self.in_speech = False
+                        self.speech_run = 0
+                else:
+                    self.silence_run = 0
+                    self.new_speech_frames += 1
+            elif prob >= self.threshold:
+                self.speech_run += 1
+                if self.speech_run >= self.min_speech_frames:
+                    # Onset confirmed: count the frames that led up to it as speech too
+                    self.in_speech = True
+                    self.utterance_has_speech = True
+                    self.silence_run = 0
+                    self.new_speech_frames += self.speech_run
+            else:
+                self.speech_run = 0
+                self.silence_run += 1
+
+    @property
+    def has_new_speech(self) -> bool:
+        return self.new_speech_frames > 0
+
+    @property
+    def trailing_silence(self) -> float:
+        return self.silence_run * self.frame_duration
+
+    @property
+    def utterance_ended(self) -> bool:
+        return self.utterance_has_speech and not self.in_speech
+
+    def mark_decoded(self):
+        self.new_speech_frames = 0
+
+    def reset_utterance(self):
+        self.utterance_has_speech = False
+        self.new_speech_frames = 0
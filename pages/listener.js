@@ -71,6 +71,7 @@ import { addToHistory } from '../redux/historySlice';
 import { clearTranscription, setTranscription } from '../redux/transcriptionSlice';
 import { getConfig, setConfig as saveConfig } from '../utils/config';
 import { LocalTranscriptionService } from '../utils/transcription/LocalTranscriptionService';
+import { bindHubAnswer } from '../utils/transcription/hubAnswer';
 // Dashboard components removed
 
 
@@ -286,6 +287,9 @@ export default function InterviewPage() {
           }
         };
 
+        // Streamed backend answer so far ('' when it was cancelled)
+        bindHubAnswer(hubService, dispatch, currentRole);
+
         hubService.onMessage = (data) => {
           if (data.type === "ai_log" && currentRole === 'viewer') {
             const historyItem = {
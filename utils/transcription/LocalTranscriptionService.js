@@ -4,20 +4,49 @@
  * that connects to our local Python backend instead of Azure.
  */
 export class LocalTranscriptionService {
-    constructor(audioConfig, role = 'listener') {
+    constructor(audioConfig, role = 'listener', sessionId = null) {
         // Mimic the Azure SDK structure
         this.audioConfig = audioConfig; // We expect the helper to pass the stream here somehow
         this.privStream = audioConfig.privStream; // Custom hack to get stream if needed
         this.role = role;
+        // Backend session to join; falls back to the page's ?session= param, then the default session
+        this.sessionId = sessionId
+            || (typeof window !== 'undefined' && new URLSearchParams(window.location.search).get('session'))
+            || null;
+        // Highest history sequence number seen; sent on reconnect so the backend only replays what we missed
+        this.lastSeq = null;
+        // Partial hypothesis per listener ({ rev, text }), rebuilt from the backend's deltas
+        this.partials = {};
+        // AI answers being streamed, by response id, and the one last shown
+        this.aiStreams = {};
+        this.shownAnswerId = null;
 
         // Azure SDK Callbacks
         this.recognized = null;       // (s, e) => void
         this.canceled = null;         // (s, e) => void
         this.onHistory = null;        // (history) => void
         this.onThoughtSegment = null; // (data) => void { action, text, ... }
+        this.onQualityChange = null;  // (data) => void { source, level, mode, degraded, partials }
+        this.onAnswerUpdate = null;   // (text) => void; the streamed AI answer so far, '' once it is cancelled
         this.sampleRate = 16000;      // Whisper expects 16kHz
+
+        // Audio transport: framed audio (seq, capture time, codec id) negotiated with the backend.
+        // Codecs in order of preference; Opus is only offered when the browser can encode it (WebCodecs).
+        this.audioCodecs = ['opus', 'pcm16'];
+        this.framed = false;
+        this.frameSeq = 0;
+        this.encoder = null;
     }
 
+    // Audio frame layout, matching backend/audio_transport.py:
+    // version (u8), codec id (u8), flags (u16), seq (u32), capture time in ms since the epoch (u64), little-endian
+    static FRAMING_VERSION = 1;
+    static FRAME_HEADER_BYTES = 16;
+    static CodecId = { pcm16: 0, opus: 1 };
+    static OPUS_CONFIG = { codec: 'opus', sampleRate: 16000, numberOfChannels: 1, bitrate: 24000 };
+    // Past this much unsent data, frames are skipped (the backend sees a sequence gap) instead of queued behind a slow uplink
+    static MAX_BUFFERED_BYTES = 64 * 1024;
+
     // Mimic Azure Enums for compatibility
     static ResultReason = {
         RecognizingSpeech: 'RecognizingSpeech',
@@ -40,10 +69,15 @@ export class LocalTranscriptionService {
             try {
                 // 1. Setup WebSocket
                 const host = window.location.hostname || 'localhost';
-                this.ws = new WebSocket(`ws://${host}:8000/ws/session?role=${this.role}`);
+                const sessionParam = this.sessionId ? `&session_id=${encodeURIComponent(this.sessionId)}` : '';
+                const seqParam = this.lastSeq !== null ? `&last_seq=${this.lastSeq}` : '';
+                this.ws = new WebSocket(`ws://${host}:8000/ws/session?role=${this.role}${sessionParam}${seqParam}`);
                 this.ws.binaryType = "arraybuffer";
+                // A new connection starts out on raw PCM until the audio format is negotiated again
+                this.framed = false;
 
                 this.ws.onopen = () => {
+                    if (this.privStream) this._negotiateAudioFormat();
                     resolve(); // Resolve success once connected
                 };
 
@@ -57,14 +91,37 @@ export class LocalTranscriptionService {
                         const data = typeof event.data === 'string' ? JSON.parse(event.data) : null;
                         if (!data) return;
 
+                        if (data.type === "audio_format") {
+                            this._useCodec(data.codec);
+                            return;
+                        }
+
+                        if (typeof data.seq === 'number') {
+                            this.lastSeq = Math.max(this.lastSeq ?? 0, data.seq);
+                        }
+
                         if (data.type === "session_state") {
+                            // "snapshot" carries the latest page, "delta" only the entries after our lastSeq
+                            if (typeof data.last_seq === 'number') this.lastSeq = data.last_seq;
                             this.lastState = data;
                             if (this.onHistory) this.onHistory(data.history);
                         } else if (data.type === "transcription_update" || data.type === "transcription") {
                             // Support both old and new event types
 
                             // 1. Handle Transcriptions (Interviewer Box)
-                            const text = data.segments.map(s => s.text).join(" ").trim();
+                            let text;
+                            if (data.segments) {
+                                text = data.segments.map(s => s.text).join(" ").trim();
+                                if (data.is_final && data.source) delete this.partials[data.source];
+                            } else {
+                                // Partial delta: keep the first `keep` chars of revision `base_rev`, append `text`.
+                                // Keyframes (keep === 0) always apply; a delta on a revision we missed waits for one.
+                                const prev = this.partials[data.source];
+                                if (data.keep !== 0 && (!prev || prev.rev !== data.base_rev)) return;
+                                const full = (data.keep ? prev.text.slice(0, data.keep) : "") + data.text;
+                                this.partials[data.source] = { rev: data.rev, text: full };
+                                text = full.trim();
+                            }
 
                             if (text) {
                                 const reason = data.is_final
@@ -91,7 +148,26 @@ export class LocalTranscriptionService {
                                 this.onThoughtSegment(data.thought_segment);
                             }
 
+                        } else if (data.type === "transcription_quality") {
+                            // The backend is shedding load for this listener (slower or no partials) or recovered
+                            if (this.onQualityChange) this.onQualityChange(data);
+                            if (this.onMessage) this.onMessage(data);
+                        } else if (data.type === "ai_log_delta") {
+                            // Relay the answer so far; the final ai_log carries the full text
+                            const text = (this.aiStreams[data.id] || "") + data.text;
+                            this.aiStreams[data.id] = text;
+                            this.shownAnswerId = data.id;
+                            if (this.onAnswerUpdate) this.onAnswerUpdate(text);
+                        } else if (data.type === "ai_log_cancelled") {
+                            // Superseded by newer speech; its replacement streams next, so clear the stale partial
+                            delete this.aiStreams[data.id];
+                            if (data.id === this.shownAnswerId) {
+                                this.shownAnswerId = null;
+                                if (this.onAnswerUpdate) this.onAnswerUpdate('');
+                            }
+                            if (this.onMessage) this.onMessage(data);
                         } else {
+                            if (data.type === "ai_log" && data.id) delete this.aiStreams[data.id];
                             // Relay other message types (like ai_log)
                             if (this.onMessage) this.onMessage(data);
                         }
@@ -121,8 +197,14 @@ export class LocalTranscriptionService {
                 this.processor.onaudioprocess = (e) => {
                     if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
                     const inputData = e.inputBuffer.getChannelData(0);
-                    const pcmData = this.floatTo16BitPCM(inputData);
-                    this.ws.send(pcmData);
+                    const capturedAt = this._captureTime(inputData.length);
+                    if (!this.framed) {
+                        this.ws.send(this.floatTo16BitPCM(inputData));
+                    } else if (this.encoder && this.encoder.state === 'configured') {
+                        this._encodeOpus(inputData, capturedAt);
+                    } else {
+                        this._sendFrame('pcm16', capturedAt, this.floatTo16BitPCM(inputData));
+                    }
                 };
 
                 this.inputStream.connect(this.processor);
@@ -135,6 +217,115 @@ export class LocalTranscriptionService {
         });
     }
 
+    /**
+     * Asks the backend for history older than `beforeSeq`.
+     * The reply arrives through onMessage as a `history_page` event.
+     */
+    requestHistoryPage(beforeSeq, limit = 100) {
+        if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+        this.ws.send(JSON.stringify({ type: "history_page", before_seq: beforeSeq, limit }));
+    }
+
+    // Internal Helper: Offer framed audio and the codecs we can encode; the backend answers with the one to use
+    async _negotiateAudioFormat() {
+        const codecs = [];
+        for (const codec of this.audioCodecs) {
+            if (codec !== 'opus' || await this._opusSupported()) codecs.push(codec);
+        }
+        if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+        this.ws.send(JSON.stringify({
+            type: "audio_format",
+            framing: LocalTranscriptionService.FRAMING_VERSION,
+            codecs
+        }));
+        // Everything after this message is framed: PCM frames until the backend confirms Opus
+        this.framed = true;
+    }
+
+    async _opusSupported() {
+        if (typeof AudioEncoder === 'undefined') return false;
+        try {
+            return (await AudioEncoder.isConfigSupported(LocalTranscriptionService.OPUS_CONFIG)).supported;
+        } catch (e) {
+            return false;
+        }
+    }
+
+    // Internal Helper: Switch to the codec the backend picked
+    _useCodec(codec) {
+        if (codec !== 'opus') {
+            this._closeEncoder();
+            return;
+        }
+        if (this.encoder) return;
+        this.encoder = new AudioEncoder({
+            output: (chunk) => {
+                const payload = new Uint8Array(chunk.byteLength);
+                chunk.copyTo(payload);
+                // Chunk timestamps are the capture times we stamped on the input, in microseconds
+                this._sendFrame('opus', chunk.timestamp / 1000, payload);
+            },
+            error: (e) => {
+                // Every frame names its codec, so the backend follows the fall back to PCM without renegotiating
+                console.warn("Opus encoder failed, sending PCM:", e);
+                this.encoder = null;
+            }
+        });
+        this.encoder.configure(LocalTranscriptionService.OPUS_CONFIG);
+    }
+
+    _closeEncoder() {
+        if (this.encoder) {
+            if (this.encoder.state !== 'closed') this.encoder.close();
+            this.encoder = null;
+        }
+    }
+
+    _encodeOpus(input, capturedAt) {
+        const audioData = new AudioData({
+            format: 'f32',
+            sampleRate: this.sampleRate,
+            numberOfFrames: input.length,
+            numberOfChannels: 1,
+            timestamp: Math.round(capturedAt * 1000),
+            data: input
+        });
+        this.encoder.encode(audioData);
+        audioData.close();
+    }
+
+    // Internal Helper: Capture time (ms) of a buffer's first sample. Counted in samples from the first buffer,
+    // so consecutive frames line up exactly and the backend can size any gap between them.
+    _captureTime(length) {
+        if (this.captureStartedAt === undefined) {
+            this.captureStartedAt = Date.now() - length * 1000 / this.sampleRate;
+            this.capturedSamples = 0;
+        }
+        const capturedAt = this.captureStartedAt + this.capturedSamples * 1000 / this.sampleRate;
+        this.capturedSamples += length;
+        return capturedAt;
+    }
+
+    // Internal Helper: Prefix an audio payload with its frame header and send it
+    _sendFrame(codec, capturedAt, payload) {
+        // Skipped frames still use up a sequence number, so the backend knows audio is missing
+        const seq = this.frameSeq++;
+        if (!this.ws || this.ws.readyState !== WebSocket.OPEN) return;
+        if (this.ws.bufferedAmount > LocalTranscriptionService.MAX_BUFFERED_BYTES) return;
+
+        const headerBytes = LocalTranscriptionService.FRAME_HEADER_BYTES;
+        const body = payload instanceof Uint8Array ? payload : new Uint8Array(payload);
+        const frame = new ArrayBuffer(headerBytes + body.byteLength);
+        const view = new DataView(frame);
+        view.setUint8(0, LocalTranscriptionService.FRAMING_VERSION);
+        view.setUint8(1, LocalTranscriptionService.CodecId[codec]);
+        view.setUint16(2, 0, true);
+        view.setUint32(4, seq >>> 0, true);
+        view.setBigUint64(8, BigInt(Math.round(capturedAt)), true);
+        new Uint8Array(frame, headerBytes).set(body);
+        this.ws.send(frame);
+    }
+
     /**
      * Stops processing.
      * Signature matches: stopContinuousRecognitionAsync()
@@ -163,6 +354,8 @@ export class LocalTranscriptionService {
             this.audioContext.close();
             this.audioContext = null;
         }
+        this._closeEncoder();
+        this.framed = false;
     }
 
     // Internal Helper: Trigger canceled callback
@@ -0,0 +1,11 @@
+import { setAIResponse } from '../../redux/aiResponseSlice';
+
+/**
+ * Shows the session hub's streamed AI answer in the AI response panel.
+ * Only viewers take their answer from the hub; the other roles generate their own.
+ */
+export function bindHubAnswer(hubService, dispatch, role) {
+    hubService.onAnswerUpdate = (text) => {
+        if (role === 'viewer') dispatch(setAIResponse(text));
+    };
+}